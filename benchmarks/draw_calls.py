@@ -0,0 +1,116 @@
+"""
+This script benchmarks drawing the stimuli screen with both renderers
+(see RENDERER in set_up.py): two GratingStims, or one ElementArrayStim
+for both Gabors. It draws on a hidden window, so nothing is shown.
+
+It measures how long the draw calls take on the CPU, and how long until
+the graphics card has finished them. It also compares the drawn images,
+to check both renderers show the same stimuli.
+
+usage (from the main folder):
+
+   python -m benchmarks.draw_calls [n_frames]
+
+made by Anna van Harmelen, 2023
+"""
+
+import sys
+import random
+from time import perf_counter
+from numpy import array, asarray, mean, percentile, abs as absolute
+from psychopy import visual
+from pyglet import gl
+from set_up import get_monitor_and_dir, experiment_settings
+from config import default_config, compile_config
+from stimuli import prepare_stimuli, draw_stimuli_frame
+
+
+def make_settings(window, experiment, renderer):
+    return dict(**experiment_settings(experiment), renderer=renderer, window=window)
+
+
+def prepare(orientations, colours, settings):
+    stimuli = {}
+    steps = prepare_stimuli(
+        *orientations, *orientations, colours, colours[0], settings, stimuli
+    )
+    for _ in steps:
+        pass
+
+    return stimuli
+
+
+def time_frames(stimuli, window, n_frames):
+    drawing, finishing = [], []
+    for _ in range(n_frames):
+        start = perf_counter()
+        draw_stimuli_frame(stimuli)
+        drawn = perf_counter()
+        gl.glFinish()
+        finished = perf_counter()
+        window.flip()
+
+        drawing.append(drawn - start)
+        finishing.append(finished - start)
+
+    return drawing, finishing
+
+
+def capture(stimuli, window):
+    draw_stimuli_frame(stimuli)
+    image = asarray(window.getMovieFrame(buffer="back"), dtype=float)
+    window.movieFrames.clear()
+    window.flip()
+
+    return image
+
+
+def report(name, values):
+    values = array(values) * 1000
+    print(
+        f"{name:<32} mean {mean(values):8.4f} ms   "
+        f"99th percentile {percentile(values, 99):8.4f} ms"
+    )
+
+
+def main(n_frames):
+    monitor, _ = get_monitor_and_dir(testing=False)
+    experiment = compile_config(default_config(), monitor)
+    window = visual.Window(
+        color=([-0.5, -0.5, -0.5]),
+        size=monitor["resolution"],
+        units="pix",
+        visible=False,
+    )
+
+    orientations = [random.uniform(-45, 45), random.uniform(-45, 45)]
+    colours = random.sample(experiment["config"]["colours"], 2)
+    images = {}
+
+    print(
+        f"{n_frames} frames, orientations "
+        f"{orientations[0]:.1f} and {orientations[1]:.1f}"
+    )
+    for renderer in ["grating", "element_array"]:
+        settings = make_settings(window, experiment, renderer)
+        stimuli = prepare(orientations, colours, settings)
+
+        # The first frames include uploading textures
+        time_frames(stimuli, window, 10)
+        drawing, finishing = time_frames(stimuli, window, n_frames)
+        images[renderer] = capture(stimuli, window)
+
+        report(f"{renderer} draw calls", drawing)
+        report(f"{renderer} until finished", finishing)
+
+    difference = absolute(images["grating"] - images["element_array"])
+    print(
+        f"Drawn images differ by {mean(difference):.3f} on average, "
+        f"at most {difference.max():.0f} (out of 255)"
+    )
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,132 @@
+"""
+This script runs many simulated sessions one after another in one process
+(see simulation.py), while tracking memory use at every block break
+(see memory.py), to find leaks before they hit a real participant.
+
+The simulation makes every stimulus of every trial with the real code
+(see stimuli.py and trial.show_text), but psychopy's stimulus classes are
+replaced by stand-ins that only count how many of them are still alive.
+Once a session is over none of them should be, so it fails if any
+stimuli are left after a session. The memory in use after every session
+is reported as well, to find where anything else keeps growing.
+
+usage (from the main folder):
+
+   python -m benchmarks.memory_soak [n_sessions]
+
+made by Anna van Harmelen, 2023
+"""
+
+import gc
+import sys
+import weakref
+import tempfile
+from psychopy import visual
+from memory import MemoryTracker, growing_sites, megabytes
+from simulation import simulate_session
+
+STIMULUS_CLASSES = ["Circle", "GratingStim", "ElementArrayStim", "TextStim"]
+
+
+class LiveStimuli:
+    """
+    Replaces psychopy's stimulus classes (within `with`) by stand-ins that
+    don't need a window, and keeps track of which of them are still alive.
+
+    usage:
+
+       with LiveStimuli() as stimuli:
+           ...
+           print(stimuli.made, stimuli.alive())
+    """
+
+    def __init__(self, classes=STIMULUS_CLASSES) -> None:
+        self.classes = classes
+        self.live = weakref.WeakSet()
+        self.made = {name: 0 for name in classes}
+        self.originals = {}
+
+    def __enter__(self):
+        for name in self.classes:
+            self.originals[name] = getattr(visual, name)
+            setattr(visual, name, self._stand_in(name))
+        return self
+
+    def __exit__(self, *_):
+        for name, original in self.originals.items():
+            setattr(visual, name, original)
+
+    def _stand_in(self, name):
+        counter = self
+
+        class Stimulus:
+            def __init__(self, **_) -> None:
+                counter.made[name] += 1
+                counter.live.add(self)
+
+            def draw(self):
+                pass
+
+        Stimulus.__name__ = name
+        return Stimulus
+
+    def alive(self):
+        """The stand-ins that are still alive, per class."""
+        gc.collect()
+        alive = {}
+        for stimulus in self.live:
+            name = type(stimulus).__name__
+            alive[name] = alive.get(name, 0) + 1
+
+        return alive
+
+
+def main(n_sessions):
+    directory = tempfile.mkdtemp(prefix="microsaccade_soak_")
+    memory = MemoryTracker()
+    memory.start()
+
+    problems = []
+    after_sessions = []
+    with LiveStimuli() as stimuli:
+        for session in range(1, n_sessions + 1):
+            problems += simulate_session(
+                directory, seed=session, memory=memory, headless=False
+            )
+            memory.snapshot(f"after session {session}")
+            after_sessions.append(memory.rows[-1])
+
+            alive = stimuli.alive()
+            if alive:
+                problems.append(f"Stimuli left after session {session}: {alive}")
+
+            # The first session fills caches that are kept on purpose
+            if session == 1:
+                reference = memory.previous
+
+    print(f"\n{memory.n_trials} trials in {n_sessions} sessions")
+    print(f"Stimuli made: {stimuli.made}")
+    for row in after_sessions:
+        print(f"{row['label']:<24} traced {megabytes(row['traced'])}")
+
+    if n_sessions > 1:
+        print("\nLargest growth since the first session:")
+        print("\n".join(growing_sites(memory.previous, reference)))
+    print(f"\nFull report per session saved in {directory}")
+
+    growth = memory.growth_per_trial(rows=after_sessions[1:])
+    if growth is not None:
+        print(f"Memory grew by {growth:.1f} bytes per trial.")
+
+    if not any(stimuli.made.values()):
+        problems.append("Expected the sessions to make stimuli.")
+
+    for problem in problems:
+        print(problem)
+
+    return problems
+
+
+if __name__ == "__main__":
+    problems = main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,182 @@
+"""
+This script benchmarks the response timing of response.get_response,
+by injecting synthetic key presses at known times from a separate thread.
+
+As with a real keyboard, the presses reach the keyboard as events, which
+are timestamped by a thread of its own when they're delivered (not when
+they were injected).
+
+It measures, from the moment of the injected press:
+ - how long it takes before polling notices the press (which is what
+   a time()-based response time would measure)
+ - how long it takes before the response trigger is sent to the eyetracker
+   (which is what response-locked gaze analyses depend on)
+ - how far the response time (the keyboard timestamp relative to the flip)
+   is off, of which the sd is the timestamp jitter
+
+usage (from the main folder):
+
+   python -m benchmarks.response_timing [n_trials]
+
+made by Anna van Harmelen, 2023
+"""
+
+import sys
+import queue
+import random
+import threading
+from time import perf_counter, sleep
+from numpy import array, mean, std, percentile
+from response import get_response
+from set_up import get_monitor_and_dir
+from config import default_config, compile_config, trigger_lookup
+
+
+class InjectedClock:
+    def __init__(self) -> None:
+        self.last_reset = perf_counter()
+
+    def reset(self):
+        self.last_reset = perf_counter()
+
+    def getTime(self):
+        return perf_counter() - self.last_reset
+
+    def getLastResetTime(self):
+        return self.last_reset
+
+
+class InjectedKey:
+    def __init__(self, name, t_down, pressed=None) -> None:
+        self.name = name
+        self.tDown = t_down
+        self.pressed = pressed  # when it was injected
+        self.duration = None
+        self.rt = None
+
+
+class TriggerRecorder:
+    """Stands in for the eyetracker, remembering when every trigger was sent."""
+
+    def __init__(self) -> None:
+        self.tracker = self
+        self.sent = []
+
+    def send_message(self, message):
+        self.sent.append((message, perf_counter()))
+
+
+class InjectedKeyboard:
+    """
+    Mimics psychopy's Keyboard, but its key presses come from `inject`.
+    Remembers when each key press was first returned by getKeys.
+    """
+
+    def __init__(self) -> None:
+        self.clock = InjectedClock()
+        self.keys = []
+        self.noticed = {}
+        self.lock = threading.Lock()
+        self.events = queue.SimpleQueue()
+        self.backend = threading.Thread(target=self._deliver, daemon=True)
+        self.backend.start()
+
+    def getBackend(self):
+        return "injected"
+
+    def inject(self, name, hold_duration):
+        self.events.put((name, True, perf_counter()))
+        sleep(hold_duration)
+        self.events.put((name, False, perf_counter()))
+
+    def _deliver(self):
+        # Timestamps every event when it arrives, like the keyboard's backend
+        while True:
+            name, down, injected = self.events.get()
+            with self.lock:
+                if down:
+                    self.keys.append(InjectedKey(name, perf_counter(), injected))
+                    continue
+                for key in self.keys:
+                    if key.name == name and key.duration is None:
+                        key.duration = perf_counter() - key.tDown
+
+    def getKeys(self, keyList=None, waitRelease=True, clear=True):
+        returned = []
+        with self.lock:
+            for key in self.keys:
+                if keyList and key.name not in keyList:
+                    continue
+                if waitRelease and key.duration is None:
+                    continue
+                self.noticed.setdefault(key, perf_counter())
+
+                copy = InjectedKey(key.name, key.tDown, key.pressed)
+                copy.duration = key.duration
+                copy.rt = key.tDown - self.clock.getLastResetTime()
+                returned.append(copy)
+
+            if clear:
+                self.keys = [key for key in self.keys if key not in returned]
+
+        return returned
+
+    def clearEvents(self):
+        with self.lock:
+            self.keys = []
+
+
+def run_trial(settings, eyetracker: TriggerRecorder):
+    keyboard = settings["keyboard"]
+    planned_rt = random.uniform(0.05, 0.15)
+    hold_duration = random.uniform(0.02, 0.3)
+
+    # Stands in for the flip at which the orientation changes
+    keyboard.clock.reset()
+    flip = keyboard.clock.getLastResetTime()
+
+    injector = threading.Timer(
+        planned_rt, keyboard.inject, (random.choice(["z", "m"]), hold_duration)
+    )
+    injector.start()
+    response = get_response(settings, False, eyetracker, "valid", "clockwise", "left")
+    injector.join()
+
+    (key, noticed) = next(iter(keyboard.noticed.items()))
+    keyboard.noticed.clear()
+    (_, sent) = eyetracker.sent.pop()
+
+    return {
+        "polling_delay": noticed - key.pressed,
+        "trigger_delay": sent - key.pressed,
+        "timestamp_error": response["response_time_in_ms"] / 1000
+        - (key.pressed - flip),
+    }
+
+
+def report(name, values):
+    values = array(values) * 1000
+    print(
+        f"{name:<18} mean {mean(values):8.4f} ms   sd {std(values):8.4f} ms   "
+        f"99th percentile {percentile(abs(values), 99):8.4f} ms"
+    )
+
+
+def main(n_trials):
+    monitor, _ = get_monitor_and_dir(testing=False)
+    settings = {
+        "keyboard": InjectedKeyboard(),
+        "triggers": trigger_lookup(compile_config(default_config(), monitor)["triggers"]),
+    }
+    eyetracker = TriggerRecorder()
+    results = [run_trial(settings, eyetracker) for _ in range(n_trials)]
+
+    print(f"{n_trials} injected key presses, held for 20 to 300 ms")
+    for measure in ["polling_delay", "trigger_delay", "timestamp_error"]:
+        report(measure, [result[measure] for result in results])
+    jitter = std([result["timestamp_error"] for result in results]) * 1000
+    print(f"timestamp jitter   {jitter:8.4f} ms (sd of the timestamp error)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
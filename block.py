@@ -1,95 +1,41 @@
 """
 This file contains the functions necessary for
-creating and running a full block of trials start-to-finish.
+running a full block of trials start-to-finish
+(see schedule.py for creating the blocks).
 To run the 'microsaccade bias' experiment, see main.py.
 
 made by Anna van Harmelen, 2023
 """
-import random
 from trial import show_text
 from response import wait_for_key
-
-
-def create_blocks(
-    valid_trials, invalid_trials, n_blocks, n_block_trials, predictability
-):
-    if len(valid_trials) % 40 != 0 or len(invalid_trials) % 40 != 0:
-        raise Exception("Expected both numbers of trials to be divisible by 40.")
-
-    # Determine number of (in)valid trials per block
-    n_invalid_trials = n_block_trials * (100 - predictability) // 100
-    n_valid_trials = n_block_trials * predictability // 100
-
-    # Create list of blocks
-    blocks = [[] for _ in range(n_blocks)]
-
-    # Trials are already in random order, they just need to be cut into smaller blocks
-    for n_block in range(n_blocks):
-        blocks[n_block].extend(
-            valid_trials[n_block * n_valid_trials : (n_block + 1) * n_valid_trials]
-        )
-        blocks[n_block].extend(
-            invalid_trials[
-                n_block * n_invalid_trials : (n_block + 1) * n_invalid_trials
-            ]
-        )
-        random.shuffle(blocks[n_block])
-
-    return blocks
-
-
-def create_trial_list(n_trials, validity: str):
-    if n_trials % 40 != 0:
-        raise Exception(
-            "Expected number of trials to be divisible by 40, otherwise perfect factorial combinations are not possible."
-        )
-
-    if validity != "valid" and validity != "invalid":
-        raise Exception("Expected validity of trial to be either 'valid' or 'invalid'.")
-
-    # Generate equal distribution of target locations
-    locations = n_trials // 2 * ["left"] + n_trials // 2 * ["right"]
-
-    # Generate equal distribution of rotation directions,
-    # that co-occur equally with the target locations
-    directions = 2 * (n_trials // 4 * ["clockwise"] + n_trials // 4 * ["anticlockwise"])
-
-    # Generate equal distribution of trial lengths,
-    # that co-occur equally with both target locations and directions
-    durations = n_trials // 10 * list(range(500, 3201, 300))
-
-    # Add validity to all trials
-    validities = [validity] * n_trials
-
-    # Create trial parameters for all trials
-    trials = list(zip(locations, directions, durations, validities))
-    random.shuffle(trials)
-
-    return trials
+from tracing import span
 
 
 def block_break(current_block, n_blocks, avg_score, settings, eyetracker):
     blocks_left = n_blocks - current_block
 
-    show_text(
-        f"You scored {avg_score}% correct on the previous block. "
-        f"\n\nYou just finished block {current_block}, you {'only ' if blocks_left == 1 else ''}"
-        f"have {blocks_left} block{'s' if blocks_left != 1 else ''} left. "
-        "Take a break if you want to, but try not to move your head during this break."
-        "\n\nPress SPACE when you're ready to continue.",
-        settings["window"],
-    )
-    settings["window"].flip()
+    with span("block break text", block=current_block):
+        show_text(
+            f"You scored {avg_score}% correct on the previous block. "
+            f"\n\nYou just finished block {current_block}, you {'only ' if blocks_left == 1 else ''}"
+            f"have {blocks_left} block{'s' if blocks_left != 1 else ''} left. "
+            "Take a break if you want to, but try not to move your head during this break."
+            "\n\nPress SPACE when you're ready to continue.",
+            settings["window"],
+        )
+        settings["window"].flip()
 
     if eyetracker:
-        keys = wait_for_key(["space", "c"], settings["keyboard"])
+        with span("block break", block=current_block):
+            keys = wait_for_key(["space", "c"], settings["keyboard"])
         if "c" in keys:
             eyetracker.calibrate()
             eyetracker.start()
             return True
     else:
-        wait_for_key(["space"], settings["keyboard"])
-        
+        with span("block break", block=current_block):
+            wait_for_key(["space"], settings["keyboard"])
+
     # Make sure the keystroke from starting the experiment isn't saved
     settings["keyboard"].clearEvents()
 
@@ -107,12 +53,14 @@ def long_break(n_blocks, avg_score, settings, eyetracker):
     settings["window"].flip()
 
     if eyetracker:
-        keys = wait_for_key(["space", "c"], settings["keyboard"])
+        with span("long break"):
+            keys = wait_for_key(["space", "c"], settings["keyboard"])
         if "c" in keys:
             eyetracker.calibrate()
             return True
     else:
-        wait_for_key(["space"], settings["keyboard"])
+        with span("long break"):
+            wait_for_key(["space"], settings["keyboard"])
 
     # Make sure the keystroke from starting the experiment isn't saved
     settings["keyboard"].clearEvents()
@@ -131,6 +79,21 @@ def finish(n_blocks, settings):
     wait_for_key(["space"], settings["keyboard"])
 
 
+def resume_start(n_trials, settings):
+    show_text(
+        f"Welcome back! You already did {n_trials} trials, "
+        "the experiment will continue where it stopped."
+        "\n\nPress SPACE when you're ready to continue.",
+        settings["window"],
+    )
+    settings["window"].flip()
+
+    wait_for_key(["space"], settings["keyboard"])
+
+    # Make sure the keystroke from starting the experiment isn't saved
+    settings["keyboard"].clearEvents()
+
+
 def quick_finish(settings):
     settings["window"].flip()
     show_text(
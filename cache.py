@@ -0,0 +1,226 @@
+"""
+This file contains the functions necessary for
+caching the results of the analysis stages (parse, clean, epoch, detect, ...),
+so a rerun only recomputes what changed.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+MAX_SIZE = 20 * 1024**3  # in bytes
+
+
+class StageKey(str):
+    """The key of a cached result, can be used as input of a later stage."""
+
+
+class StageCache:
+    """
+    Every result is stored under a hash of its stage, function, parameters
+    and inputs. Input files are identified by their modification time and size,
+    the results of earlier stages by their key. So changing a session file
+    or a parameter gives a new key, and everything after it is recomputed.
+
+    Results are stored in a folder per key: arrays as .npy (memory-mapped
+    when loaded), tables as .parquet and anything else pickled. Results can
+    be dicts of these. When the cache gets bigger than `max_size`, the least
+    recently used results are removed. Several processes can share one cache:
+    a result is renamed away before it's removed, and a result that another
+    process removed while it was needed is computed again.
+
+    usage:
+
+       cache = StageCache(os.path.join(directory, "analysis_cache"))
+       parsed = cache.run("parse", read_asc, [asc_file])
+       cleaned = cache.run("clean", clean_recording, [parsed], {"margin": 50})
+       recording = cache.load(cleaned)
+       print(cache.report())
+    """
+
+    def __init__(self, directory, max_size=MAX_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.reused = {}
+        self.computed = {}
+        # How every key handed out was made, to make it again if it's removed
+        self.recipes = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage, function, inputs, parameters):
+        described = []
+        for value in inputs:
+            if isinstance(value, StageKey):
+                described.append(["stage", value])
+            else:
+                stat = os.stat(value)
+                described.append(
+                    ["file", os.path.abspath(value), stat.st_mtime_ns, stat.st_size]
+                )
+
+        contents = {
+            "stage": stage,
+            "function": f"{function.__module__}.{function.__qualname__}",
+            "parameters": parameters,
+            "inputs": described,
+        }
+        return StageKey(
+            hashlib.sha256(
+                json.dumps(contents, sort_keys=True, default=str).encode()
+            ).hexdigest()
+        )
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def run(self, stage, function, inputs, parameters=None):
+        """
+        Returns the key of function(*inputs, **parameters), computing it only
+        if it isn't cached yet. Inputs are file paths (passed on as they are)
+        or keys of earlier stages (passed on as their result, which can be
+        changed in place without changing the cache).
+        """
+        parameters = parameters or {}
+        key = self.key(stage, function, inputs, parameters)
+        self.recipes[key] = (stage, function, inputs, parameters)
+
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            # Not cached (anymore)
+            pass
+        else:
+            self.reused[stage] = self.reused.get(stage, 0) + 1
+            return key
+
+        arguments = [
+            self.load(value, mmap_mode="c") if isinstance(value, StageKey) else value
+            for value in inputs
+        ]
+        self.store(key, function(*arguments, **parameters))
+        self.computed[stage] = self.computed.get(stage, 0) + 1
+        self.evict(keep=key)
+
+        return key
+
+    def store(self, key, result):
+        # Write to a temporary folder first, so a result is never half there
+        temporary = f"{self.path(key)}.{os.getpid()}.tmp"
+        os.makedirs(temporary)
+
+        values = result if isinstance(result, dict) else {"result": result}
+        others = {}
+        for name, value in values.items():
+            if isinstance(value, np.ndarray):
+                np.save(os.path.join(temporary, f"{name}.npy"), value)
+            elif isinstance(value, pd.DataFrame):
+                value.to_parquet(os.path.join(temporary, f"{name}.parquet"))
+            else:
+                others[name] = value
+        with open(os.path.join(temporary, "others.pkl"), "wb") as file:
+            pickle.dump((isinstance(result, dict), others), file)
+
+        try:
+            os.rename(temporary, self.path(key))
+        except OSError:
+            # Another process stored the same result in the meantime
+            shutil.rmtree(temporary)
+
+    def load(self, key, mmap_mode="r"):
+        """
+        Returns a cached result, arrays are memory-mapped (read-only by default).
+        If another process removed it in the meantime, it's computed again.
+        """
+        try:
+            return self._load(key, mmap_mode)
+        except FileNotFoundError:
+            if key not in self.recipes:
+                raise
+            self.run(*self.recipes[key])
+            return self._load(key, mmap_mode)
+
+    def _load(self, key, mmap_mode):
+        path = self.path(key)
+        os.utime(path)
+
+        with open(os.path.join(path, "others.pkl"), "rb") as file:
+            is_dict, values = pickle.load(file)
+
+        for file in os.listdir(path):
+            name, extension = os.path.splitext(file)
+            if extension == ".npy":
+                values[name] = np.load(os.path.join(path, file), mmap_mode=mmap_mode)
+            elif extension == ".parquet":
+                values[name] = pd.read_parquet(os.path.join(path, file))
+
+        return values if is_dict else values["result"]
+
+    def entries(self):
+        """Returns (last used, size, key) of every cached result."""
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self.path(key)
+            if key.endswith((".tmp", ".evicted")):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                entries.append((os.stat(path).st_mtime, size, key))
+            except (FileNotFoundError, NotADirectoryError):
+                # Removed by another process while looking
+                continue
+
+        return entries
+
+    def evict(self, keep=None):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            if key == keep:
+                continue
+
+            # Renamed away in one go first, so no other process ever
+            # loads a result that's half removed
+            evicted = f"{self.path(key)}.{os.getpid()}.evicted"
+            try:
+                os.rename(self.path(key), evicted)
+            except FileNotFoundError:
+                # Another process removed it already
+                pass
+            else:
+                shutil.rmtree(evicted, ignore_errors=True)
+            total -= size
+
+    def report(self):
+        """How many results of every stage were reused and computed so far."""
+        stages = sorted(set(self.reused) | set(self.computed))
+        return pd.DataFrame(
+            {
+                "stage": stages,
+                "reused": [self.reused.get(stage, 0) for stage in stages],
+                "computed": [self.computed.get(stage, 0) for stage in stages],
+            }
+        )
+
+
+class NoCache:
+    """Same interface as StageCache, but computes every stage and keeps nothing."""
+
+    def run(self, stage, function, inputs, parameters=None):
+        return function(*inputs, **(parameters or {}))
+
+    def load(self, result, mmap_mode="r"):
+        return result
+
+    def report(self):
+        return None
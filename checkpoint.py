@@ -0,0 +1,141 @@
+"""
+This file contains the functions necessary for
+saving the progress of a session after every trial,
+so that an interrupted session can be resumed (see main.resume).
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import json
+import random
+
+
+class Checkpoint:
+    """
+    Keeps two files per session:
+     - rows_session_N.jsonl: every finished trial, one line each (append only)
+     - checkpoint_session_N.json: where to continue, the random state,
+       and the last trial (in case it didn't make it into the rows)
+
+    usage:
+
+       checkpoint = Checkpoint(directory, session)
+       checkpoint.start(config_hash, start_of_experiment)
+       checkpoint.save(row, block_index, trial_index)
+       state, rows = Checkpoint.load(directory, session)
+       checkpoint.resume(state, rows)
+       checkpoint.rewrite_rows(rows)  # e.g. after adding their eyetracker times
+    """
+
+    def __init__(self, directory, session, testing=False) -> None:
+        name = f"session_{session}{'_test' if testing else ''}"
+        self.state_path = os.path.join(directory, f"checkpoint_{name}.json")
+        self.rows_path = os.path.join(directory, f"rows_{name}.jsonl")
+        self.state = None
+        self.rows_file = None
+
+    def start(self, config_hash, start_of_experiment):
+        self.state = {
+            "config_hash": config_hash,
+            "start_of_experiment": start_of_experiment,
+            "segment": 1,
+            "block_index": 0,
+            "trial_index": 0,
+            "n_rows": 0,
+            "last_row": None,
+            "finished": False,
+        }
+        self.rows_file = open(self.rows_path, "w")
+        self.write_state()
+
+    def resume(self, state: dict, rows: list):
+        """Rewrites the rows as loaded, without any half written or missing trial."""
+        self.state = {**state, "segment": state["segment"] + 1, "n_rows": len(rows)}
+        self.write_state()
+        self.rows_file = open(self.rows_path, "w")
+        for row in rows:
+            self.rows_file.write(json.dumps(row) + "\n")
+        self.rows_file.flush()
+
+    def save(self, row: dict, block_index, trial_index, random_state=None):
+        """
+        Saves a finished trial, `block_index` and `trial_index` point at the next one.
+        Flushed straight away, so it survives the experiment crashing.
+        `random_state` is the state to continue from (the current one if None).
+        The state (with the row) is written first, if the experiment stops
+        before the row is appended, load adds it from the state.
+        """
+        self.state["block_index"] = block_index
+        self.state["trial_index"] = trial_index
+        self.state["n_rows"] += 1
+        self.state["last_row"] = row
+        self.write_state(random_state)
+
+        self.rows_file.write(json.dumps(row) + "\n")
+        self.rows_file.flush()
+
+    def finish(self):
+        self.state["finished"] = True
+        self.write_state()
+        self.close()
+
+    def rewrite_rows(self, rows: list):
+        """
+        Replaces the saved trials in one go (stops saving more), e.g. once their
+        eyetracker times are known. A trial that wasn't saved yet is left out.
+        """
+        self.close()
+        with open(self.rows_path + ".tmp", "w") as file:
+            for row in rows[: self.state["n_rows"]]:
+                file.write(json.dumps(row) + "\n")
+        os.replace(self.rows_path + ".tmp", self.rows_path)
+
+    def close(self):
+        if self.rows_file:
+            self.rows_file.close()
+            self.rows_file = None
+
+    def write_state(self, random_state=None):
+        state = {**self.state, "random_state": random_state or random.getstate()}
+
+        # Replace the old checkpoint in one go, so it's never half written
+        with open(self.state_path + ".tmp", "w") as file:
+            json.dump(state, file)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    @staticmethod
+    def load(directory, session, testing=False):
+        checkpoint = Checkpoint(directory, session, testing)
+
+        if not os.path.exists(checkpoint.state_path):
+            raise Exception(f"There is no checkpoint for session {session}.")
+
+        with open(checkpoint.state_path) as file:
+            state = json.load(file)
+
+        if state["finished"]:
+            raise Exception(f"Session {session} was already finished.")
+
+        # A trial that was being written when the experiment stopped is ignored
+        rows = []
+        with open(checkpoint.rows_path) as file:
+            for line in file:
+                if line.endswith("\n"):
+                    rows.append(json.loads(line))
+
+        if len(rows) == state["n_rows"] - 1:
+            rows.append(state["last_row"])
+        elif len(rows) != state["n_rows"]:
+            raise Exception(
+                f"Expected {state['n_rows']} trials for session {session}, "
+                f"but found {len(rows)}."
+            )
+
+        return state, rows
+
+
+def restore_random_state(state: dict):
+    version, internal_state, gauss_next = state["random_state"]
+    random.setstate((version, tuple(internal_state), gauss_next))
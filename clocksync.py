@@ -0,0 +1,138 @@
+"""
+This file contains the functions necessary for
+relating the computer's clock to the eyetracker's clock,
+so that trial times can be expressed in eyetracker time (and back).
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+from time import time
+import numpy as np
+import pandas as pd
+
+N_PROBES = 5  # tracker clock readings per sample, the fastest one is kept
+
+
+class ClockSync:
+    """
+    Fits tracker time (in ms) as a linear function of host time (in s),
+    i.e. an offset plus drift, updated with every sample.
+
+    usage:
+
+       clock_sync = ClockSync(eyelinker.tracker_time)
+       clock_sync.sample()  # e.g. once per ITI
+       clock_sync.host_to_tracker(host_times)
+    """
+
+    def __init__(self, tracker_time, host_time=time, n_probes=N_PROBES) -> None:
+        self.tracker_time = tracker_time
+        self.host_time = host_time
+        self.n_probes = n_probes
+        self.samples = []
+
+        # Running sums for the regression, relative to the first sample
+        # to keep the numbers small
+        self.reference = None
+        self.n = 0
+        self.sum_host = 0.0
+        self.sum_tracker = 0.0
+        self.sum_host_squared = 0.0
+        self.sum_host_tracker = 0.0
+
+    def sample(self):
+        best = None
+        for _ in range(self.n_probes):
+            before = self.host_time()
+            tracker = self.tracker_time()
+            after = self.host_time()
+
+            if best is None or after - before < best[2]:
+                best = ((before + after) / 2, tracker, after - before)
+
+        host, tracker, round_trip = best
+        self.samples.append(
+            {"host_time": host, "tracker_time": tracker, "round_trip": round_trip}
+        )
+        self.add(host, tracker)
+
+    def add(self, host, tracker):
+        if self.reference is None:
+            self.reference = (host, tracker)
+
+        host = host - self.reference[0]
+        tracker = tracker - self.reference[1]
+
+        self.n += 1
+        self.sum_host += host
+        self.sum_tracker += tracker
+        self.sum_host_squared += host**2
+        self.sum_host_tracker += host * tracker
+
+    def relative_fit(self):
+        if self.n == 0:
+            raise Exception("Expected at least one clock sample before fitting.")
+
+        denominator = self.n * self.sum_host_squared - self.sum_host**2
+        if self.n < 2 or denominator <= 0:
+            # Assume both clocks run at the same speed
+            slope = 1000.0
+        else:
+            slope = (
+                self.n * self.sum_host_tracker - self.sum_host * self.sum_tracker
+            ) / denominator
+
+        intercept = (self.sum_tracker - slope * self.sum_host) / self.n
+
+        return intercept, slope
+
+    def fit(self):
+        """
+        Returns (offset, slope), so that
+        tracker time = offset + slope * host time (in ms and s).
+        """
+        intercept, slope = self.relative_fit()
+        return self.reference[1] + intercept - slope * self.reference[0], slope
+
+    def drift(self):
+        # In parts per million, positive if the tracker clock runs fast
+        return (self.fit()[1] / 1000 - 1) * 1e6
+
+    def host_to_tracker(self, host_times):
+        # Computed relative to the first sample, so no precision is lost
+        # on the large absolute host times
+        intercept, slope = self.relative_fit()
+        host_times = np.asarray(host_times, dtype=float) - self.reference[0]
+        return self.reference[1] + intercept + slope * host_times
+
+    def tracker_to_host(self, tracker_times):
+        intercept, slope = self.relative_fit()
+        tracker_times = np.asarray(tracker_times, dtype=float) - self.reference[1]
+        return self.reference[0] + (tracker_times - intercept) / slope
+
+    def stamp(self, data, start_of_experiment):
+        """
+        Adds the start and end time of every trial in tracker time (ms),
+        based on all samples so far. Only pass the trials of the current
+        segment, the tracker clock may have been restarted in between.
+        """
+        for column in ["start_time", "end_time"]:
+            tracker_times = self.host_to_tracker(
+                [start_of_experiment + trial[column] for trial in data]
+            )
+            for trial, tracker_time in zip(data, tracker_times):
+                trial[f"{column}_tracker"] = round(float(tracker_time), 3)
+
+    def save(self, path):
+        pd.DataFrame(self.samples).to_csv(path, index=False)
+
+
+def clock_file(directory, session, testing=False, segment=1):
+    """A resumed session (see main.resume) saves every segment in its own file."""
+    return os.path.join(
+        directory,
+        f"clock_session_{session}"
+        f"{'' if segment == 1 else f'_{segment}'}{'_test' if testing else ''}.csv",
+    )
@@ -0,0 +1,221 @@
+"""
+This file contains the functions necessary for
+collecting all design parameters of the experiment in one configuration,
+checking it, and compiling it (with everything derived from it) into one
+artifact that is saved and identified by its hash, and creating the trial
+schedule of every session from it.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import json
+import random
+import hashlib
+from schedule import create_trial_list, create_blocks
+from geometry import get_geometry, get_sizes
+
+N_BLOCKS = 20
+TRIALS_PER_BLOCK = 40
+PREDICTABILITY = 80
+ECCENTRICITY = 5  # distance of the stimuli from the centre of the screen
+DOT_SIZE = 0.1  # radius of fixation dot
+GABOR_SIZE = 3  # diameter of Gabor
+# COLOURS = [[21, 165, 234], [133, 193, 18], [197, 21, 234], [234, 74, 21]]
+COLOURS = [[19, 146, 206], [217, 103, 241], [101, 148, 14], [238, 104, 60]]
+COLOURS = [
+    [(rgb_value / 128 - 1) for rgb_value in rgb_triplet] for rgb_triplet in COLOURS
+]
+ORIENTATION_TURN = 2
+
+ARTIFACT_VERSION = 2  # increase when the contents of an artifact change
+
+
+def default_config():
+    return {
+        "n_blocks": N_BLOCKS,
+        "trials_per_block": TRIALS_PER_BLOCK,
+        "predictability": PREDICTABILITY,
+        "eccentricity": ECCENTRICITY,
+        "dot_size": DOT_SIZE,
+        "gabor_size": GABOR_SIZE,
+        "colours": COLOURS,
+        "orientation_turn": ORIENTATION_TURN,
+    }
+
+
+def validate_config(config: dict):
+    missing = set(default_config()) - set(config)
+    if missing:
+        raise Exception(f"Expected the configuration to contain {sorted(missing)}.")
+
+    for parameter in ["n_blocks", "trials_per_block"]:
+        if not isinstance(config[parameter], int) or config[parameter] < 1:
+            raise Exception(f"Expected {parameter} to be a positive integer.")
+
+    if not 0 <= config["predictability"] <= 100:
+        raise Exception("Expected predictability to be a percentage.")
+
+    # Every block needs whole numbers of (in)valid trials, and all (in)valid
+    # trials together need to make perfect factorial combinations
+    for share in [config["predictability"], 100 - config["predictability"]]:
+        if config["trials_per_block"] * share % 100 != 0:
+            raise Exception(
+                "Expected predictability to split every block into whole numbers of trials."
+            )
+        if config["n_blocks"] * config["trials_per_block"] * share // 100 % 40 != 0:
+            raise Exception(
+                "Expected the total numbers of valid and invalid trials to be divisible by 40."
+            )
+
+    for parameter in ["eccentricity", "dot_size", "gabor_size", "orientation_turn"]:
+        if config[parameter] <= 0:
+            raise Exception(f"Expected {parameter} to be positive.")
+
+    if len(config["colours"]) < 2 or any(
+        len(colour) != 3 or not all(-1 <= value <= 1 for value in colour)
+        for colour in config["colours"]
+    ):
+        raise Exception(
+            "Expected at least two colours, each as three values between -1 and 1."
+        )
+
+
+def config_hash(config: dict, monitor: dict):
+    contents = {
+        "version": ARTIFACT_VERSION,
+        "config": config,
+        "monitor": monitor,
+    }
+    return hashlib.sha256(json.dumps(contents, sort_keys=True).encode()).hexdigest()
+
+
+def compile_config(config: dict, monitor: dict):
+    """
+    Derives the pixel geometry and the trigger table from the configuration.
+    The same for every session, see session_schedule for the trials.
+    """
+    validate_config(config)
+
+    pixel_geometry = get_geometry(monitor, config["eccentricity"])
+    deg2pix, gabor_size = get_sizes(pixel_geometry, config["gabor_size"])
+    positions = pixel_geometry.stimulus_positions
+    geometry = {
+        "gabor_size": gabor_size,
+        "dot_radius": deg2pix(config["dot_size"]),
+        "positions": {name: list(position) for name, position in positions.items()},
+    }
+
+    triggers = [
+        {
+            "frame": frame,
+            "trial_condition": condition,
+            "target_bar": target_bar,
+            "change_direction": direction,
+            "trigger": get_trigger(frame, condition, target_bar, direction),
+        }
+        for frame in [
+            "stimuli_onset",
+            "cue_onset",
+            "orientation_change",
+            "response_left",
+            "response_right",
+            "response_missed",
+        ]
+        for condition in ["valid", "invalid"]
+        for target_bar in ["left", "right"]
+        for direction in ["clockwise", "anticlockwise"]
+    ]
+
+    return {
+        "hash": config_hash(config, monitor),
+        "version": ARTIFACT_VERSION,
+        "config": config,
+        "monitor": monitor,
+        "geometry": geometry,
+        "triggers": triggers,
+    }
+
+
+def get_trigger(frame, condition, target_position, change_direction):
+    condition_marker = {"invalid": 1, "valid": 2}[condition]
+
+    if change_direction == "anticlockwise":
+        condition_marker += 2
+
+    if target_position == "right":
+        condition_marker += 4
+
+    return {
+        "stimuli_onset": "1",
+        "cue_onset": "2",
+        "orientation_change": "3",
+        "response_left": "4",
+        "response_right": "5",
+        "response_missed": "6",
+    }[frame] + str(condition_marker)
+
+
+def trigger_lookup(table):
+    """
+    The trigger of every frame of every kind of trial, from the trigger table
+    of a compiled artifact (see config.compile_config), by
+    (frame, trial_condition, target_bar, change_direction).
+    """
+    return {
+        (
+            row["frame"],
+            row["trial_condition"],
+            row["target_bar"],
+            row["change_direction"],
+        ): row["trigger"]
+        for row in table
+    }
+
+
+def session_schedule(config: dict, seed):
+    """
+    The blocks of trials of one session, which only depend on the
+    configuration and `seed` (the session number), so a resumed session
+    gets the same schedule again.
+    """
+    # Create the schedule from its own seed, without touching the
+    # random state used for everything else
+    state = random.getstate()
+    random.seed(seed)
+    n_trials = config["n_blocks"] * config["trials_per_block"]
+    schedule = create_blocks(
+        create_trial_list(n_trials * config["predictability"] // 100, "valid"),
+        create_trial_list(n_trials * (100 - config["predictability"]) // 100, "invalid"),
+        config["n_blocks"],
+        config["trials_per_block"],
+        config["predictability"],
+    )
+    random.setstate(state)
+
+    return schedule
+
+
+def artifact_file(directory, hash):
+    return os.path.join(directory, "artifacts", f"{hash}.json")
+
+
+def load_or_compile(config: dict, monitor: dict, directory):
+    """
+    Loads the compiled artifact for this configuration and monitor
+    if it was compiled before, otherwise compiles and saves it.
+    """
+    path = artifact_file(directory, config_hash(config, monitor))
+
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+
+    artifact = compile_config(config, monitor)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(artifact, file)
+
+    return artifact
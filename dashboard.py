@@ -0,0 +1,154 @@
+"""
+This script shows the performance of the running session on the
+experimenter's screen, by following the metrics file written by main.py.
+
+usage (in a separate terminal, while the experiment runs):
+
+   python dashboard.py path\\to\\metrics_session_N.jsonl
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import sys
+import json
+import time
+from collections import deque
+
+RECENT_TRIALS = 20  # number of trials in the 'recent' column
+TIMING_TOLERANCE = 20  # in ms, trials off by more than this are counted as timing errors
+REFRESH_INTERVAL = 1  # in s
+
+
+class SessionOverview:
+    def __init__(self) -> None:
+        self.all_trials = Tally()
+        self.block_trials = Tally()
+        self.recent_trials = deque(maxlen=RECENT_TRIALS)
+        self.block = None
+
+    def add(self, record: dict):
+        if record["block"] != self.block:
+            self.block = record["block"]
+            self.block_trials = Tally()
+
+        self.all_trials.add(record)
+        self.block_trials.add(record)
+        self.recent_trials.append(record)
+
+    def report(self):
+        recent = Tally()
+        for record in self.recent_trials:
+            recent.add(record)
+
+        lines = [
+            f"Block {self.block}, trial {self.all_trials.n}",
+            "",
+            f"{'':<22}{'session':>10}{'block':>10}{'recent':>10}",
+        ]
+        for label, statistic in [
+            ("correct (%)", Tally.accuracy),
+            ("missed (%)", Tally.missed),
+            ("premature (%)", Tally.premature),
+            ("mean RT (ms)", Tally.mean_rt),
+            ("timing errors (%)", Tally.timing_errors),
+            ("gaze lost (%)", Tally.gaze_lost),
+        ]:
+            values = [
+                statistic(tally) for tally in (self.all_trials, self.block_trials, recent)
+            ]
+            lines.append(
+                f"{label:<22}"
+                + "".join(
+                    f"{'-' if value is None else round(value):>10}" for value in values
+                )
+            )
+
+        return "\n".join(lines)
+
+
+class Tally:
+    def __init__(self) -> None:
+        self.n = 0
+        self.n_correct = 0
+        self.n_missed = 0
+        self.n_premature = 0
+        self.n_timing_errors = 0
+        self.n_gaze_checked = 0
+        self.gaze_loss_sum = 0
+        self.rt_n = 0
+        self.rt_sum = 0
+
+    def add(self, record: dict):
+        self.n += 1
+        self.n_correct += bool(record["correct"])
+        self.n_missed += bool(record["missed"])
+        self.n_premature += bool(record["premature_pressed"])
+        self.n_timing_errors += abs(record["timing_error_in_ms"]) > TIMING_TOLERANCE
+
+        if record["response_time_in_ms"] is not None:
+            self.rt_n += 1
+            self.rt_sum += record["response_time_in_ms"]
+
+        if record["gaze_loss"] is not None:
+            self.n_gaze_checked += 1
+            self.gaze_loss_sum += record["gaze_loss"]
+
+    def accuracy(self):
+        return 100 * self.n_correct / self.n if self.n else None
+
+    def missed(self):
+        return 100 * self.n_missed / self.n if self.n else None
+
+    def premature(self):
+        return 100 * self.n_premature / self.n if self.n else None
+
+    def mean_rt(self):
+        return self.rt_sum / self.rt_n if self.rt_n else None
+
+    def timing_errors(self):
+        return 100 * self.n_timing_errors / self.n if self.n else None
+
+    def gaze_lost(self):
+        if not self.n_gaze_checked:
+            return None
+        return 100 * self.gaze_loss_sum / self.n_gaze_checked
+
+
+def follow(path):
+    # Wait for the experiment to create the file, then keep reading new lines
+    while not os.path.exists(path):
+        time.sleep(REFRESH_INTERVAL)
+
+    with open(path) as file:
+        pending = ""
+        while True:
+            line = file.readline()
+            if not line:
+                yield None
+                time.sleep(REFRESH_INTERVAL)
+                continue
+
+            pending += line
+            if pending.endswith("\n"):
+                yield json.loads(pending)
+                pending = ""
+
+
+def main(path):
+    overview = SessionOverview()
+    changed = True
+
+    for record in follow(path):
+        if record is None:
+            if changed:
+                os.system("cls" if os.name == "nt" else "clear")
+                print(overview.report())
+                changed = False
+        else:
+            overview.add(record)
+            changed = True
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,41 @@
+"""
+This file contains the functions necessary for
+loading the behavioural data of all sessions for analysis,
+together with the participant details.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+from registry import Registry
+from datastore import load_sessions
+
+
+def load_dataset(directory, columns=None, sessions=None, registry_path=None):
+    """
+    Load the typed .parquet files of all (or only the given) sessions in
+    `directory` (see datastore.load_sessions) into one table, joined with the
+    participant details from the registry. Only the requested `columns` are
+    read from disk, and files are read in parallel by pyarrow.
+    """
+    if registry_path is None:
+        registry_path = os.path.join(directory, "participantinfo.db")
+
+    if columns is not None and "session_number" not in columns:
+        columns = ["session_number", *columns]
+    data = load_sessions(directory, columns=columns, sessions=sessions)
+    if data.empty:
+        return data
+
+    sort_by = [
+        column for column in ["session_number", "trial_number"] if column in data
+    ]
+    data = data.sort_values(sort_by, ignore_index=True)
+
+    # Add participant details to every trial
+    registry = Registry(registry_path)
+    participants = registry.to_frame()[["participant_number", "session_number", "age"]]
+    registry.close()
+
+    return data.merge(participants, on="session_number", how="left")
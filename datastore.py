@@ -0,0 +1,108 @@
+"""
+This file contains the functions necessary for
+saving the trial data of a session and loading it again for analysis.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import glob
+import datetime as dt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+CATEGORY = pa.dictionary(pa.int8(), pa.string())
+COLOUR = pa.list_(pa.float32(), 3)
+
+# Every column of data_session_N.parquet, in the order they are saved
+SESSION_SCHEMA = pa.schema(
+    [
+        ("session_number", pa.int32()),
+        ("trial_number", pa.int32()),
+        ("block", pa.int16()),
+        ("start_time", pa.float64()),  # in seconds since start of experiment
+        ("end_time", pa.float64()),  # in seconds since start of experiment
+        ("start_time_tracker", pa.float64()),  # in eyetracker time (ms)
+        ("end_time_tracker", pa.float64()),  # in eyetracker time (ms)
+        ("static_duration", pa.int16()),  # in ms
+        ("ITI", pa.int16()),  # in ms
+        ("change_direction", CATEGORY),
+        ("stimuli_colours", pa.list_(COLOUR, 2)),
+        ("capture_colour", COLOUR),
+        ("trial_condition", CATEGORY),
+        ("left_orientation", pa.int16()),
+        ("right_orientation", pa.int16()),
+        ("left_orientation_2", pa.int16()),
+        ("right_orientation_2", pa.int16()),
+        ("target_bar", CATEGORY),
+        ("target_colour", COLOUR),
+        ("target_pre_orientation", pa.int16()),
+        ("target_post_orientation", pa.int16()),
+        ("condition_code", pa.int8()),
+        ("timing_error_in_ms", pa.float64()),
+        ("iti_drawing_in_ms", pa.float64()),  # work done during the ITI screen
+        ("response_time_in_ms", pa.float64()),  # since orientation change flip
+        ("release_time_in_ms", pa.float64()),  # since orientation change flip
+        ("key_pressed", CATEGORY),
+        ("premature_pressed", pa.bool_()),
+        ("premature_key", CATEGORY),
+        ("premature_timing", pa.float64()),
+        ("missed", pa.bool_()),
+        ("correct_key", pa.bool_()),
+        ("feedback", CATEGORY),
+        ("config_hash", CATEGORY),
+    ]
+)
+TIME_COLUMNS = ["start_time", "end_time"]
+
+
+def session_file(directory, session, testing=False, extension="parquet"):
+    return os.path.join(
+        directory, f"data_session_{session}{'_test' if testing else ''}.{extension}"
+    )
+
+
+def save_session(data, directory, session, testing=False):
+    # Save all collected trial data to a new .csv, formatted as it always has been
+    csv_data = pd.DataFrame(data)
+    for column in TIME_COLUMNS:
+        if column in csv_data:
+            csv_data[column] = [
+                str(dt.timedelta(seconds=seconds)) for seconds in csv_data[column]
+            ]
+    csv_data.to_csv(session_file(directory, session, testing, "csv"), index=False)
+
+    # And to a typed .parquet file for analysis
+    table = pa.Table.from_pylist(
+        [typed_row(row, session) for row in data], schema=SESSION_SCHEMA
+    )
+    pq.write_table(table, session_file(directory, session, testing))
+
+
+def typed_row(row, session):
+    return {
+        **row,
+        "session_number": session,
+        "condition_code": int(row["condition_code"]),
+    }
+
+
+def load_sessions(directory, columns=None, sessions=None, include_tests=False):
+    """
+    Load the .parquet files of all (or only the given) sessions as one table.
+    Only the requested `columns` are read from disk, condition fields come
+    back as categoricals and times as float seconds.
+    """
+    if sessions is None:
+        files = sorted(glob.glob(os.path.join(directory, "data_session_*.parquet")))
+        if not include_tests:
+            files = [file for file in files if not file.endswith("_test.parquet")]
+    else:
+        files = [session_file(directory, session) for session in sessions]
+
+    dataset = ds.dataset(files, schema=SESSION_SCHEMA, format="parquet")
+
+    return dataset.to_table(columns=columns).to_pandas()
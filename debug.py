@@ -11,7 +11,7 @@ from math import atan2, degrees, sqrt
 import time
 import random
 from numpy import ones, zeros, unique
-from block import create_trial_list, create_blocks
+from schedule import create_trial_list, create_blocks
 
 # from set_up import set_up
 import pandas as pd
@@ -0,0 +1,119 @@
+"""
+This file contains the functions necessary for
+reading the eyetracking data of a session for analysis.
+The .edf files are first converted to text (.asc) with SR Research's edf2asc.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import io
+import re
+import glob
+import subprocess
+import numpy as np
+import pandas as pd
+
+EDF_FILE = re.compile(r"(\d+)_(\d+)(?:_(\d+))?\.edf$")
+RATE = re.compile(r"RATE\s+([\d.]+)")
+EYES = {"LEFT": ["left"], "RIGHT": ["right"], "LR": ["left", "right"]}
+
+
+def find_edf_files(directory):
+    """Returns all (segments of) session recordings, in session and segment order."""
+    files = [
+        file
+        for file in glob.glob(os.path.join(directory, "*.edf"))
+        if EDF_FILE.search(file)
+    ]
+    return sorted(files, key=recording_details)
+
+
+def recording_details(file):
+    """Returns (session, participant, segment) from an .edf or .asc file name."""
+    session, participant, segment = EDF_FILE.search(
+        os.path.splitext(file)[0] + ".edf"
+    ).groups()
+    return int(session), int(participant), int(segment or 1)
+
+
+def convert_edf(file):
+    """
+    Converts an .edf file to .asc next to it (if that wasn't done before)
+    and returns the path of the .asc file. Needs edf2asc on the path.
+    """
+    asc_file = os.path.splitext(file)[0] + ".asc"
+
+    if not os.path.exists(asc_file) or os.path.getmtime(asc_file) < os.path.getmtime(
+        file
+    ):
+        subprocess.run(["edf2asc", "-y", "-miss", "nan", file], check=True)
+
+    return asc_file
+
+
+def sample_dtype(eyes):
+    fields = [("time", np.int64)]
+    for eye in eyes:
+        fields += [
+            (f"x_{eye}", np.float32),
+            (f"y_{eye}", np.float32),
+            (f"pupil_{eye}", np.float32),
+        ]
+    return np.dtype(fields)
+
+
+def read_asc(file):
+    """
+    Reads a converted recording. Returns a dict with
+     - samples: structured array with the time (in tracker ms), and the gaze
+       position (x, y in pixels) and pupil size of every recorded eye,
+       with missing data (e.g. blinks) as NaN
+     - messages: table with the time and text of every message (e.g. triggers)
+     - rate: sampling rate in Hz
+     - eyes: the recorded eye(s), e.g. ["right"]
+    """
+    with open(file) as asc:
+        lines = asc.readlines()
+
+    # Samples start with their timestamp, everything else with a keyword
+    samples, messages = [], []
+    rate, eyes = None, None
+    for line in lines:
+        if line[:1].isdigit():
+            samples.append(line)
+        elif line.startswith("MSG"):
+            time, _, text = line[4:].partition(" ")
+            messages.append((int(time), text.strip()))
+        elif line.startswith("SAMPLES") and rate is None:
+            rate = float(RATE.search(line).group(1))
+            eyes = EYES[
+                "LR"
+                if "LEFT" in line and "RIGHT" in line
+                else "LEFT" if "LEFT" in line else "RIGHT"
+            ]
+
+    if rate is None:
+        raise Exception(f"Expected {file} to contain samples.")
+
+    dtype = sample_dtype(eyes)
+    table = pd.read_csv(
+        io.StringIO("".join(samples)),
+        sep=r"\s+",
+        header=None,
+        usecols=range(len(dtype.names)),
+        na_values=[".", "nan"],
+        engine="c",
+    )
+
+    sample_array = np.empty(len(table), dtype=dtype)
+    for column, name in enumerate(dtype.names):
+        sample_array[name] = table[column].to_numpy()
+
+    return {
+        "samples": sample_array,
+        "messages": pd.DataFrame(messages, columns=["time", "text"]),
+        "rate": rate,
+        "eyes": eyes,
+    }
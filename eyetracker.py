@@ -8,7 +8,11 @@ made by Anna van Harmelen, 2023, using code by Ezra Nasrawi & Baiwei Liu
 
 from lib import eyelinker
 from psychopy import event
+from tracing import span
 import os
+import hashlib
+
+MAX_EDF_NAME = 8  # characters before .edf, the eyetracker doesn't accept longer names
 
 
 class Eyelinker:
@@ -21,47 +25,111 @@ class Eyelinker:
 
        eyelinker = Eyelinker(participant, session, window, directory)
        eyelinker.calibrate()
+
+    A resumed session (see main.resume) records into a new segment,
+    e.g. 12_34_2.edf, so the first part isn't overwritten, and only needs
+    a drift correction:
+
+       eyelinker.drift_correct()
+
+    The eyetracker only accepts short names, so it records into
+    `host_filename` (see host_edf_filename), which is copied to `filename`.
     """
 
-    def __init__(self, participant, session, window, directory) -> None:
+    def __init__(self, participant, session, window, directory, segment=1) -> None:
         """
         This also connects to the tracker
         """
         self.directory = directory
         self.window = window
+        self.filename = edf_filename(participant, session, segment)
+        self.host_filename = host_edf_filename(participant, session, segment)
         self.tracker = eyelinker.EyeLinker(
-            window=window, eye="RIGHT", filename=f"{session}_{participant}.edf"
+            window=window, eye="RIGHT", filename=self.host_filename
         )
         self.tracker.init_tracker()
 
     def start(self):
-        self.tracker.start_recording()
+        with span("eyetracker start"):
+            self.tracker.start_recording()
 
     def calibrate(self):
-        self.tracker.calibrate()
+        with span("eyetracker calibrate"):
+            self.tracker.calibrate()
+
+    def drift_correct(self):
+        """Quick check of the calibration, the experimenter can still recalibrate."""
+        with span("eyetracker drift correct"):
+            self.tracker.drift_correct()
+
+    def tracker_time(self):
+        """
+        Returns the current time of the tracker in ms,
+        or None if there is no tracker connected.
+        """
+        if self.tracker.mock:
+            return None
+
+        with span("eyetracker time"):
+            return self.tracker.tracker.trackerTime()
+
+    def gaze_loss(self, start, end):
+        """
+        Returns the fraction of samples between tracker times `start` and `end`
+        (in ms) that are missing gaze data (e.g. because of a blink), out of
+        the samples sent over the link since the last call. None if there is
+        no tracker connected, or no samples in that window.
+        """
+        if self.tracker.mock:
+            return None
+
+        n_samples = 0
+        n_lost = 0
+        with span("eyetracker samples"):
+            while True:
+                data_type = self.tracker.tracker.getNextData()
+                if not data_type:
+                    break
+                if data_type != eyelinker.pl.SAMPLE_TYPE:
+                    continue
+
+                sample = self.tracker.tracker.getFloatData()
+                if not start <= sample.getTime() <= end:
+                    continue
+
+                n_samples += 1
+                n_lost += (
+                    not sample.isRightSample()
+                    or sample.getRightEye().getGaze()[0] == eyelinker.pl.MISSING_DATA
+                )
+
+        return n_lost / n_samples if n_samples else None
 
     def stop(self):
         os.chdir(self.directory)
 
-        self.tracker.stop_recording()
-        self.tracker.transfer_edf()
+        with span("eyetracker stop"):
+            self.tracker.stop_recording()
+        with span("eyetracker transfer"):
+            self.tracker.transfer_edf(self.filename)
         self.tracker.close_edf()
 
 
-def get_trigger(frame, condition, target_position, change_direction):
-    condition_marker = {"invalid": 1, "valid": 2}[condition]
+def edf_filename(participant, session, segment=1):
+    name = (
+        f"{session}_{participant}" if segment == 1 else f"{session}_{participant}_{segment}"
+    )
 
-    if change_direction == "anticlockwise":
-        condition_marker += 2
+    return f"{name}.edf"
 
-    if target_position == "right":
-        condition_marker += 4
 
-    return {
-        "stimuli_onset": "1",
-        "cue_onset": "2",
-        "orientation_change": "3",
-        "response_left": "4",
-        "response_right": "5",
-        "response_missed": "6",
-    }[frame] + str(condition_marker)
+def host_edf_filename(participant, session, segment=1):
+    """
+    The name of the .edf file on the eyetracker, which only accepts names of
+    MAX_EDF_NAME characters: derived from the full name (see edf_filename),
+    so it fits any participant and session number. Registered next to the
+    full name (see registry.Registry.register_edf), in case a file has to be
+    fetched from the eyetracker by hand.
+    """
+    full_name = edf_filename(participant, session, segment)
+    return f"{hashlib.sha256(full_name.encode()).hexdigest()[:MAX_EDF_NAME]}.edf"
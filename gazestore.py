@@ -0,0 +1,153 @@
+"""
+This file contains the functions necessary for
+storing the eyetracking data of a session on disk as one sample array
+with an index per trial, so any trial can be read without loading the rest.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from triggerindex import build_index, add_sample_offsets
+
+STORE_DIRECTORY = "gaze"
+MARGIN = 500  # in ms, stored before the stimuli onset and after the response
+EVENTS = ["stimuli_onset", "cue_onset", "orientation_change", "response"]
+
+
+def store_path(directory, session):
+    return os.path.join(directory, STORE_DIRECTORY, f"session_{session}")
+
+
+def build_store(directory, session, recordings, data: pd.DataFrame, margin=MARGIN):
+    """
+    Saves the samples of all segments of a session's recording (see edf.read_asc,
+    in segment order) as one array, with an index of where every trial is:
+    from `margin` ms before the stimuli onset to `margin` ms after the response.
+    The index also holds the behavioural data of every trial (see triggerindex).
+    Returns the problems found while matching triggers to trials.
+    """
+    path = store_path(directory, session)
+    os.makedirs(path, exist_ok=True)
+
+    index, problems = build_index(
+        [recording["messages"] for recording in recordings], data
+    )
+    index = add_sample_offsets(
+        index, [recording["samples"]["time"] for recording in recordings]
+    )
+
+    # Write the segments one after another, without combining them in memory
+    lengths = [len(recording["samples"]) for recording in recordings]
+    samples = np.lib.format.open_memmap(
+        os.path.join(path, "samples.npy"),
+        mode="w+",
+        dtype=recordings[0]["samples"].dtype,
+        shape=(sum(lengths),),
+    )
+    segment_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    for recording, start, length in zip(recordings, segment_starts, lengths):
+        samples[start : start + length] = recording["samples"]
+    samples.flush()
+
+    # Every trial from the margin before its first event to the margin after its last
+    rate = recordings[0]["rate"]
+    margin_samples = round(margin * rate / 1000)
+    base = segment_starts[index.segment.to_numpy() - 1]
+    first = index.stimuli_onset_sample.to_numpy()
+    last = np.where(
+        index.response_sample >= 0,
+        index.response_sample,
+        index.orientation_change_sample,
+    )
+    segment_ends = base + np.array(lengths)[index.segment.to_numpy() - 1]
+    offset = np.maximum(base + first - margin_samples, base)
+    end = np.minimum(base + last + margin_samples + 1, segment_ends)
+
+    trials = pd.DataFrame(
+        {"segment": index.segment, "offset": offset, "length": end - offset},
+        index=index.index,
+    )
+    for event in EVENTS:
+        # Relative to the start of the trial, -1 if it's missing
+        trials[event] = np.where(
+            index[f"{event}_sample"] >= 0, base + index[f"{event}_sample"] - offset, -1
+        )
+    trials = data.join(trials, on="trial_number", how="inner")
+    trials.attrs["rate"] = rate
+    trials.to_parquet(os.path.join(path, "trials.parquet"))
+
+    return problems
+
+
+class GazeStore:
+    """
+    Reads a store made by build_store. Samples stay on disk, every trial is
+    a view into the memory-mapped array, so reading it copies nothing.
+
+    usage:
+
+       store = GazeStore(directory, session)
+       samples = store.trial(12)  # e.g. samples["x_right"]
+       for trials, samples in store.batches(store.select(trial_condition="valid")):
+           ...
+    """
+
+    def __init__(self, directory, session) -> None:
+        path = store_path(directory, session)
+        self.samples = np.load(os.path.join(path, "samples.npy"), mmap_mode="r")
+        self.trials = pd.read_parquet(os.path.join(path, "trials.parquet")).set_index(
+            "trial_number"
+        )
+        self.rate = self.trials.attrs.get("rate")
+
+        # Plain dicts, for fast lookups per trial
+        self.offsets = dict(zip(self.trials.index, self.trials.offset))
+        self.lengths = dict(zip(self.trials.index, self.trials.length))
+
+    def trial(self, trial_number):
+        offset = self.offsets[trial_number]
+        return self.samples[offset : offset + self.lengths[trial_number]]
+
+    def trial_range(self, first, last):
+        """All samples from the start of trial `first` to the end of trial `last`."""
+        end = self.offsets[last] + self.lengths[last]
+        return self.samples[self.offsets[first] : end]
+
+    def epoch(self, trial_number, event, before, after):
+        """The samples from `before` to `after` ms around an event of a trial."""
+        position = self.trials.at[trial_number, event]
+        if position < 0:
+            raise Exception(f"Trial {trial_number} has no {event}.")
+
+        start = position - round(before * self.rate / 1000)
+        end = position + round(after * self.rate / 1000)
+        if start < 0 or end > self.lengths[trial_number]:
+            raise Exception(f"Expected the epoch to be within trial {trial_number}.")
+
+        offset = self.offsets[trial_number]
+        return self.samples[offset + start : offset + end]
+
+    def select(self, **conditions):
+        """The trial numbers of the trials matching all conditions, e.g. block=3."""
+        selected = np.ones(len(self.trials), dtype=bool)
+        for column, value in conditions.items():
+            selected &= (self.trials[column] == value).to_numpy()
+
+        return self.trials.index[selected].to_list()
+
+    def batches(self, trial_numbers=None, batch_size=50):
+        """
+        Yields (trials, samples) for `batch_size` trials at a time,
+        with their rows of the index and a list of their sample views.
+        """
+        if trial_numbers is None:
+            trial_numbers = self.trials.index.to_list()
+
+        for start in range(0, len(trial_numbers), batch_size):
+            batch = trial_numbers[start : start + batch_size]
+            yield self.trials.loc[batch], [
+                self.trial(trial_number) for trial_number in batch
+            ]
@@ -0,0 +1,125 @@
+"""
+This file contains the functions necessary for
+keeping python's garbage collection out of the timed screens of a trial,
+and logging every collection with the phase of the trial it happened in.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import gc
+import os
+from time import perf_counter_ns
+import pandas as pd
+
+FEEDBACK_GENERATION = 1  # collected during the feedback, quick enough for its 250 ms
+
+
+class GCPolicy:
+    """
+    Automatic garbage collection is turned off from the start of a trial
+    through the response. Instead, the young objects are collected during
+    the feedback and everything during the block breaks. After a full
+    collection, whatever is left is frozen, so later collections skip it.
+
+    Every collection is logged with how long it took and the phase it
+    happened in (automatic ones can only happen outside of the timed phases).
+
+    usage:
+
+       gc_policy = GCPolicy()
+       gc_policy.start()
+       gc_policy.timed("ITI screen")  # no automatic collections from here on
+       gc_policy.phase = "cue screen"
+       gc_policy.collect("feedback")
+       gc_policy.untimed("between trials")
+       gc_policy.collect_all("block break")
+       gc_policy.stop()
+       gc_policy.save(gc_file(directory, session))
+    """
+
+    def __init__(self, feedback_generation=FEEDBACK_GENERATION) -> None:
+        self.feedback_generation = feedback_generation
+        self.phase = None
+        self.in_timed_phase = False
+        self.trial = None
+        self.explicit = False
+        self.started_at = None
+        self.pauses = []
+
+    def start(self):
+        gc.callbacks.append(self._log)
+
+    def stop(self):
+        if self._log in gc.callbacks:
+            gc.callbacks.remove(self._log)
+        gc.unfreeze()
+        gc.enable()
+
+    def _log(self, stage, info):
+        if stage == "start":
+            self.started_at = perf_counter_ns()
+            return
+
+        self.pauses.append(
+            {
+                "trial_number": self.trial,
+                "phase": self.phase,
+                "timed": self.in_timed_phase,
+                "explicit": self.explicit,
+                "generation": info["generation"],
+                "duration_in_ms": (perf_counter_ns() - self.started_at) / 1e6,
+                "collected": info["collected"],
+                "uncollectable": info["uncollectable"],
+            }
+        )
+
+    def timed(self, phase):
+        self.phase = phase
+        self.in_timed_phase = True
+        gc.disable()
+
+    def untimed(self, phase):
+        self.phase = phase
+        self.in_timed_phase = False
+        gc.enable()
+
+    def collect(self, phase, generation=None):
+        self.phase = phase
+        self.explicit = True
+        gc.collect(self.feedback_generation if generation is None else generation)
+        self.explicit = False
+
+    def collect_all(self, phase):
+        self.collect(phase, generation=2)
+        gc.freeze()
+
+    def automatic_in_timed_phases(self):
+        """The automatic collections that happened while a trial was timed (should be none)."""
+        return [
+            pause for pause in self.pauses if pause["timed"] and not pause["explicit"]
+        ]
+
+    def save(self, path):
+        pd.DataFrame(
+            self.pauses,
+            columns=[
+                "trial_number",
+                "phase",
+                "timed",
+                "explicit",
+                "generation",
+                "duration_in_ms",
+                "collected",
+                "uncollectable",
+            ],
+        ).to_csv(path, index=False)
+
+
+def gc_file(directory, session, testing=False, segment=1):
+    """A resumed session (see main.resume) saves every segment in its own log."""
+    return os.path.join(
+        directory,
+        f"gc_session_{session}"
+        f"{'' if segment == 1 else f'_{segment}'}{'_test' if testing else ''}.csv",
+    )
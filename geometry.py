@@ -0,0 +1,120 @@
+"""
+This file contains the functions necessary for
+converting between visual degrees and pixels on a set-up,
+both for drawing the stimuli and for analysing gaze positions.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import json
+from math import degrees, atan2, sqrt
+import numpy as np
+
+_geometries = {}
+
+
+class Geometry:
+    """
+    All conversions for one monitor (see set_up.get_monitor_and_dir).
+    Pixels are relative to the centre of the screen, with y upwards
+    (as in psychopy), unless stated otherwise.
+
+    Linear conversions use one number of degrees per pixel, the average over
+    half the screen width, which is what the stimuli are drawn with.
+    Exact conversions take into account that pixels further from the centre
+    cover fewer degrees (at 5 degrees in the lab they differ by ~4%).
+
+    usage:
+
+       geometry = get_geometry(monitor, eccentricity)
+       geometry.to_pixels(0.1)  # whole pixels, for drawing
+       x, y = geometry.gaze_to_degrees(samples["x_right"], samples["y_right"])
+    """
+
+    def __init__(self, monitor: dict, eccentricity) -> None:
+        self.resolution = tuple(monitor["resolution"])
+        self.distance = monitor["distance"]
+        self.pixels_per_cm = monitor["resolution"][0] / monitor["width"]
+        self.degrees_per_pixel = degrees(
+            atan2(0.5 * monitor["width"], monitor["distance"])
+        ) / (0.5 * monitor["resolution"][0])
+
+        offset = self.to_pixels(sqrt(1 / 2 * eccentricity**2))
+        self.stimulus_positions = {
+            "left": (-offset, -offset),
+            "right": (offset, -offset),
+            "middle": (0, -offset),
+        }
+
+    def to_pixels(self, size):
+        """Linear conversion of one size or distance (in degrees) to whole pixels."""
+        return round(size / self.degrees_per_pixel)
+
+    def deg2pix(self, angles, exact=False):
+        """Converts degrees from the centre of the screen (any array) to pixels."""
+        if exact:
+            return np.tan(np.radians(angles)) * self.distance * self.pixels_per_cm
+
+        return np.divide(angles, self.degrees_per_pixel)
+
+    def pix2deg(self, pixels, exact=False):
+        """Converts pixels from the centre of the screen (any array) to degrees."""
+        if exact:
+            return np.degrees(
+                np.arctan(np.divide(pixels, self.pixels_per_cm * self.distance))
+            )
+
+        return np.multiply(pixels, self.degrees_per_pixel)
+
+    def stimulus_position(self, position):
+        if position not in self.stimulus_positions:
+            raise Exception(f"Expected 'left' or 'right', but received {position!r}. :(")
+
+        return self.stimulus_positions[position]
+
+    def gaze_to_degrees(self, x, y, exact=False):
+        """
+        Converts gaze positions as recorded by the eyetracker (pixels from the
+        top left of the screen, y downwards) to degrees from the centre, y upwards.
+        Every axis is converted on its own.
+        """
+        x = np.subtract(x, self.resolution[0] / 2)
+        y = np.subtract(self.resolution[1] / 2, y)
+
+        return self.pix2deg(x, exact), self.pix2deg(y, exact)
+
+    def gaze_relative_to(self, position, x, y, exact=False):
+        """Gaze positions (see gaze_to_degrees) in degrees from one of the stimuli."""
+        x, y = self.gaze_to_degrees(x, y, exact)
+        # As plain numbers, so float32 gaze stays float32
+        stimulus_x, stimulus_y = (
+            float(value)
+            for value in self.pix2deg(self.stimulus_position(position), exact)
+        )
+
+        return x - stimulus_x, y - stimulus_y
+
+
+def get_sizes(geometry: Geometry, gabor_size):
+    # Get number of visual degrees per pixel on the screen
+    degrees_per_pixel = geometry.degrees_per_pixel
+
+    # Determine size of Gabor grating
+    sizes = [64, 128, 256, 512, 1024]
+    size_raw = round(gabor_size / degrees_per_pixel)
+    print(size_raw)
+    size = min(sizes, key=lambda x: abs(x - size_raw))
+    print(size)
+
+    return geometry.to_pixels, size
+
+
+def get_geometry(monitor: dict, eccentricity):
+    """Returns the same Geometry every time it's asked for the same set-up."""
+    key = json.dumps([monitor, eccentricity], sort_keys=True)
+
+    if key not in _geometries:
+        _geometries[key] = Geometry(monitor, eccentricity)
+
+    return _geometries[key]
@@ -6,68 +6,100 @@ see README.md for instructions if needed
 """
 
 # Import necessary stuff
+import os
+import sys
+import random
 from psychopy import core
-import pandas as pd
 from participantinfo import get_participant_details
+from registry import Registry
+from datastore import save_session
+from summary import ConditionSummary, summary_file
+from metrics import MetricsPublisher, metrics_file, trial_metrics
+from clocksync import ClockSync, clock_file
+from checkpoint import Checkpoint, restore_random_state
+from tracing import Tracer, span, trace_file
+from profiling import BlockProfiler
+from memory import MemoryTracker, memory_file
+from gcpolicy import GCPolicy, gc_file
+from config import default_config, load_or_compile, session_schedule
 from set_up import get_monitor_and_dir, get_settings
 from eyetracker import Eyelinker
-from trial import single_trial, generate_trial_characteristics
-from time import time
+from trial import single_trial, TrialPreparation
+from schedule import generate_trial_characteristics
 from numpy import mean
 from practice import practice
-import datetime as dt
 from block import (
-    create_trial_list,
-    create_blocks,
     block_break,
     long_break,
     finish,
+    resume_start,
     quick_finish,
 )
 
-N_BLOCKS = 20
-TRIALS_PER_BLOCK = 40
-PREDICTABILITY = 80
-
-
 def main():
     """
     Data formats / storage:
      - eyetracking data saved in one .edf file per session
-     - all trial data saved in one .csv per session
-     - subject data in one .csv (for all sessions combined)
+     - all trial data saved in one .csv and one .parquet per session
+     - summary statistics per condition saved in one .json per session
+     - samples of the computer and eyetracker clocks saved in one .csv per session
+       (trial times are also saved in eyetracker time)
+     - a short record of every trial streamed to one .jsonl per session
+       (follow it live with dashboard.py)
+     - compiled configuration saved in one .json for all sessions with the same
+       configuration and monitor (in the artifacts folder, its hash is saved with
+       every trial), the trial schedule is created from it and the session number
+     - subject data in one .db (for all sessions combined),
+       exported to one .csv after every session
+     - progress saved after every trial in one .json and one .jsonl per session
+       (to continue an interrupted session, see resume)
+     - how long every phase of every trial took saved in one .json per session
+       (a trace, see tracing.py)
+     - when profiling, the busiest functions of every block saved in one .txt per block
+     - when tracking memory, its use at every block break saved in one .txt per session
+     - every garbage collection (with the phase of the trial) saved in one .csv per session
     """
 
     # Set whether this is a test run or not
     testing = False
 
+    # Set whether to save a trace of every trial (see tracing.py)
+    tracing = True
+
+    # Set whether to profile every block: None, "sampling" or "cprofile" (see profiling.py)
+    profiling = None
+
+    # Set whether to track memory use over the blocks (see memory.py)
+    tracking_memory = False
+
     # Get monitor and directory information
     monitor, directory = get_monitor_and_dir(testing)
 
-    # Get participant details and save in same file as before
-    old_participants = pd.read_csv(
-        rf"{directory}\participantinfo.csv",
-        dtype={
-            "participant_number": int,
-            "session_number": int,
-            "age": int,
-            "trials_completed": str,
-        },
+    # Get participant details and register this session
+    registry = Registry(
+        os.path.join(directory, "participantinfo.db"),
+        legacy_csv=os.path.join(directory, "participantinfo.csv"),
     )
-    new_participants = get_participant_details(old_participants, testing)
+    participant, session = get_participant_details(registry, testing)
+
+    # Load the compiled configuration (compiled and saved the first time it's needed),
+    # and create this session's trial schedule from it
+    experiment = load_or_compile(default_config(), monitor, directory)
+    schedule = session_schedule(experiment["config"], seed=session)
 
     # Initialise set-up
-    settings = get_settings(monitor, directory)
+    settings = get_settings(experiment, directory)
     settings["keyboard"].clearEvents()
 
     # Connect to eyetracker and calibrate it
     if not testing:
         eyelinker = Eyelinker(
-            new_participants.participant_number.iloc[-1],
-            new_participants.session_number.iloc[-1],
+            participant,
+            session,
             settings["window"],
             settings["directory"],
         )
+        registry.register_edf(session, 1, eyelinker.host_filename, eyelinker.filename)
         eyelinker.calibrate()
 
     # Start recording eyetracker
@@ -77,68 +109,299 @@ def main():
     # Practice until participant wants to stop
     practice(testing, settings)
 
+    # Run all blocks and save the data
+    finished = run_session(
+        schedule,
+        session,
+        settings,
+        registry,
+        eyetracker=None if testing else eyelinker,
+        testing=testing,
+        config_hash=experiment["hash"],
+        checkpoint=Checkpoint(directory, session, testing),
+        tracer=Tracer() if tracing else None,
+        profiler=BlockProfiler(profiling, directory, session, testing)
+        if profiling
+        else None,
+        memory=MemoryTracker() if tracking_memory else None,
+        gc_policy=GCPolicy(),
+    )
+
+    # Done!
+    if not finished:
+        quick_finish(settings)
+    else:
+        # Thanks for meedoen
+        finish(experiment["config"]["n_blocks"], settings)
+
+    core.quit()
+
+
+def resume(session):
+    """
+    Continues an interrupted session at the next trial, with the same schedule
+    and random state. The eyetracker records into a new .edf segment.
+
+    usage (from the main folder):
+
+       python main.py --resume <session number>
+    """
+    testing = False
+    tracing = True
+
+    monitor, directory = get_monitor_and_dir(testing)
+    registry = Registry(
+        os.path.join(directory, "participantinfo.db"),
+        legacy_csv=os.path.join(directory, "participantinfo.csv"),
+    )
+    participant = registry.participant_of_session(session)
+    state, rows = Checkpoint.load(directory, session, testing)
+
+    experiment = load_or_compile(default_config(), monitor, directory)
+    if experiment["hash"] != state["config_hash"]:
+        raise Exception(
+            f"The configuration changed since session {session} was interrupted."
+        )
+    # The schedule is created from the session number, so this is the same one
+    schedule = session_schedule(experiment["config"], seed=session)
+
+    settings = get_settings(experiment, directory)
+    settings["keyboard"].clearEvents()
+
+    # Reconnect to the eyetracker and only correct drift, there's no practice this time
+    if not testing:
+        segment = state["segment"] + 1
+        eyelinker = Eyelinker(
+            participant,
+            session,
+            settings["window"],
+            settings["directory"],
+            segment=segment,
+        )
+        registry.register_edf(
+            session, segment, eyelinker.host_filename, eyelinker.filename
+        )
+        eyelinker.drift_correct()
+        eyelinker.start()
+
+    resume_start(len(rows), settings)
+
+    finished = run_session(
+        schedule,
+        session,
+        settings,
+        registry,
+        eyetracker=None if testing else eyelinker,
+        testing=testing,
+        config_hash=experiment["hash"],
+        checkpoint=Checkpoint(directory, session, testing),
+        resumed=(state, rows),
+        tracer=Tracer() if tracing else None,
+        gc_policy=GCPolicy(),
+    )
+
+    if not finished:
+        quick_finish(settings)
+    else:
+        finish(experiment["config"]["n_blocks"], settings)
+
+    core.quit()
+
+
+def plan_trial(trial, settings):
+    """
+    Returns the characteristics of a trial, the preparation of its stimuli
+    (see trial.TrialPreparation) and the random state from before it was planned.
+    """
+    target_location, direction, trial_length, congruency = trial
+    random_state = random.getstate()
+
+    trial_characteristics: dict = generate_trial_characteristics(
+        congruency,
+        target_location,
+        trial_length,
+        direction,
+        settings["colours"],
+        settings["orientation_turn"],
+    )
+
+    return (
+        trial_characteristics,
+        TrialPreparation(trial_characteristics, settings),
+        random_state,
+    )
+
+
+def run_session(
+    blocks,
+    session,
+    settings,
+    registry,
+    eyetracker,
+    testing,
+    config_hash=None,
+    checkpoint=None,
+    resumed=None,
+    tracer=None,
+    profiler=None,
+    memory=None,
+    gc_policy=None,
+):
+    """
+    Runs all trials in `blocks` (with breaks in between) and saves the data.
+    `eyetracker` is None when testing. Returns whether all blocks were finished.
+    With a `checkpoint`, progress is saved after every trial. `resumed` is the
+    (state, rows) of an interrupted session (see Checkpoint.load),
+    which then continues at the next trial. With a `tracer`, the phases of
+    every trial are timed and saved as a trace (see tracing.py). With a
+    `profiler`, every block is profiled on its own (see profiling.py).
+    With `memory`, memory use is tracked from block to block (see memory.py).
+    With a `gc_policy`, garbage is only collected outside of the timed screens
+    (see gcpolicy.py).
+    """
+    clock = settings["clock"]
+    if tracer:
+        tracer.start()
+    if memory:
+        memory.start()
+    if gc_policy:
+        gc_policy.start()
+
+    # Keep track of how the eyetracker's clock relates to ours
+    if eyetracker and not eyetracker.tracker.mock:
+        clock_sync = ClockSync(eyetracker.tracker_time, host_time=clock.time)
+    else:
+        clock_sync = None
+
     # Initialise some stuff
-    start_of_experiment = time()
-    data = []
-    current_trial = 0
+    if resumed:
+        state, data = resumed
+        start_of_experiment = state["start_of_experiment"]
+        next_trial = (state["block_index"], state["trial_index"])
+        restore_random_state(state)
+    else:
+        start_of_experiment = clock.time()
+        data = []
+        next_trial = (0, 0)
+    segment = state["segment"] + 1 if resumed else 1
+    first_of_segment = len(data)
+
+    summary = ConditionSummary()
+    for trial in data:
+        summary.update(trial)
+
+    if checkpoint and resumed:
+        checkpoint.resume(state, data)
+    elif checkpoint:
+        checkpoint.start(config_hash, start_of_experiment)
+
+    metrics = MetricsPublisher(metrics_file(settings["directory"], session, testing))
+    current_trial = len(data)
     finished_early = True
-    block_number = 0
-
-    # Pseudo-randomly create conditions and target locations (so they're weighted)
-    n_invalid_trials = N_BLOCKS * TRIALS_PER_BLOCK * (100 - PREDICTABILITY) // 100
-    n_valid_trials = N_BLOCKS * TRIALS_PER_BLOCK * PREDICTABILITY // 100
-    invalid_trials = create_trial_list(n_invalid_trials, "invalid")
-    valid_trials = create_trial_list(n_valid_trials, "valid")
-    blocks = create_blocks(
-        valid_trials, invalid_trials, N_BLOCKS, TRIALS_PER_BLOCK, PREDICTABILITY
-    )
+    n_blocks = len(blocks)
 
     # Start experiment
     try:
-        for block in blocks:
+        for block_index, block in enumerate(blocks):
             # Update block number
-            block_number += 1
+            block_number = block_index + 1
 
-            # Create temporary variable for saving block performance
-            block_performance = []
+            # Skip whatever was done before the session was interrupted
+            if block_index < next_trial[0]:
+                continue
+            trials = list(enumerate(block[0:10] if testing else block))
+            if block_index == next_trial[0]:
+                trials = trials[next_trial[1] :]
 
-            # Run trials per pseudo-randomly created info
-            for target_location, direction, trial_length, congruency in (
-                block[0:10] if testing else block
-            ):
+            # Start a new profile (and save the one of the block before)
+            if profiler:
+                profiler.next_block(block_number)
+
+            # Create temporary variable for saving block performance
+            block_performance = [
+                trial["correct_key"] for trial in data if trial["block"] == block_number
+            ]
+
+            # Run trials per pseudo-randomly created info.
+            # Every trial is planned one trial ahead, so its stimuli
+            # can be prepared during the feedback of the trial before.
+            upcoming = plan_trial(trials[0][1], settings) if trials else None
+            for position, (trial_index, _) in enumerate(trials):
                 current_trial += 1
-                start_time = time()
 
-                trial_characteristics: dict = generate_trial_characteristics(
-                    congruency, target_location, trial_length, direction
-                )
+                # Compare clocks in between trials, where timing doesn't matter
+                if clock_sync:
+                    with span("clock sync"):
+                        clock_sync.sample()
+
+                start_time = clock.time()
+                tracker_start = eyetracker.tracker_time() if eyetracker else None
+
+                trial_characteristics, preparation, _ = upcoming
+                if position + 1 < len(trials):
+                    upcoming = plan_trial(trials[position + 1][1], settings)
+                else:
+                    upcoming = None
 
                 # Generate trial
-                report: dict = single_trial(
-                    **trial_characteristics,
-                    settings=settings,
-                    testing=testing,
-                    eyetracker=None if testing else eyelinker,
-                )
-                end_time = time()
+                if gc_policy:
+                    gc_policy.trial = current_trial
+                with span("trial", trial=current_trial, block=block_number):
+                    report: dict = single_trial(
+                        **trial_characteristics,
+                        settings=settings,
+                        testing=testing,
+                        eyetracker=eyetracker,
+                        preparation=preparation,
+                        prepare_next=upcoming[1] if upcoming else None,
+                        gc_policy=gc_policy,
+                    )
+                end_time = clock.time()
 
                 # Save trial data
                 data.append(
                     {
                         "trial_number": current_trial,
                         "block": block_number,
-                        "start_time": str(
-                            dt.timedelta(seconds=(start_time - start_of_experiment))
-                        ),
-                        "end_time": str(
-                            dt.timedelta(seconds=(end_time - start_of_experiment))
-                        ),
+                        "start_time": start_time - start_of_experiment,
+                        "end_time": end_time - start_of_experiment,
                         **trial_characteristics,
                         **report,
+                        "config_hash": config_hash,
                     }
                 )
 
                 block_performance.append(report["correct_key"])
+                summary.update(data[-1])
+                if eyetracker and tracker_start is not None:
+                    gaze_loss = eyetracker.gaze_loss(
+                        tracker_start, eyetracker.tracker_time()
+                    )
+                else:
+                    gaze_loss = None
+                metrics.publish(trial_metrics(data[-1], gaze_loss=gaze_loss))
+
+                # Save progress, pointing at the next trial (with the random
+                # state from before it was planned, so it's planned the same again)
+                if checkpoint:
+                    with span("save checkpoint"):
+                        checkpoint.save(
+                            data[-1],
+                            block_index,
+                            trial_index + 1,
+                            random_state=upcoming[2] if upcoming else None,
+                        )
+
+            # Register how many trials this participant has completed so far
+            registry.update_trials_completed(session, len(data))
+
+            if memory:
+                memory.snapshot(f"session {session} block {block_number}", len(trials))
+
+            # Collect all garbage now, where it can't delay anything
+            if gc_policy:
+                with span("collect garbage"):
+                    gc_policy.collect_all("block break")
 
             # Calculate average performance score for most recent block
             avg_score = round(mean(block_performance) * 100)
@@ -146,62 +409,99 @@ def main():
             # Break after end of block, unless it's the last block.
             # Experimenter can re-calibrate the eyetracker by pressing 'c' here.
             calibrated = True
-            if block_number == N_BLOCKS // 2:
+            if block_number == n_blocks // 2:
                 while calibrated:
                     calibrated = long_break(
-                        N_BLOCKS,
+                        n_blocks,
                         avg_score,
                         settings,
-                        eyetracker=None if testing else eyelinker,
+                        eyetracker=eyetracker,
                     )
-                if not testing:
-                    eyelinker.start()
-            elif block_number < N_BLOCKS:
+                if eyetracker:
+                    eyetracker.start()
+            elif block_number < n_blocks:
                 while calibrated:
                     calibrated = block_break(
                         block_number,
-                        N_BLOCKS,
+                        n_blocks,
                         avg_score,
                         settings,
-                        eyetracker=None if testing else eyelinker,
+                        eyetracker=eyetracker,
                     )
 
         finished_early = False
 
-    except Exception as e:
+    except (Exception, KeyboardInterrupt) as e:
         if not isinstance(e, KeyboardInterrupt):
             print(e)
 
     finally:
-        # Stop eyetracker (this should also save the data)
-        if not testing:
-            eyelinker.stop()
-
-        # Save all collected trial data to a new .csv
-        pd.DataFrame(data).to_csv(
-            rf"{settings['directory']}\data_session_{new_participants.session_number.iloc[-1]}{'_test' if testing else ''}.csv",
-            index=False,
-        )
+        if profiler:
+            profiler.stop()
+
+        if gc_policy:
+            gc_policy.stop()
+            gc_policy.save(
+                gc_file(
+                    settings["directory"],
+                    session,
+                    testing,
+                    segment=segment,
+                )
+            )
 
-        # Register how many trials this participant has completed
-        new_participants.loc[new_participants.index[-1], "trials_completed"] = str(
-            len(data)
-        )
+        metrics.close()
 
-        # Save participant data to existing .csv file
-        new_participants.to_csv(
-            rf"{settings['directory']}\participantinfo.csv", index=False
-        )
+        # Stop eyetracker (this should also save the data)
+        if eyetracker:
+            eyetracker.stop()
+
+        # Add eyetracker time to the trials of this segment, using all its clock samples
+        # (the tracker may have been restarted since the trials before)
+        if clock_sync and clock_sync.samples:
+            clock_sync.stamp(data[first_of_segment:], start_of_experiment)
+            clock_sync.save(
+                clock_file(settings["directory"], session, testing, segment=segment)
+            )
+
+        # A finished session can't be resumed anymore, an unfinished one
+        # keeps the eyetracker times of this segment for when it's resumed
+        if checkpoint and not finished_early:
+            checkpoint.finish()
+        elif checkpoint:
+            checkpoint.rewrite_rows(data)
+
+        # Save all collected trial data to a new .csv and .parquet
+        save_session(data, settings["directory"], session, testing)
+        summary.save(summary_file(settings["directory"], session, testing))
 
-        # Done!
-        if finished_early:
-            quick_finish(settings)
-        else:
-            # Thanks for meedoen
-            finish(N_BLOCKS, settings)
+        # Register how many trials this participant has completed
+        registry.update_trials_completed(session, len(data))
+
+        # Keep the old participant overview up to date as well
+        registry.export_csv(os.path.join(settings["directory"], "participantinfo.csv"))
+
+        if memory:
+            memory.save(
+                memory_file(settings["directory"], session, testing, segment=segment)
+            )
+
+        if tracer:
+            tracer.stop()
+            tracer.save(
+                trace_file(
+                    settings["directory"],
+                    session,
+                    testing,
+                    segment=segment,
+                )
+            )
 
-        core.quit()
+    return not finished_early
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--resume":
+        resume(int(sys.argv[2]))
+    else:
+        main()
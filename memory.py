@@ -0,0 +1,174 @@
+"""
+This file contains the functions necessary for
+keeping track of memory use during a session, to find out whether
+(and where) it keeps growing from block to block.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import tracemalloc
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    # Then only the memory allocated by python itself is tracked
+    psutil = None
+
+N_FRAMES = 1  # of the traceback remembered for every allocation
+N_SITES = 10  # in every list of growing allocation sites
+WARM_UP = 2  # snapshots, left out when calculating the growth per trial
+# Allocations that aren't the experiment's, including this file's own
+IGNORED = {
+    __file__,
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+}
+
+
+def rss():
+    """The memory this process uses (in bytes), None without psutil."""
+    if psutil is None:
+        return None
+
+    return psutil.Process().memory_info().rss
+
+
+class MemoryTracker:
+    """
+    Takes a snapshot of the memory use (allocated by python, and the whole
+    process) at every block break, and compares it to the snapshot before
+    to find the allocation sites (file and line) that grew the most.
+    Tracing every allocation makes python slower, so only use it to look for leaks.
+
+    usage:
+
+       memory = MemoryTracker()
+       memory.start()
+       memory.snapshot("block 1", n_trials=40)  # trials since the last snapshot
+       memory.save(memory_file(directory, session))
+    """
+
+    def __init__(self, n_frames=N_FRAMES) -> None:
+        self.n_frames = n_frames
+        self.first = None  # memory per allocation site, see allocation_sites
+        self.previous = None
+        self.n_trials = 0
+        self.rows = []
+        self.growth = []  # per snapshot, the sites that grew the most since the one before
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.n_frames)
+        if self.first is None:
+            self.snapshot("start")
+
+    def snapshot(self, label, n_trials=0):
+        sites = allocation_sites(tracemalloc.take_snapshot())
+        traced, peak = tracemalloc.get_traced_memory()
+        self.n_trials += n_trials
+
+        self.rows.append(
+            {
+                "label": label,
+                "trials": self.n_trials,
+                "rss": rss(),
+                "traced": traced,
+                "peak": peak,
+            }
+        )
+        if self.previous is not None:
+            self.growth.append((label, growing_sites(sites, self.previous)))
+        if self.first is None:
+            self.first = sites
+        self.previous = sites
+
+    def growth_per_trial(self, measure="traced", rows=None):
+        """
+        How many bytes are added per trial: the slope over `rows` (by default
+        all snapshots but the first WARM_UP), None if there are too few of them.
+        """
+        if rows is None:
+            rows = self.rows[WARM_UP:]
+        rows = [row for row in rows if row[measure] is not None]
+        trials = [row["trials"] for row in rows]
+        if len(set(trials)) < 2:
+            return None
+
+        return np.polyfit(trials, [row[measure] for row in rows], 1)[0]
+
+    def report(self):
+        lines = [f"{'snapshot':<24} {'trials':>7} {'RSS':>10} {'traced':>10} {'peak':>10}"]
+        for row in self.rows:
+            lines.append(
+                f"{row['label']:<24} {row['trials']:>7} {megabytes(row['rss'])} "
+                f"{megabytes(row['traced'])} {megabytes(row['peak'])}"
+            )
+
+        lines.append("")
+        for measure in ["traced", "rss"]:
+            growth = self.growth_per_trial(measure)
+            if growth is not None:
+                lines.append(f"Growth per trial ({measure}): {growth / 1024:.2f} kB")
+
+        if self.first is not None and self.previous is not self.first:
+            lines += ["", "Largest growth since the start:"]
+            lines += growing_sites(self.previous, self.first)
+
+        for label, sites in self.growth:
+            lines += ["", f"Largest growth up to {label}:"]
+            lines += sites
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        with open(path, "w") as file:
+            file.write(self.report())
+
+
+def allocation_sites(snapshot: tracemalloc.Snapshot):
+    """
+    The size and number of memory blocks allocated at every file and line.
+    Grouped once per snapshot, which is the slow part of comparing snapshots.
+    """
+    sites = {}
+    for statistic in snapshot.statistics("lineno"):
+        frame = statistic.traceback[0]
+        if frame.filename not in IGNORED:
+            sites[f"{frame.filename}:{frame.lineno}"] = (statistic.size, statistic.count)
+
+    return sites
+
+
+def growing_sites(sites, before, n_sites=N_SITES):
+    """The allocation sites that grew the most since `before` (see allocation_sites)."""
+    differences = []
+    for site, (size, count) in sites.items():
+        size_before, count_before = before.get(site, (0, 0))
+        if size > size_before:
+            differences.append((size - size_before, count - count_before, site))
+
+    return [
+        f"  {size / 1024:+10.1f} kB {count:+8} blocks  {site}"
+        for size, count, site in sorted(differences, reverse=True)[:n_sites]
+    ]
+
+
+def megabytes(n_bytes):
+    if n_bytes is None:
+        return f"{'-':>10}"
+
+    return f"{n_bytes / 1024**2:>7.1f} MB"
+
+
+def memory_file(directory, session, testing=False, segment=1):
+    """A resumed session (see main.resume) saves every segment in its own report."""
+    return os.path.join(
+        directory,
+        f"memory_session_{session}"
+        f"{'' if segment == 1 else f'_{segment}'}{'_test' if testing else ''}.txt",
+    )
@@ -0,0 +1,71 @@
+"""
+This file contains the functions necessary for
+publishing a small record of every trial while the experiment runs,
+so the experimenter can follow along using dashboard.py.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import json
+import queue
+import threading
+
+
+class MetricsPublisher:
+    """
+    Appends one line of JSON per trial to a metrics file.
+    Writing happens in a background thread, so `publish` never
+    waits for the disk.
+
+    usage:
+
+       metrics = MetricsPublisher(metrics_file(directory, session))
+       metrics.publish({"trial_number": 1, "correct": True})
+       metrics.close()
+    """
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self.records = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def publish(self, record: dict):
+        self.records.put(record)
+
+    def close(self):
+        self.records.put(None)
+        self.writer.join()
+
+    def _write(self):
+        with open(self.path, "a") as file:
+            while True:
+                record = self.records.get()
+                if record is None:
+                    break
+
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+
+
+def metrics_file(directory, session, testing=False):
+    return os.path.join(
+        directory, f"metrics_session_{session}{'_test' if testing else ''}.jsonl"
+    )
+
+
+def trial_metrics(trial: dict, gaze_loss=None):
+    """`gaze_loss` is the fraction of the trial's samples without gaze data."""
+    return {
+        "trial_number": trial["trial_number"],
+        "block": trial["block"],
+        "trial_condition": trial["trial_condition"],
+        "correct": trial["correct_key"],
+        "missed": trial["missed"],
+        "response_time_in_ms": None if trial["missed"] else trial["response_time_in_ms"],
+        "premature_pressed": trial["premature_pressed"],
+        "timing_error_in_ms": trial["timing_error_in_ms"],
+        "gaze_loss": gaze_loss,
+    }
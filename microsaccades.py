@@ -0,0 +1,449 @@
+"""
+This file contains the functions necessary for
+detecting microsaccades in the eyetracking data of whole sessions,
+following Engbert & Kliegl (2003): velocities from a moving window,
+thresholds relative to the median velocity, and binocular merging.
+Then every trial's microsaccades are epoched around the cue, and their
+rate towards and away from the cued side is aggregated per condition.
+
+usage (from the main folder):
+
+   python microsaccades.py <data directory>
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import sys
+from math import ceil
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from edf import find_edf_files, convert_edf, read_asc, recording_details
+from preprocessing import find_runs, clean_recording, PARAMETERS as CLEANING
+from triggerindex import build_index, join_trials
+from datastore import session_file
+from cache import StageCache, NoCache
+
+CACHE_DIRECTORY = "analysis_cache"
+
+PARAMETERS = {
+    "window": 5,  # samples used for every velocity estimate
+    "threshold": 6,  # multiple of the median-based velocity sd
+    "min_duration": 6,  # in ms
+}
+EPOCH = {"event": "cue_onset", "before": 500, "after": 3200}  # in ms around the event
+BIN_SIZE = 50  # in ms, of the aggregated time course
+EVENT_DTYPES = {
+    "onset": "int64",  # in tracker ms
+    "offset": "int64",
+    "peak_velocity": "float32",  # in pixels/s
+    "amplitude": "float32",  # in pixels
+    "angle": "float32",  # in degrees, 0 is rightwards, 90 is downwards (screen pixels)
+    "eye": "category",
+}
+
+
+def velocity(position, rate, window=PARAMETERS["window"]):
+    """
+    Velocity of every sample from the samples around it (in units/s).
+    With a window of 5: v(n) = (x(n+2) + x(n+1) - x(n-1) - x(n-2)) * rate / 6.
+    The first and last samples (and any next to missing data) are NaN.
+    """
+    half = window // 2
+    position = np.asarray(position, dtype=np.float32)
+    result = np.full(position.shape, np.nan, dtype=np.float32)
+
+    if len(position) > 2 * half:
+        summed = np.zeros(len(position) - 2 * half, dtype=np.float32)
+        for step in range(1, half + 1):
+            summed += (
+                position[half + step : len(position) - half + step]
+                - position[half - step : len(position) - half - step]
+            )
+        summed *= rate / (half * (half + 1))
+        result[half : len(position) - half] = summed
+
+    return result
+
+
+def velocity_thresholds(vx, vy, threshold=PARAMETERS["threshold"]):
+    """Median-based sd of the velocities per direction, times `threshold`."""
+    sigmas = []
+    for v in (vx, vy):
+        v = v[~np.isnan(v)]
+        sigma = np.sqrt(np.median(v * v) - np.median(v) ** 2)
+        if not sigma > 0:
+            # Almost no movement at all, fall back to the mean
+            sigma = np.sqrt(np.mean(v * v) - np.mean(v) ** 2)
+        sigmas.append(sigma)
+
+    return threshold * sigmas[0], threshold * sigmas[1]
+
+
+def detect_monocular(time, x, y, rate, parameters=PARAMETERS):
+    """
+    Detects microsaccades in the samples of one eye.
+    Returns a table with one row per microsaccade (see EVENT_DTYPES).
+    """
+    vx = velocity(x, rate, parameters["window"])
+    vy = velocity(y, rate, parameters["window"])
+    threshold_x, threshold_y = velocity_thresholds(vx, vy, parameters["threshold"])
+
+    # Samples outside the elliptic threshold (NaN compares as False)
+    above = (vx / threshold_x) ** 2 + (vy / threshold_y) ** 2 > 1
+    starts, ends = find_runs(above)
+
+    long_enough = ends - starts >= ceil(parameters["min_duration"] * rate / 1000)
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    if len(starts) == 0:
+        return pd.DataFrame(
+            {column: pd.Series(dtype=dtype) for column, dtype in EVENT_DTYPES.items()}
+        )
+
+    speed = np.hypot(vx, vy)
+    speed[np.isnan(speed)] = 0
+    dx = x[ends - 1] - x[starts]
+    dy = y[ends - 1] - y[starts]
+
+    return pd.DataFrame(
+        {
+            "onset": time[starts],
+            "offset": time[ends - 1],
+            "peak_velocity": peak_per_run(speed, starts, ends),
+            "amplitude": np.hypot(dx, dy),
+            "angle": np.degrees(np.arctan2(dy, dx)),
+        }
+    )
+
+
+def peak_per_run(values, starts, ends):
+    # reduceat reduces up to the next start, so stops are added as extra starts
+    boundaries = np.stack([starts, ends], axis=1).ravel()
+    if boundaries[-1] == len(values):
+        boundaries = boundaries[:-1]
+    return np.maximum.reduceat(values, boundaries)[::2]
+
+
+def merge_binocular(left: pd.DataFrame, right: pd.DataFrame):
+    """
+    Keeps the microsaccades that overlap in time in both eyes, as one event
+    from the first onset to the last offset, with the average amplitude and angle.
+    """
+    if len(left) == 0 or len(right) == 0:
+        # Then no microsaccade was seen by both eyes
+        return pd.DataFrame(
+            {
+                column: pd.Series(dtype=dtype)
+                for column, dtype in EVENT_DTYPES.items()
+                if column != "eye"
+            }
+        )
+
+    # Events don't overlap within an eye, so the first right event that ends
+    # after a left event starts is the only candidate
+    candidate = np.searchsorted(right.offset.to_numpy(), left.onset.to_numpy())
+    valid = candidate < len(right)
+    candidate = np.minimum(candidate, len(right) - 1)
+    overlapping = valid & (right.onset.to_numpy()[candidate] <= left.offset.to_numpy())
+
+    left = left[overlapping].reset_index(drop=True)
+    right = right.iloc[candidate[overlapping]].reset_index(drop=True)
+
+    # Average the directions as vectors, so e.g. 179 and -179 give 180
+    dx = (
+        left.amplitude * np.cos(np.radians(left.angle))
+        + right.amplitude * np.cos(np.radians(right.angle))
+    ) / 2
+    dy = (
+        left.amplitude * np.sin(np.radians(left.angle))
+        + right.amplitude * np.sin(np.radians(right.angle))
+    ) / 2
+
+    return pd.DataFrame(
+        {
+            "onset": np.minimum(left.onset, right.onset),
+            "offset": np.maximum(left.offset, right.offset),
+            "peak_velocity": np.maximum(left.peak_velocity, right.peak_velocity),
+            "amplitude": (left.amplitude + right.amplitude) / 2,
+            "angle": np.degrees(np.arctan2(dy, dx)),
+        }
+    )
+
+
+def detect(recording: dict, parameters=PARAMETERS, binocular=True):
+    """
+    Detects microsaccades in a recording (see edf.read_asc). With two eyes
+    recorded and `binocular`, only microsaccades in both eyes are kept.
+    """
+    samples = recording["samples"]
+    per_eye = {
+        eye: detect_monocular(
+            samples["time"],
+            samples[f"x_{eye}"],
+            samples[f"y_{eye}"],
+            recording["rate"],
+            parameters,
+        )
+        for eye in recording["eyes"]
+    }
+
+    if binocular and len(per_eye) == 2:
+        events = merge_binocular(per_eye["left"], per_eye["right"])
+        events["eye"] = "both"
+    else:
+        events = pd.concat(
+            [table.assign(eye=eye) for eye, table in per_eye.items()],
+            ignore_index=True,
+        )
+
+    return events.astype(EVENT_DTYPES)
+
+
+def epoch_microsaccades(data_file, *segments, epoch=EPOCH):
+    """
+    Every microsaccade from `epoch["before"]` ms before to `epoch["after"]` ms
+    after the event of its trial. `segments` are the recordings of every
+    segment of a session (see edf.read_asc, in segment order) followed by
+    their microsaccades (see detect), `data_file` is the session's .parquet
+    file (see datastore.save_session). Returns a dict with
+     - microsaccades: with their time relative to the event (in ms), and
+       whether they went towards the cued side (horizontally)
+     - trials: every trial they were looked for in
+    """
+    recordings = segments[: len(segments) // 2]
+    events = segments[len(segments) // 2 :]
+    data = pd.read_parquet(data_file)
+    index, _ = build_index([recording["messages"] for recording in recordings], data)
+    trials = join_trials(data, index)
+    trials = trials[trials[epoch["event"]].notna()]
+    trials = pd.DataFrame(
+        {
+            "trial_number": trials.trial_number.to_numpy(),
+            "segment": trials.segment.to_numpy(),
+            "event_time": trials[epoch["event"]].to_numpy(),
+            "trial_condition": trials.trial_condition.astype(str).to_numpy(),
+            # The capture colour is the target's on valid trials
+            "cued_side": np.where(
+                trials.trial_condition == "valid",
+                trials.target_bar.astype(str),
+                np.where(trials.target_bar == "left", "right", "left"),
+            ),
+        }
+    )
+
+    epochs = []
+    for segment, segment_events in enumerate(events, start=1):
+        segment_events = segment_events.sort_values("onset", ignore_index=True)
+        onsets = segment_events.onset.to_numpy()
+        in_segment = trials[trials.segment == segment]
+        firsts = np.searchsorted(onsets, in_segment.event_time - epoch["before"])
+        lasts = np.searchsorted(onsets, in_segment.event_time + epoch["after"])
+
+        for trial, first, last in zip(in_segment.itertuples(), firsts, lasts):
+            found = segment_events.iloc[first:last]
+            rightwards = np.cos(np.radians(found.angle.to_numpy())) > 0
+            epochs.append(
+                pd.DataFrame(
+                    {
+                        "trial_number": trial.trial_number,
+                        "trial_condition": trial.trial_condition,
+                        "time": found.onset.to_numpy() - trial.event_time,
+                        "amplitude": found.amplitude.to_numpy(),
+                        "angle": found.angle.to_numpy(),
+                        "towards_cue": rightwards == (trial.cued_side == "right"),
+                    }
+                )
+            )
+
+    microsaccades = (
+        pd.concat(epochs, ignore_index=True)
+        if epochs
+        else pd.DataFrame(
+            columns=["trial_number", "trial_condition", "time", "towards_cue"]
+        )
+    )
+
+    return {"microsaccades": microsaccades, "trials": trials}
+
+
+def aggregate_microsaccades(epoched: dict, epoch=EPOCH, bin_size=BIN_SIZE):
+    """
+    The rate (per second, per trial) of microsaccades towards and away from
+    the cued side in every condition, in bins of `bin_size` ms from the start
+    of the epoch (see epoch_microsaccades), and the bias: towards minus away.
+    """
+    microsaccades, trials = epoched["microsaccades"], epoched["trials"]
+    edges = np.arange(-epoch["before"], epoch["after"] + bin_size, bin_size)
+
+    time_courses = []
+    for condition, n_trials in trials.trial_condition.value_counts().items():
+        selected = microsaccades[microsaccades.trial_condition == condition]
+        towards_cue = selected.towards_cue.to_numpy(dtype=bool)
+        towards, _ = np.histogram(selected.time[towards_cue], edges)
+        away, _ = np.histogram(selected.time[~towards_cue], edges)
+        scale = 1000 / bin_size / n_trials
+
+        time_courses.append(
+            pd.DataFrame(
+                {
+                    "trial_condition": condition,
+                    "time": edges[:-1],
+                    "n_trials": n_trials,
+                    "towards": towards * scale,
+                    "away": away * scale,
+                    "bias": (towards - away) * scale,
+                }
+            )
+        )
+
+    return pd.concat(time_courses, ignore_index=True)
+
+
+def event_file(file):
+    return os.path.splitext(file)[0] + "_microsaccades.parquet"
+
+
+def bias_file(directory, session):
+    return os.path.join(directory, f"microsaccade_bias_session_{session}.parquet")
+
+
+def detect_stages(cache, file, parameters, binocular, cleaning):
+    """The parse and detect stages of one .edf (or .asc) file, see detect_file."""
+    if file.endswith(".edf"):
+        file = convert_edf(file)
+
+    parsed = cache.run("parse", read_asc, [file])
+    cleaned = cache.run("clean", clean_recording, [parsed], {"parameters": cleaning})
+    detected = cache.run(
+        "detect",
+        detect,
+        [cleaned],
+        {"parameters": parameters, "binocular": binocular},
+    )
+
+    return file, parsed, detected
+
+
+def detect_file(
+    file, parameters=PARAMETERS, binocular=True, cleaning=CLEANING, cache_directory=None
+):
+    """
+    Cleans one .edf (or .asc) file (see preprocessing.clean), detects its
+    microsaccades and saves them next to it. With a `cache_directory`, every
+    stage is only recomputed if its input or parameters changed.
+    Returns the saved file and how many stages were reused.
+    """
+    cache = NoCache() if cache_directory is None else StageCache(cache_directory)
+    file, _, detected = detect_stages(cache, file, parameters, binocular, cleaning)
+
+    cache.load(detected).to_parquet(event_file(file), index=False)
+
+    return event_file(file), cache.report()
+
+
+def detect_session(
+    directory,
+    session,
+    files,
+    parameters=PARAMETERS,
+    binocular=True,
+    cleaning=CLEANING,
+    epoch=EPOCH,
+    bin_size=BIN_SIZE,
+    cache_directory=None,
+):
+    """
+    Detects the microsaccades in every segment of a session's recording
+    (`files`, in segment order) as detect_file does, then epochs them around
+    every trial's event and aggregates them per condition (see
+    aggregate_microsaccades), saved as microsaccade_bias_session_N.parquet.
+    Sessions without behavioural data are only detected.
+    Returns the saved files and how many stages were reused.
+    """
+    cache = NoCache() if cache_directory is None else StageCache(cache_directory)
+    stages = [
+        detect_stages(cache, file, parameters, binocular, cleaning) for file in files
+    ]
+
+    saved = []
+    for file, _, detected in stages:
+        cache.load(detected).to_parquet(event_file(file), index=False)
+        saved.append(event_file(file))
+
+    data_file = session_file(directory, session)
+    if os.path.exists(data_file):
+        epoched = cache.run(
+            "epoch",
+            epoch_microsaccades,
+            [
+                data_file,
+                *[parsed for _, parsed, _ in stages],
+                *[detected for _, _, detected in stages],
+            ],
+            {"epoch": epoch},
+        )
+        aggregated = cache.run(
+            "aggregate",
+            aggregate_microsaccades,
+            [epoched],
+            {"epoch": epoch, "bin_size": bin_size},
+        )
+        cache.load(aggregated).to_parquet(bias_file(directory, session), index=False)
+        saved.append(bias_file(directory, session))
+
+    return saved, cache.report()
+
+
+def detect_sessions(
+    directory,
+    parameters=PARAMETERS,
+    binocular=True,
+    cleaning=CLEANING,
+    epoch=EPOCH,
+    bin_size=BIN_SIZE,
+    cache=True,
+    max_workers=None,
+):
+    """
+    Detects, epochs and aggregates the microsaccades of every session in
+    `directory` (see detect_session), sessions in parallel.
+    With `cache`, intermediate results are kept in the analysis_cache folder.
+    On Windows, call this from within `if __name__ == "__main__":`.
+    """
+    sessions = {}
+    for file in find_edf_files(directory):
+        sessions.setdefault(recording_details(file)[0], []).append(file)
+    cache_directory = os.path.join(directory, CACHE_DIRECTORY) if cache else None
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                detect_session,
+                [directory] * len(sessions),
+                list(sessions),
+                list(sessions.values()),
+                [parameters] * len(sessions),
+                [binocular] * len(sessions),
+                [cleaning] * len(sessions),
+                [epoch] * len(sessions),
+                [bin_size] * len(sessions),
+                [cache_directory] * len(sessions),
+            )
+        )
+
+    print(f"Detected microsaccades in {len(results)} sessions.")
+    if cache and results:
+        print(
+            pd.concat([report for _, report in results])
+            .groupby("stage", sort=False)
+            .sum()
+            .to_string()
+        )
+
+    return [file for saved, _ in results for file in saved]
+
+
+if __name__ == "__main__":
+    detect_sessions(sys.argv[1])
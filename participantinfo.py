@@ -7,31 +7,109 @@ made by Anna van Harmelen, 2023
 """
 
 import random
-import pandas as pd
+import hashlib
 
+PARTICIPANT_ID_RANGE = (10, 99)  # lowest and highest possible participant number
+FEISTEL_ROUNDS = 4  # of the permutation the participant numbers are handed out in
 
-def get_participant_details(existing_participants: pd.DataFrame, testing):
-    # Generate random & unique participant number
-    participant = random.randint(10, 99)
-    while participant in existing_participants.participant_number.tolist():
-        participant = random.randint(10, 99)
-    
-    print(f"Participant number: {participant}")
 
+class ParticipantIDAllocator:
+    """
+    Hands out unique participant numbers in an unpredictable order.
+
+    The order is a permutation of the ID space, worked out one position at a
+    time (see participant_at), so it costs the same for any size of range.
+    Every allocation takes the next number in that order that isn't taken yet. Taken numbers
+    are kept in a set, so checking for collisions doesn't depend on how
+    many participants are already registered. Anything with `in` and `add`
+    can stand in for that set (see registry.RegisteredNumbers).
+
+    With the same `seed`, the order is the same, so allocation can continue
+    later from `position` (see registry.Registry.register_session).
+
+    usage:
+
+       allocator = ParticipantIDAllocator(taken=[12, 34], id_range=(10, 99))
+       participant = allocator.allocate()
+    """
+
+    def __init__(
+        self, taken=(), id_range=PARTICIPANT_ID_RANGE, seed=None, position=0
+    ) -> None:
+        lowest, highest = id_range
+        if lowest > highest:
+            raise Exception(
+                f"Expected a participant ID range of (lowest, highest), but received {id_range!r}."
+            )
+
+        self.id_range = (lowest, highest)
+        self.taken = (
+            taken
+            if hasattr(taken, "add")
+            else set(int(participant) for participant in taken)
+        )
+
+        self.size = highest - lowest + 1
+        self.seed = random.SystemRandom().getrandbits(32) if seed is None else seed
+        self.position = position
+
+        # The permutation works on numbers of an even number of bits, half per side
+        self.half_bits = max(1, ((self.size - 1).bit_length() + 1) // 2)
+
+    def participant_at(self, position):
+        """
+        The participant number at `position` in the order: a Feistel network
+        shuffles the bits of the position, and is applied again until the
+        result falls within the range (on average less than 4 times).
+        """
+        mask = (1 << self.half_bits) - 1
+        index = position
+        while True:
+            left, right = index >> self.half_bits, index & mask
+            for round_number in range(FEISTEL_ROUNDS):
+                digest = hashlib.blake2b(
+                    f"{self.seed}:{round_number}:{right}".encode(), digest_size=8
+                ).digest()
+                left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+            index = (left << self.half_bits) | right
+
+            if index < self.size:
+                return self.id_range[0] + index
+
+    def is_taken(self, participant):
+        return participant in self.taken
+
+    def reserve(self, participant):
+        if self.is_taken(participant):
+            raise Exception(f"Participant number {participant} is already taken.")
+        self.taken.add(participant)
+
+    def allocate(self):
+        # Every number in the order is passed at most once, so this is O(1) amortised
+        while self.position < self.size:
+            participant = self.participant_at(self.position)
+            self.position += 1
+
+            if not self.is_taken(participant):
+                self.taken.add(participant)
+                return participant
+
+        raise Exception(
+            f"All participant numbers between {self.id_range[0]} and {self.id_range[1]} are taken, "
+            "widen PARTICIPANT_ID_RANGE to register more participants."
+        )
+
+
+def get_participant_details(registry, testing, id_range=PARTICIPANT_ID_RANGE):
     if not testing:
         # Get participant age
         age = int(input("Participant age: "))
     else:
         age = 00
 
-    # Insert session number
-    session = max(existing_participants.session_number) + 1
+    # Generate random & unique participant number and insert session number
+    participant, session = registry.register_session(age, id_range)
 
-    new_participant = pd.DataFrame(
-        {"age": [age], "participant_number": [participant], "session_number": [session]}
-    )
-    all_participants = pd.concat(
-        [existing_participants, new_participant], ignore_index=True
-    )
+    print(f"Participant number: {participant}")
 
-    return all_participants
+    return participant, session
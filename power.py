@@ -0,0 +1,237 @@
+"""
+This script estimates how many participants are needed to detect a
+validity effect in this exact design, by simulating whole studies with
+synthetic observers on the real trial schedule (see config.session_schedule).
+
+usage (from the main folder):
+
+   python power.py [output .csv]
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import sys
+import json
+import random
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
+from config import default_config, session_schedule, config_hash
+from schedule import generate_trial_characteristics
+
+# Parameters of the synthetic observer
+OBSERVER = {
+    "threshold": 1.5,  # orientation change (deg) at which a valid trial is ~82% correct
+    "validity_cost": 1.1,  # threshold is this many times higher on invalid trials
+    "threshold_sd": 0.3,  # between-participant sd of log(threshold)
+    "lapse_rate": 0.03,
+    "median_rt": 550,  # in ms, on valid trials
+    "rt_validity_cost": 10,  # in ms, slower on invalid trials
+    "validity_decay": 2000,  # in ms of static duration, for both validity costs to fall by 1/e
+    "foreperiod_effect": -20,  # in ms per s of static duration, as the change becomes more expected
+    "rt_sd": 0.25,  # sd of log(rt)
+    "rt_participant_sd": 0.15,  # between-participant sd of log(median rt)
+    "gaze_bias": 0.05,  # proportion of microsaccades towards the cued side above 50%
+    "gaze_bias_sd": 0.05,  # between-participant sd of the gaze bias
+    "microsaccade_rate": 1.5,  # per trial
+}
+N_SCHEDULES = 20  # real schedules per worker, participants are assigned one at random
+ALPHA = 0.05
+# Next to this file, wherever it's run from
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "power_cache")
+
+
+def schedule_arrays(config, n_schedules, seed):
+    """
+    Runs the real schedule and trial generators, and keeps what the observer
+    model needs as arrays of shape (n_schedules, n_trials).
+    """
+    random.seed(seed)
+    invalid, turn, duration = [], [], []
+
+    for schedule in range(n_schedules):
+        trials = [
+            generate_trial_characteristics(
+                congruency,
+                target,
+                length,
+                direction,
+                config["colours"],
+                config["orientation_turn"],
+            )
+            for block in session_schedule(config, seed * n_schedules + schedule)
+            for target, direction, length, congruency in block
+        ]
+        invalid.append([trial["trial_condition"] == "invalid" for trial in trials])
+        turn.append(
+            [
+                abs(trial["target_post_orientation"] - trial["target_pre_orientation"])
+                for trial in trials
+            ]
+        )
+        duration.append([trial["static_duration"] for trial in trials])
+
+    return np.array(invalid), np.array(turn, dtype=float), np.array(duration)
+
+
+def simulate_studies(observer, config, n_participants, n_studies, seed):
+    """
+    Simulates `n_studies` studies of `n_participants` each, all trials at once.
+    Returns the p-values of the accuracy, RT and gaze bias validity effects.
+    """
+    rng = np.random.default_rng(seed)
+    invalid, turn, duration = schedule_arrays(config, N_SCHEDULES, seed)
+
+    # Which schedule every participant gets, shape (studies, participants, trials)
+    assigned = rng.integers(N_SCHEDULES, size=(n_studies, n_participants))
+    invalid = invalid[assigned]
+    turn = turn[assigned]
+    duration = duration[assigned]
+    shape = invalid.shape
+
+    # The cue is followed less the longer ago it was shown (the static
+    # duration), so both validity costs fade with it
+    fading = np.exp(-(duration - duration.min()) / observer["validity_decay"])
+
+    # Accuracy follows a Weibull psychometric function of the orientation change
+    threshold = observer["threshold"] * np.exp(
+        rng.normal(0, observer["threshold_sd"], size=shape[:2] + (1,))
+    )
+    threshold = np.where(
+        invalid, threshold * observer["validity_cost"] ** fading, threshold
+    )
+    p_correct = 0.5 + (0.5 - observer["lapse_rate"]) * (
+        1 - np.exp(-((turn / threshold) ** 3.5))
+    )
+    correct = rng.random(shape) < p_correct
+
+    # Log-normal response times
+    median_rt = observer["median_rt"] * np.exp(
+        rng.normal(0, observer["rt_participant_sd"], size=shape[:2] + (1,))
+    )
+    rt = (
+        median_rt
+        + invalid * fading * observer["rt_validity_cost"]
+        + duration / 1000 * observer["foreperiod_effect"]
+    ) * np.exp(
+        rng.normal(0, observer["rt_sd"], size=shape)
+    )
+
+    # Microsaccades towards the cued side
+    gaze_bias = observer["gaze_bias"] + rng.normal(
+        0, observer["gaze_bias_sd"], size=shape[:2] + (1,)
+    )
+    n_microsaccades = rng.poisson(observer["microsaccade_rate"], size=shape)
+    towards = rng.binomial(n_microsaccades, np.clip(0.5 + gaze_bias, 0, 1))
+    gaze_index = (2 * towards - n_microsaccades).sum(axis=2) / np.maximum(
+        n_microsaccades.sum(axis=2), 1
+    )
+
+    # Per participant effects, then a one-sample t-test per study
+    n_invalid = invalid.sum(axis=2)
+    n_valid = shape[2] - n_invalid
+    effects = {
+        "accuracy": (correct * ~invalid).sum(axis=2) / n_valid
+        - (correct * invalid).sum(axis=2) / n_invalid,
+        "rt": (rt * invalid).sum(axis=2) / n_invalid
+        - (rt * ~invalid).sum(axis=2) / n_valid,
+        "gaze_bias": gaze_index,
+    }
+
+    return {
+        measure: one_sample_p_values(effect) for measure, effect in effects.items()
+    }
+
+
+def one_sample_p_values(effects):
+    n = effects.shape[1]
+    t = effects.mean(axis=1) / (effects.std(axis=1, ddof=1) / np.sqrt(n))
+    return 2 * stats.t.sf(np.abs(t), df=n - 1)
+
+
+def power_for(observer, config, n_participants, n_studies, seed):
+    p_values = simulate_studies(observer, config, n_participants, n_studies, seed)
+    return {measure: (p < ALPHA).sum() for measure, p in p_values.items()}
+
+
+def cache_key(observer, config, participant_counts, n_studies, seed):
+    parameters = {
+        "observer": observer,
+        # The design the schedules are created with, the monitor doesn't matter
+        "config_hash": config_hash(config, monitor=None),
+        "participant_counts": list(participant_counts),
+        "n_studies": n_studies,
+        "seed": seed,
+        "alpha": ALPHA,
+    }
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+
+def power_curve(
+    observer=OBSERVER,
+    config=None,
+    participant_counts=range(10, 41, 5),
+    n_studies=2000,
+    seed=0,
+    chunk_size=250,
+    cache_directory=CACHE_DIRECTORY,
+    max_workers=None,
+):
+    """
+    Returns the power to detect each validity effect for every number of participants.
+    `config` is the design (see config.default_config, which is used if None).
+    Results are cached per parameter set in `cache_directory`.
+    """
+    if config is None:
+        config = default_config()
+
+    cache_path = os.path.join(
+        cache_directory,
+        f"{cache_key(observer, config, participant_counts, n_studies, seed)}.csv",
+    )
+    if os.path.exists(cache_path):
+        return pd.read_csv(cache_path)
+
+    # Split every number of participants into chunks of studies, each with its own seed
+    tasks = [
+        (n_participants, min(chunk_size, n_studies - start))
+        for n_participants in participant_counts
+        for start in range(0, n_studies, chunk_size)
+    ]
+    seeds = np.random.SeedSequence(seed).generate_state(len(tasks))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                power_for,
+                [observer] * len(tasks),
+                [config] * len(tasks),
+                [n_participants for n_participants, _ in tasks],
+                [n_studies_chunk for _, n_studies_chunk in tasks],
+                [int(task_seed) for task_seed in seeds],
+            )
+        )
+
+    rows = {}
+    for (n_participants, _), significant in zip(tasks, results):
+        row = rows.setdefault(n_participants, {"n_participants": n_participants})
+        for measure, count in significant.items():
+            row[measure] = row.get(measure, 0) + count / n_studies
+
+    curve = pd.DataFrame(list(rows.values()))
+
+    os.makedirs(cache_directory, exist_ok=True)
+    curve.to_csv(cache_path, index=False)
+
+    return curve
+
+
+if __name__ == "__main__":
+    curve = power_curve()
+    print(curve.round(3).to_string(index=False))
+
+    if len(sys.argv) > 1:
+        curve.to_csv(sys.argv[1], index=False)
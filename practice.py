@@ -6,16 +6,17 @@ To run the 'microsaccade bias' experiment, see main.py.
 made by Anna van Harmelen, 2023
 """
 
-from trial import (
-    single_trial,
-    generate_trial_characteristics,
-    show_text,
-)
+from trial import single_trial, show_text
+from schedule import generate_trial_characteristics
 from stimuli import make_one_gabor, create_fixation_dot
-from response import get_response, wait_for_key, check_quit
+from response import (
+    get_response,
+    wait_for_key,
+    check_quit,
+    start_response_clock_on_flip,
+)
 from psychopy import event
 from psychopy.hardware.keyboard import Keyboard
-from trial import COLOURS
 from time import sleep
 import random
 from numpy import mean
@@ -44,7 +45,7 @@ def practice(testing, settings):
             else:
                 change_direction = "clockwise"
 
-            colour = random.choice(COLOURS)
+            colour = random.choice(settings["colours"])
 
             make_one_gabor(orientation, colour, "middle", settings).draw()
             create_fixation_dot(settings)
@@ -57,7 +58,7 @@ def practice(testing, settings):
             make_one_gabor(new_orientation, colour, "middle", settings).draw()
             create_fixation_dot(settings)
 
-            settings["window"].flip()
+            start_response_clock_on_flip(settings)
             response = get_response(
                 settings, testing, None, "valid", change_direction, None
             )
@@ -101,6 +102,8 @@ def practice(testing, settings):
                 random.choice(["left", "right"]),
                 random.choice(list(range(500, 3201, 300))),
                 change_direction,
+                settings["colours"],
+                settings["orientation_turn"],
             )
 
             report: dict = single_trial(**stimulus, settings=settings, testing=True)
@@ -0,0 +1,139 @@
+"""
+This file contains the functions necessary for
+finding blinks and other missing data in the eyetracking data,
+and interpolating (or masking) them before detecting microsaccades.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import numpy as np
+import pandas as pd
+
+PARAMETERS = {
+    "margin": 50,  # in ms, removed around every gap (the eyelid moves before and after)
+    "blink_duration": (50, 500),  # in ms, shorter or longer gaps are tracker dropouts
+    "max_interpolation": 500,  # in ms, longer gaps are masked instead
+    "interpolate": True,
+}
+
+
+def find_runs(mask):
+    """Returns the start and end (exclusive) index of every run of True in `mask`."""
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def gap_mask(samples, eye):
+    """Returns which samples of `eye` are missing (no gaze position or no pupil)."""
+    pupil = samples[f"pupil_{eye}"]
+    return (
+        np.isnan(samples[f"x_{eye}"])
+        | np.isnan(samples[f"y_{eye}"])
+        | np.isnan(pupil)
+        | (pupil == 0)
+    )
+
+
+def pad_runs(starts, ends, margin, length):
+    """
+    Widens every run by `margin` samples on both sides (within 0 and `length`)
+    and merges the runs that overlap afterwards.
+    """
+    starts = np.maximum(starts - margin, 0)
+    ends = np.minimum(ends + margin, length)
+    if len(starts) == 0:
+        return starts, ends
+
+    # A run starts a new group if it starts after all earlier runs ended
+    furthest_end = np.maximum.accumulate(ends)
+    new_group = np.concatenate(([True], starts[1:] > furthest_end[:-1]))
+    group_ends = np.concatenate((np.flatnonzero(new_group)[1:] - 1, [len(ends) - 1]))
+
+    return starts[new_group], furthest_end[group_ends]
+
+
+def run_indices(starts, ends):
+    """Returns the index of every sample in the runs, and which run it's in."""
+    lengths = ends - starts
+    run = np.repeat(np.arange(len(starts)), lengths)
+    position = np.arange(lengths.sum()) - (np.cumsum(lengths) - lengths)[run]
+    return starts[run] + position, run, position
+
+
+def interpolate_runs(values, starts, ends):
+    """
+    Replaces the samples in every run by a straight line between the samples
+    just before and after it, in place. Runs can't touch the edges.
+    """
+    index, run, position = run_indices(starts, ends)
+    fraction = (position + 1) / (ends - starts + 1)[run]
+
+    before = values[starts - 1][run]
+    after = values[ends][run]
+    values[index] = before + (after - before) * fraction
+
+
+def mask_runs(values, starts, ends):
+    values[run_indices(starts, ends)[0]] = np.nan
+
+
+def clean(samples, eyes, rate, parameters=PARAMETERS):
+    """
+    Finds the gaps of every eye in `samples` (see edf.read_asc), widens them by
+    the margin and interpolates or masks them, in place. `samples` can be
+    memory-mapped, so nothing but a few masks has to fit in memory.
+    Returns a table of the gaps that were found (before widening).
+    """
+    to_samples = rate / 1000
+    margin = round(parameters["margin"] * to_samples)
+    shortest_blink, longest_blink = (
+        duration * to_samples for duration in parameters["blink_duration"]
+    )
+
+    gaps = []
+    for eye in eyes:
+        starts, ends = find_runs(gap_mask(samples, eye))
+        lengths = ends - starts
+        gaps.append(
+            pd.DataFrame(
+                {
+                    "eye": eye,
+                    "onset": samples["time"][starts],
+                    "offset": samples["time"][ends - 1],
+                    "blink": (lengths >= shortest_blink) & (lengths <= longest_blink),
+                }
+            )
+        )
+
+        # Only gaps with data on both sides can be interpolated
+        starts, ends = pad_runs(starts, ends, margin, len(samples))
+        interpolated = (
+            parameters["interpolate"]
+            & (ends - starts <= parameters["max_interpolation"] * to_samples)
+            & (starts > 0)
+            & (ends < len(samples))
+        )
+
+        for name in [f"x_{eye}", f"y_{eye}", f"pupil_{eye}"]:
+            interpolate_runs(samples[name], starts[interpolated], ends[interpolated])
+            mask_runs(samples[name], starts[~interpolated], ends[~interpolated])
+
+    return pd.concat(gaps, ignore_index=True)
+
+
+def clean_recording(recording: dict, parameters=PARAMETERS):
+    """Cleans a recording (see edf.read_asc) in place, and adds its gaps."""
+    recording["gaps"] = clean(
+        recording["samples"], recording["eyes"], recording["rate"], parameters
+    )
+    return recording
+
+
+def clean_file(file, eyes, rate, parameters=PARAMETERS):
+    """Cleans a saved sample array (.npy, see edf.sample_dtype) without loading it."""
+    samples = np.load(file, mmap_mode="r+")
+    gaps = clean(samples, eyes, rate, parameters)
+    samples.flush()
+
+    return gaps
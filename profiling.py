@@ -0,0 +1,170 @@
+"""
+This file contains the functions necessary for
+profiling where the time goes during a whole session (including psychopy itself),
+with a report of the busiest functions for every block.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import io
+import os
+import sys
+import pstats
+import cProfile
+import threading
+from time import sleep
+
+INTERVAL = 0.005  # in s, between two samples of the sampling profiler
+N_FUNCTIONS = 40  # in every report
+
+
+class SamplingProfiler:
+    """
+    Looks at what the thread that started it is doing every `interval`,
+    from a background thread. Cheap enough to leave on for a whole session,
+    but only finds functions that take a noticeable share of the time.
+    """
+
+    def __init__(self, interval=INTERVAL) -> None:
+        self.interval = interval
+        self.own = {}  # samples in which a function was running itself
+        self.total = {}  # samples in which a function was anywhere on the stack
+        self.n_samples = 0
+        self.running = False
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.running = True
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.running = False
+        self.sampler.join()
+
+    def _sample(self):
+        while self.running:
+            sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            self.n_samples += 1
+            function = describe(frame.f_code)
+            self.own[function] = self.own.get(function, 0) + 1
+
+            # Count recursive functions once per sample
+            seen = set()
+            while frame is not None:
+                function = describe(frame.f_code)
+                if function not in seen:
+                    seen.add(function)
+                    self.total[function] = self.total.get(function, 0) + 1
+                frame = frame.f_back
+
+    def report(self, n_functions=N_FUNCTIONS):
+        lines = [
+            f"{self.n_samples} samples, one every {self.interval * 1000:g} ms",
+            "",
+            f"{'own':>7} {'%':>6} {'total':>7} {'%':>6}  function",
+        ]
+        busiest = sorted(self.own, key=self.own.get, reverse=True)[:n_functions]
+        for function in busiest:
+            lines.append(
+                f"{self.own[function]:>7} {percentage(self.own[function], self.n_samples)} "
+                f"{self.total[function]:>7} {percentage(self.total[function], self.n_samples)}"
+                f"  {function}"
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+class DeterministicProfiler:
+    """
+    cProfile: times every function call exactly, but slows down
+    everything that makes many small calls.
+    """
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def report(self, n_functions=N_FUNCTIONS):
+        text = io.StringIO()
+        statistics = pstats.Stats(self.profile, stream=text)
+        statistics.sort_stats("tottime").print_stats(n_functions)
+
+        return text.getvalue()
+
+
+PROFILERS = {"sampling": SamplingProfiler, "cprofile": DeterministicProfiler}
+
+
+class BlockProfiler:
+    """
+    Profiles a session one block at a time (including the break after it),
+    writing a report for every block next to the session data,
+    so the blocks can be compared.
+
+    usage:
+
+       profiler = BlockProfiler("sampling", directory, session)
+       profiler.next_block(1)
+       ...
+       profiler.next_block(2)  # writes the report of block 1
+       ...
+       profiler.stop()  # writes the report of block 2
+    """
+
+    def __init__(self, mode, directory, session, testing=False) -> None:
+        if mode not in PROFILERS:
+            raise Exception(
+                f"Expected the profiling mode to be one of {list(PROFILERS)}, "
+                f"but received {mode!r}."
+            )
+
+        self.mode = mode
+        self.directory = directory
+        self.session = session
+        self.testing = testing
+        self.profiler = None
+        self.block = None
+
+    def next_block(self, block):
+        self.stop()
+        self.block = block
+        self.profiler = PROFILERS[self.mode]()
+        self.profiler.start()
+
+    def stop(self):
+        if self.profiler is None:
+            return
+
+        self.profiler.stop()
+        with open(
+            profile_file(self.directory, self.session, self.block, self.testing), "w"
+        ) as file:
+            file.write(f"Block {self.block} of session {self.session} ({self.mode})\n\n")
+            file.write(self.profiler.report())
+        self.profiler = None
+
+
+def describe(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def percentage(count, n):
+    return f"{100 * count / n if n else 0:6.1f}"
+
+
+def profile_file(directory, session, block, testing=False):
+    return os.path.join(
+        directory,
+        f"profile_session_{session}_block_{block}{'_test' if testing else ''}.txt",
+    )
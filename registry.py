@@ -0,0 +1,222 @@
+"""
+This file contains the functions necessary for
+keeping track of all participants and sessions in one database,
+so that multiple testing stations can register sessions at the same time.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import random
+import sqlite3
+import pandas as pd
+from participantinfo import ParticipantIDAllocator, PARTICIPANT_ID_RANGE
+
+CSV_COLUMNS = ["participant_number", "session_number", "age", "trials_completed"]
+
+
+class Registry:
+    """
+    usage:
+
+       from registry import Registry
+
+    To initialise (imports the old participantinfo.csv if the database is new):
+
+       registry = Registry(database_path, legacy_csv=csv_path)
+       participant, session = registry.register_session(age)
+       registry.update_trials_completed(session, 40)
+       registry.register_edf(session, segment, host_file, file)
+       registry.export_csv(csv_path)
+    """
+
+    def __init__(self, path, legacy_csv=None, timeout=30) -> None:
+        new_database = not os.path.exists(path)
+
+        # Autocommit mode, so transactions are only opened where we ask for them
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS participants (
+                participant_number INTEGER PRIMARY KEY,
+                age INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_number INTEGER PRIMARY KEY,
+                participant_number INTEGER NOT NULL
+                    REFERENCES participants (participant_number),
+                trials_completed INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS sessions_by_participant
+                ON sessions (participant_number);
+            CREATE TABLE IF NOT EXISTS allocation (
+                lowest INTEGER,
+                highest INTEGER,
+                seed INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (lowest, highest)
+            );
+            CREATE TABLE IF NOT EXISTS edf_files (
+                session_number INTEGER NOT NULL
+                    REFERENCES sessions (session_number),
+                segment INTEGER NOT NULL,
+                host_file TEXT NOT NULL,
+                file TEXT NOT NULL,
+                PRIMARY KEY (session_number, segment)
+            );
+            """
+        )
+
+        if new_database and legacy_csv and os.path.exists(legacy_csv):
+            self.import_csv(legacy_csv)
+
+    def import_csv(self, path):
+        old_participants = pd.read_csv(
+            path,
+            dtype={
+                "participant_number": int,
+                "session_number": int,
+                "age": int,
+                "trials_completed": str,
+            },
+        )
+
+        with self.transaction():
+            for row in old_participants.itertuples(index=False):
+                trials_completed = getattr(row, "trials_completed", None)
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO participants VALUES (?, ?)",
+                    (row.participant_number, row.age),
+                )
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO sessions VALUES (?, ?, ?)",
+                    (
+                        row.session_number,
+                        row.participant_number,
+                        None if pd.isna(trials_completed) else int(trials_completed),
+                    ),
+                )
+
+    def transaction(self):
+        return _Transaction(self.connection)
+
+    def register_session(self, age, id_range=PARTICIPANT_ID_RANGE):
+        # Takes a write lock straight away, so no other station can
+        # hand out the same participant or session number in the mean time
+        with self.transaction():
+            # Continue in the order of the first registration with this range
+            seed, position = self.allocation(id_range)
+            allocator = ParticipantIDAllocator(
+                RegisteredNumbers(self.connection), id_range, seed, position
+            )
+            participant = allocator.allocate()
+
+            self.connection.execute(
+                "UPDATE allocation SET position = ? WHERE lowest = ? AND highest = ?",
+                (allocator.position, *id_range),
+            )
+
+            self.connection.execute(
+                "INSERT INTO participants VALUES (?, ?)", (participant, age)
+            )
+            cursor = self.connection.execute(
+                """
+                INSERT INTO sessions (session_number, participant_number, trials_completed)
+                SELECT COALESCE(MAX(session_number), 0) + 1, ?, 0 FROM sessions
+                """,
+                (participant,),
+            )
+            session = cursor.lastrowid
+
+        return participant, session
+
+    def allocation(self, id_range):
+        """
+        The seed of the order in which the participant numbers in `id_range`
+        are handed out, and how far along that order registration is.
+        """
+        row = self.connection.execute(
+            "SELECT seed, position FROM allocation WHERE lowest = ? AND highest = ?",
+            id_range,
+        ).fetchone()
+        if row is not None:
+            return row
+
+        seed = random.SystemRandom().getrandbits(32)
+        self.connection.execute(
+            "INSERT INTO allocation VALUES (?, ?, ?, 0)", (*id_range, seed)
+        )
+        return seed, 0
+
+    def participant_of_session(self, session):
+        (participant,) = self.connection.execute(
+            "SELECT participant_number FROM sessions WHERE session_number = ?",
+            (session,),
+        ).fetchone()
+
+        return participant
+
+    def register_edf(self, session, segment, host_file, file):
+        """Which .edf file on the eyetracker (see eyetracker.host_edf_filename) is which."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO edf_files VALUES (?, ?, ?, ?)",
+            (session, segment, host_file, file),
+        )
+
+    def update_trials_completed(self, session, trials_completed):
+        self.connection.execute(
+            "UPDATE sessions SET trials_completed = ? WHERE session_number = ?",
+            (trials_completed, session),
+        )
+
+    def to_frame(self):
+        return pd.read_sql_query(
+            """
+            SELECT sessions.participant_number, session_number, age, trials_completed
+            FROM sessions JOIN participants USING (participant_number)
+            ORDER BY session_number
+            """,
+            self.connection,
+        )[CSV_COLUMNS].astype({"trials_completed": "Int64"})
+
+    def export_csv(self, path):
+        self.to_frame().to_csv(path, index=False)
+
+    def close(self):
+        self.connection.close()
+
+
+class RegisteredNumbers:
+    """
+    The participant numbers in the database, as a set for ParticipantIDAllocator.
+    Looks up one number at a time, instead of reading all of them.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def __contains__(self, participant):
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM participants WHERE participant_number = ?", (participant,)
+            ).fetchone()
+            is not None
+        )
+
+    def add(self, participant):
+        # Inserted by register_session itself
+        pass
+
+
+class _Transaction:
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -8,10 +8,12 @@ made by Anna van Harmelen, 2023
 
 from psychopy import event
 from psychopy.hardware.keyboard import Keyboard
-from time import time
-from eyetracker import get_trigger
+from tracing import span
 
 RESPONSE_DIAL_SIZE = 2
+RESPONSE_KEYS = ["z", "m", "q"]
+RESPONSE_WINDOW = 2  # in s, after the orientation change
+RELEASE_WINDOW = 0.5  # in s, how long to wait for the response key to be released
 
 
 def evaluate_response(change_direction, response):
@@ -34,6 +36,16 @@ def evaluate_response(change_direction, response):
     }
 
 
+def start_response_clock_on_flip(settings):
+    """
+    Flip the window and reset the keyboard clock at that exact flip,
+    so that all key timestamps are relative to the moment the screen changed.
+    """
+    keyboard: Keyboard = settings["keyboard"]
+    settings["window"].callOnFlip(keyboard.clock.reset)
+    settings["window"].flip()
+
+
 def get_response(
     settings,
     testing,
@@ -42,63 +54,88 @@ def get_response(
     change_direction,
     target_bar,
 ):
+    """
+    Expects the keyboard clock to have been reset at the flip that showed the
+    orientation change, see `start_response_clock_on_flip`. Response and release
+    times are taken from the keyboard's own timestamps, relative to that flip.
+    """
     keyboard: Keyboard = settings["keyboard"]
 
     # Check for pressed 'q'
-    check_quit(keyboard)
-
-    # These timing systems should start at the same time, this is almost true
-    idle_reaction_time_start = time()
-    keyboard.clock.reset()
-
-    # Check if _any_ keys were prematurely pressed
-    prematurely_pressed = [(p.name, p.rt) for p in keyboard.getKeys()]
-    keyboard.clearEvents()
-
-    # Wait indefinitely until the participant starts giving an answer
-    pressed = event.waitKeys(keyList=["z", "m", "q"], maxWait=2)
-
-    response_time = time() - idle_reaction_time_start
+    with span("check quit"):
+        check_quit(keyboard)
+
+    # Poll until a response key goes down. Keys aren't cleared while polling,
+    # so the same key press can be checked for its release afterwards.
+    # Keys that went down before the orientation change have a negative rt.
+    prematurely_pressed = []
+    pressed = None
+    with span("wait for key press"):
+        while pressed is None and keyboard.clock.getTime() < RESPONSE_WINDOW:
+            keys = keyboard.getKeys(waitRelease=False, clear=False)
+            prematurely_pressed = [(key.name, key.rt) for key in keys if key.rt < 0]
+            responses = [
+                key
+                for key in keys
+                if 0 <= key.rt < RESPONSE_WINDOW and key.name in RESPONSE_KEYS
+            ]
+            if responses:
+                pressed = responses[0]
 
     if pressed:
-        if "q" in pressed:
+        if pressed.name == "q":
             raise KeyboardInterrupt()
 
-        if "m" in pressed:
+        response_time = pressed.rt
+
+        # The trigger is sent at the press, before waiting for the release
+        if pressed.name == "m":
             key = "m"
             response = "clockwise"
             missed = False
             if not testing and eyetracker:
-                trigger = get_trigger(
+                trigger = settings["triggers"][
                     "response_right", trial_condition, target_bar, change_direction
-                )
-                eyetracker.tracker.send_message(f"trig{trigger}")
+                ]
+                with span("send trigger", trigger=trigger):
+                    eyetracker.tracker.send_message(f"trig{trigger}")
 
-        elif "z" in pressed:
+        elif pressed.name == "z":
             key = "z"
             response = "anticlockwise"
             missed = False
             if not testing and eyetracker:
-                trigger = get_trigger(
+                trigger = settings["triggers"][
                     "response_left", trial_condition, target_bar, change_direction
-                )
-                eyetracker.tracker.send_message(f"trig{trigger}")
+                ]
+                with span("send trigger", trigger=trigger):
+                    eyetracker.tracker.send_message(f"trig{trigger}")
+
+        with span("wait for key release"):
+            release_time = get_release_time(keyboard, pressed)
 
     else:
+        response_time = keyboard.clock.getTime()
+        release_time = None
         key = None
         response = None
         missed = True
         if not testing and eyetracker:
-            trigger = get_trigger(
+            trigger = settings["triggers"][
                 "response_missed", trial_condition, target_bar, change_direction
-            )
-            eyetracker.tracker.send_message(f"trig{trigger}")
+            ]
+            with span("send trigger", trigger=trigger):
+                eyetracker.tracker.send_message(f"trig{trigger}")
 
     # Make sure keystrokes made during this trial don't influence the next
-    keyboard.clearEvents()
+    with span("clear keys"):
+        keyboard.clearEvents()
 
     return {
         "response_time_in_ms": round(response_time * 1000, 2),
+        "release_time_in_ms": round(release_time * 1000, 2)
+        if release_time is not None
+        else None,
         "key_pressed": key,
         "premature_pressed": True if prematurely_pressed else False,
         "premature_key": prematurely_pressed[0][0] if prematurely_pressed else None,
@@ -110,6 +147,19 @@ def get_response(
     }
 
 
+def get_release_time(keyboard: Keyboard, pressed):
+    # The 'event' backend doesn't register key releases at all
+    if keyboard.getBackend() == "event":
+        return None
+
+    while keyboard.clock.getTime() < pressed.rt + RELEASE_WINDOW:
+        for key in keyboard.getKeys([pressed.name], waitRelease=True, clear=False):
+            if key.rt == pressed.rt:
+                return key.rt + key.duration
+
+    return None
+
+
 def wait_for_key(key_list, keyboard):
     keyboard: Keyboard = keyboard
     keyboard.clearEvents()
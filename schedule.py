@@ -0,0 +1,126 @@
+"""
+This file contains the functions necessary for
+creating the trial schedule of a session and the characteristics of every trial,
+without anything that needs a screen (see config.session_schedule).
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import random
+
+
+def create_blocks(
+    valid_trials, invalid_trials, n_blocks, n_block_trials, predictability
+):
+    if len(valid_trials) % 40 != 0 or len(invalid_trials) % 40 != 0:
+        raise Exception("Expected both numbers of trials to be divisible by 40.")
+
+    # Determine number of (in)valid trials per block
+    n_invalid_trials = n_block_trials * (100 - predictability) // 100
+    n_valid_trials = n_block_trials * predictability // 100
+
+    # Create list of blocks
+    blocks = [[] for _ in range(n_blocks)]
+
+    # Trials are already in random order, they just need to be cut into smaller blocks
+    for n_block in range(n_blocks):
+        blocks[n_block].extend(
+            valid_trials[n_block * n_valid_trials : (n_block + 1) * n_valid_trials]
+        )
+        blocks[n_block].extend(
+            invalid_trials[
+                n_block * n_invalid_trials : (n_block + 1) * n_invalid_trials
+            ]
+        )
+        random.shuffle(blocks[n_block])
+
+    return blocks
+
+
+def create_trial_list(n_trials, validity: str):
+    if n_trials % 40 != 0:
+        raise Exception(
+            "Expected number of trials to be divisible by 40, otherwise perfect factorial combinations are not possible."
+        )
+
+    if validity != "valid" and validity != "invalid":
+        raise Exception("Expected validity of trial to be either 'valid' or 'invalid'.")
+
+    # Generate equal distribution of target locations
+    locations = n_trials // 2 * ["left"] + n_trials // 2 * ["right"]
+
+    # Generate equal distribution of rotation directions,
+    # that co-occur equally with the target locations
+    directions = 2 * (n_trials // 4 * ["clockwise"] + n_trials // 4 * ["anticlockwise"])
+
+    # Generate equal distribution of trial lengths,
+    # that co-occur equally with both target locations and directions
+    durations = n_trials // 10 * list(range(500, 3201, 300))
+
+    # Add validity to all trials
+    validities = [validity] * n_trials
+
+    # Create trial parameters for all trials
+    trials = list(zip(locations, directions, durations, validities))
+    random.shuffle(trials)
+
+    return trials
+
+
+def generate_trial_characteristics(
+    condition: str, target_bar: str, duration, direction: str, colours, orientation_turn
+):
+    # Decide on random colours of stimulus
+    stimuli_colours = random.sample(colours, 2)
+
+    # Create random original orientations
+    orientations = [
+        random.choice([-1, 1]) * random.randint(5, 85),
+        random.choice([-1, 1]) * random.randint(5, 85),
+    ]
+
+    post_orientations = list(orientations)
+
+    # Make orientation change in predetermined direction
+    if direction == "clockwise":
+        orientation_change = orientation_turn
+    if direction == "anticlockwise":
+        orientation_change = -orientation_turn
+
+    # Determine both stimuli orientations after orientation change
+    if target_bar == "left":
+        target_colour, distractor_colour = stimuli_colours
+        target_pre_orientation = orientations[0]
+        target_post_orientation = post_orientations[0] = (
+            post_orientations[0] + orientation_change
+        )
+    else:
+        distractor_colour, target_colour = stimuli_colours
+        target_pre_orientation = orientations[1]
+        target_post_orientation = post_orientations[1] = (
+            orientations[1] + orientation_change
+        )
+
+    # Determine colour of cue
+    if condition == "valid":
+        capture_colour = target_colour
+    elif condition == "invalid":
+        capture_colour = distractor_colour
+
+    return {
+        "static_duration": duration,
+        "ITI": random.randint(500, 800),
+        "change_direction": direction,
+        "stimuli_colours": stimuli_colours,
+        "capture_colour": capture_colour,
+        "trial_condition": condition,
+        "left_orientation": orientations[0],
+        "right_orientation": orientations[1],
+        "left_orientation_2": post_orientations[0],
+        "right_orientation_2": post_orientations[1],
+        "target_bar": target_bar,
+        "target_colour": target_colour,
+        "target_pre_orientation": target_pre_orientation,
+        "target_post_orientation": target_post_orientation,
+    }
@@ -7,10 +7,29 @@ made by Anna van Harmelen, 2023
 """
 
 from psychopy import visual
+from psychopy.core import wait
 from psychopy.hardware.keyboard import Keyboard
-from math import degrees, atan2, pi
+from geometry import get_geometry
+from config import trigger_lookup
+from time import time, sleep
 
-GABOR_SIZE = 3  # diameter of Gabor
+RENDERER = "grating"  # or "element_array", to draw both Gabors in one draw call
+
+
+class HostClock:
+    """
+    The computer's own clock, as used for all trial timing.
+    See simulation.VirtualClock for the simulated version.
+    """
+
+    def time(self):
+        return time()
+
+    def wait(self, seconds):
+        wait(seconds)
+
+    def sleep(self, seconds):
+        sleep(seconds)
 
 
 def get_monitor_and_dir(testing: bool):
@@ -39,33 +58,41 @@ def get_monitor_and_dir(testing: bool):
     return monitor, directory
 
 
-def get_settings(monitor: dict, directory):
+def get_settings(experiment: dict, directory, renderer=RENDERER):
     # Initialise psychopy window
     window = visual.Window(
         color=([-0.5, -0.5, -0.5]),
-        size=monitor["resolution"],
+        size=experiment["monitor"]["resolution"],
         units="pix",
         fullscr=True,
     )
 
-    # Calculate number of visual degrees per pixel on the screen
-    degrees_per_pixel = degrees(atan2(0.5 * monitor["width"], monitor["distance"])) / (
-        0.5 * monitor["resolution"][0]
-    )
-
-    # Determine size of Gabor grating
-    sizes = [64, 128, 256, 512, 1024]
-    size_raw = round(GABOR_SIZE / degrees_per_pixel)
-    print(size_raw)
-    size = min(sizes, key=lambda x: abs(x - size_raw))
-    print(size)
-
     return dict(
-        deg2pix=lambda deg: round(deg / degrees_per_pixel),
-        gabor_size=size,
+        **experiment_settings(experiment),
+        renderer=renderer,
         window=window,
         keyboard=Keyboard(),
         mouse=visual.CustomMouse(win=window, visible=False),
-        monitor=monitor,
         directory=directory,
+        clock=HostClock(),
+    )
+
+
+def experiment_settings(experiment: dict):
+    """
+    Everything the trials are shown with, taken from the compiled artifact
+    (see config.load_or_compile), so its hash describes what was shown.
+    """
+    config = experiment["config"]
+    geometry = get_geometry(experiment["monitor"], config["eccentricity"])
+
+    return dict(
+        deg2pix=geometry.to_pixels,
+        geometry=geometry,
+        gabor_size=experiment["geometry"]["gabor_size"],
+        dot_radius=experiment["geometry"]["dot_radius"],
+        colours=config["colours"],
+        orientation_turn=config["orientation_turn"],
+        triggers=trigger_lookup(experiment["triggers"]),
+        monitor=experiment["monitor"],
     )
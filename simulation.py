@@ -0,0 +1,394 @@
+"""
+This script runs a complete session of the 'microsaccade bias' experiment
+without a screen, keyboard, eyetracker or participant, on a virtual clock.
+All blocks, breaks and data saving run exactly as in main.py, so a full
+session of 800 trials takes seconds instead of an hour.
+
+usage (from the main folder):
+
+   python simulation.py [data directory]
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+
+# psychopy opens the display as soon as it's imported, which fails on a computer
+# without one, so pyglet is told not to (before anything imports psychopy)
+os.environ.setdefault("PYGLET_HEADLESS", "true")
+
+import sys
+import random
+import tempfile
+from math import ceil
+from time import perf_counter
+import pandas as pd
+import response
+from set_up import get_monitor_and_dir, experiment_settings, RENDERER
+from registry import Registry
+from participantinfo import get_participant_details
+from datastore import load_sessions
+from config import default_config, compile_config, load_or_compile, session_schedule
+from checkpoint import Checkpoint
+from tracing import Tracer
+from profiling import BlockProfiler
+from gcpolicy import GCPolicy
+from triggerindex import build_index
+from main import run_session
+
+# Behaviour of the synthetic participant
+RESPONDER = {
+    "median_rt": 0.55,  # in s
+    "rt_spread": 0.25,  # sd of log(rt)
+    "p_missed": 0.03,
+    "p_premature": 0.03,
+    "hold_duration": (0.05, 0.15),  # in s
+    "break_duration": 10,  # in s
+}
+POLL_STEP = 0.001  # in s, how far the clock moves each time the keyboard is polled
+TRACKER_DRIFT = 20e-6  # relative speed difference of the simulated eyetracker clock
+P_BLINK = 0.2  # per trial
+BLINK_DURATION = (100, 300)  # in ms
+
+
+class VirtualClock:
+    """Same interface as set_up.HostClock, but time only moves when asked to."""
+
+    def __init__(self, start=1000.0) -> None:
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def wait(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def sleep(self, seconds):
+        self.wait(seconds)
+
+    def advance_to(self, moment):
+        self.now = max(self.now, moment)
+
+
+class NullWindow:
+    """
+    Stands in for the psychopy window, nothing is drawn (see stimuli.is_headless).
+    Unless `headless` is False: then every stimulus is still made, which
+    only works with psychopy's stimuli replaced (see benchmarks/memory_soak.py).
+    """
+
+    def __init__(self, clock: VirtualClock, monitor: dict, headless=True) -> None:
+        self.headless = headless
+        self.clock = clock
+        self.refresh_rate = monitor["Hz"]
+        self.size = monitor["resolution"]
+        self.color = [-0.5, -0.5, -0.5]
+        self.to_call = []
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self.to_call.append((function, args, kwargs))
+
+    def flip(self):
+        # Flips only happen at the start of a new frame
+        self.clock.advance_to(
+            ceil(self.clock.time() * self.refresh_rate) / self.refresh_rate
+        )
+
+        to_call, self.to_call = self.to_call, []
+        for function, args, kwargs in to_call:
+            function(*args, **kwargs)
+
+        return self.clock.time()
+
+
+class SyntheticKey:
+    def __init__(self, name, t_down, hold_duration) -> None:
+        self.name = name
+        self.tDown = t_down
+        self.hold_duration = hold_duration
+        self.duration = None
+        self.rt = None
+
+
+class KeyboardClock:
+    def __init__(self, clock: VirtualClock, on_reset) -> None:
+        self.clock = clock
+        self.on_reset = on_reset
+        self.last_reset = clock.time()
+
+    def reset(self):
+        self.last_reset = self.clock.time()
+        self.on_reset()
+
+    def getTime(self):
+        return self.clock.time() - self.last_reset
+
+    def getLastResetTime(self):
+        return self.last_reset
+
+
+class SyntheticKeyboard:
+    """
+    Stands in for psychopy's Keyboard. Every time its clock is reset (at the
+    orientation change, see response.start_response_clock_on_flip) a synthetic
+    participant plans a response, and maybe a premature key press just before.
+    The participant can't see the screen, so picks a direction at random.
+    """
+
+    def __init__(self, clock: VirtualClock, responder=RESPONDER) -> None:
+        self.virtual_clock = clock
+        self.clock = KeyboardClock(clock, self.plan_response)
+        self.responder = responder
+        self.keys = []
+        self.responding = False
+
+    def getBackend(self):
+        return "simulation"
+
+    def plan_response(self):
+        now = self.virtual_clock.time()
+        self.responding = True
+
+        if random.random() < self.responder["p_premature"]:
+            self.keys.append(
+                SyntheticKey(
+                    random.choice(["z", "m"]),
+                    now - random.uniform(0.05, 0.5),
+                    random.uniform(*self.responder["hold_duration"]),
+                )
+            )
+
+        if random.random() >= self.responder["p_missed"]:
+            response_time = random.lognormvariate(0, self.responder["rt_spread"])
+            self.keys.append(
+                SyntheticKey(
+                    random.choice(["z", "m"]),
+                    now + self.responder["median_rt"] * response_time,
+                    random.uniform(*self.responder["hold_duration"]),
+                )
+            )
+
+    def getKeys(self, keyList=None, waitRelease=True, clear=True):
+        if self.responding:
+            # Skip straight to whatever the participant does next
+            now = self.virtual_clock.time()
+            upcoming = [
+                moment
+                for key in self.keys
+                for moment in (key.tDown, key.tDown + key.hold_duration)
+                if moment > now
+            ]
+            self.virtual_clock.advance_to(min(upcoming) if upcoming else now + POLL_STEP)
+
+        now = self.virtual_clock.time()
+        returned = []
+        for key in self.keys:
+            if key.tDown > now or (keyList and key.name not in keyList):
+                continue
+            if key.tDown + key.hold_duration <= now:
+                key.duration = key.hold_duration
+            elif waitRelease:
+                continue
+
+            key.rt = key.tDown - self.clock.getLastResetTime()
+            returned.append(key)
+
+        if clear:
+            self.keys = [key for key in self.keys if key not in returned]
+
+        return returned
+
+    def waitKeys(self, maxWait=float("inf"), keyList=None, waitRelease=True, clear=True):
+        # Only used during breaks, the participant always continues
+        self.virtual_clock.wait(self.responder["break_duration"])
+        now = self.virtual_clock.time()
+        key = SyntheticKey(keyList[0] if keyList else "space", now, 0)
+        key.duration = 0
+
+        return [key]
+
+    def clearEvents(self, eventType=None):
+        self.keys = []
+        self.responding = False
+
+
+class SyntheticEvents:
+    """
+    Stands in for psychopy's event module in response.py, so the break
+    screens (see response.wait_for_key) wait for the synthetic participant.
+    """
+
+    def __init__(self, keyboard: SyntheticKeyboard) -> None:
+        self.keyboard = keyboard
+
+    def waitKeys(self, maxWait=float("inf"), keyList=None, **_):
+        return [key.name for key in self.keyboard.waitKeys(maxWait, keyList)]
+
+
+class SimulatedTracker:
+    mock = False
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.messages = []
+
+    def time(self):
+        return self.clock.time() * 1000 * (1 + TRACKER_DRIFT) + 12345.0
+
+    def send_message(self, message):
+        self.messages.append((self.time(), message))
+
+
+class SimulatedEyelinker:
+    """Same interface as eyetracker.Eyelinker, keeps all messages in memory."""
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.tracker = SimulatedTracker(clock)
+
+    def start(self):
+        self.tracker.send_message("start_recording")
+
+    def calibrate(self):
+        self.tracker.send_message("calibrate")
+
+    def drift_correct(self):
+        self.tracker.send_message("drift_correct")
+
+    def stop(self):
+        self.tracker.send_message("stop_recording")
+
+    def tracker_time(self):
+        return self.tracker.time()
+
+    def gaze_loss(self, start, end):
+        if random.random() >= P_BLINK:
+            return 0.0
+        return min(1.0, random.uniform(*BLINK_DURATION) / (end - start))
+
+
+def get_simulation_settings(
+    clock: VirtualClock, directory, experiment=None, headless=True
+):
+    """
+    As set_up.get_settings, for a compiled `experiment` (see config.load_or_compile),
+    by default the default configuration on the lab's monitor.
+    """
+    if experiment is None:
+        monitor, _ = get_monitor_and_dir(testing=False)
+        experiment = compile_config(default_config(), monitor)
+
+    keyboard = SyntheticKeyboard(clock)
+    # The breaks wait through psychopy's event module, not the keyboard
+    response.event = SyntheticEvents(keyboard)
+
+    return dict(
+        **experiment_settings(experiment),
+        renderer=RENDERER,
+        window=NullWindow(clock, experiment["monitor"], headless),
+        keyboard=keyboard,
+        mouse=None,
+        directory=directory,
+        clock=clock,
+    )
+
+
+def check_triggers(messages, data: pd.DataFrame):
+    """
+    Checks that every trial sent the triggers 1x, 2x, 3x and then 4x/5x/6x,
+    with x its condition code, and that the response trigger matches the key
+    (see triggerindex.build_index). Returns a list of problems.
+    """
+    _, problems = build_index(
+        [pd.DataFrame(messages, columns=["time", "text"])], data
+    )
+
+    return [
+        f"Trial {problem.trial_number}: {problem.problem}."
+        if pd.notna(problem.trial_number)
+        else f"At {problem.time} ms: {problem.problem}."
+        for problem in problems.itertuples()
+    ]
+
+
+def check_schedule(data: pd.DataFrame):
+    """Returns the trial counts per block and condition, and per design cell."""
+    per_block = pd.crosstab(data.block, data.trial_condition)
+    per_cell = data.groupby(
+        ["trial_condition", "target_bar", "change_direction", "static_duration"],
+        observed=True,
+    ).size()
+
+    return per_block, per_cell
+
+
+def simulate_session(
+    directory=None, seed=None, profiling=None, memory=None, headless=True
+):
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="microsaccade_simulation_")
+    random.seed(seed)
+
+    clock = VirtualClock()
+    monitor, _ = get_monitor_and_dir(testing=False)
+    experiment = load_or_compile(default_config(), monitor, directory)
+    settings = get_simulation_settings(clock, directory, experiment, headless=headless)
+    registry = Registry(os.path.join(directory, "participantinfo.db"))
+    _, session = get_participant_details(registry, testing=True)
+    eyelinker = SimulatedEyelinker(clock)
+    gc_policy = GCPolicy()
+
+    start = perf_counter()
+    virtual_start = clock.time()
+    finished = run_session(
+        session_schedule(experiment["config"], seed=session),
+        session,
+        settings,
+        registry,
+        eyelinker,
+        testing=False,
+        config_hash=experiment["hash"],
+        checkpoint=Checkpoint(directory, session),
+        tracer=Tracer(),
+        profiler=BlockProfiler(profiling, directory, session) if profiling else None,
+        memory=memory,
+        gc_policy=gc_policy,
+    )
+    duration = perf_counter() - start
+    virtual_duration = clock.time() - virtual_start
+
+    data = load_sessions(directory, sessions=[session])
+    problems = [] if finished else ["The session did not finish."]
+    problems += check_triggers(eyelinker.tracker.messages, data)
+    for pause in gc_policy.automatic_in_timed_phases():
+        problems.append(
+            f"Garbage was collected during the {pause['phase']} of trial "
+            f"{pause['trial_number']}."
+        )
+
+    per_block, per_cell = check_schedule(data)
+    if per_block.nunique().max() > 1:
+        problems.append("Not every block has the same number of (in)valid trials.")
+    if per_cell.groupby(level="trial_condition").nunique().max() > 1:
+        problems.append("Not every design cell has the same number of trials.")
+
+    print(
+        f"Simulated {len(data)} trials ({virtual_duration / 60:.1f} minutes) "
+        f"in {duration:.1f} s, data saved in {directory}"
+    )
+    print(f"Mean timing error: {data.timing_error_in_ms.abs().mean():.2f} ms")
+    print(f"Mean work during the ITI screen: {data.iti_drawing_in_ms.mean():.3f} ms")
+    pauses = pd.DataFrame(gc_policy.pauses)
+    print(
+        f"Garbage collections: {len(pauses)}, longest "
+        f"{pauses.duration_in_ms.max() if len(pauses) else 0:.2f} ms"
+    )
+    for problem in problems:
+        print(problem)
+
+    return problems
+
+
+if __name__ == "__main__":
+    problems = simulate_session(sys.argv[1] if len(sys.argv) > 1 else None)
+    sys.exit(1 if problems else 0)
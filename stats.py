@@ -0,0 +1,211 @@
+"""
+This file contains the functions necessary for
+comparing conditions over time (e.g. gaze bias after valid vs invalid cues)
+with cluster-based permutation tests (Maris & Oostenveld, 2007).
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+N_PERMUTATIONS = 10000
+BATCH_SIZE = 500  # permutations computed at once by one worker
+ALPHA = 0.05
+
+_shared = {}
+
+
+def t_values(data, signs=None, labels=None):
+    """
+    t-values for every time point of `data` (participants x time points),
+    for every row of `signs` or `labels` (permutations x participants) at once.
+     - signs: one-sample t-test of data multiplied by +1/-1 per participant
+       (e.g. data is the valid - invalid difference per participant)
+     - labels: independent t-test between participants labelled True and False
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n = data.shape[0]
+    squares = data * data
+
+    if labels is None:
+        if signs is None:
+            signs = np.ones((1, n))
+        # Flipping signs doesn't change the sum of squares
+        mean = signs @ data / n
+        variance = (squares.sum(axis=0) - n * mean**2) / (n - 1)
+        return mean / np.sqrt(variance / n)
+
+    labels = np.asarray(labels, dtype=np.float64)
+    n_a = labels.sum(axis=1, keepdims=True)
+    n_b = n - n_a
+    sum_a, sum_b = labels @ data, (1 - labels) @ data
+    squares_a, squares_b = labels @ squares, (1 - labels) @ squares
+
+    mean_a, mean_b = sum_a / n_a, sum_b / n_b
+    pooled = (squares_a - n_a * mean_a**2 + squares_b - n_b * mean_b**2) / (n - 2)
+    return (mean_a - mean_b) / np.sqrt(pooled * (1 / n_a + 1 / n_b))
+
+
+def cluster_labels(above):
+    """
+    Numbers the runs of True in every row of `above` (1, 2, ...), 0 elsewhere.
+    Runs are numbered across rows, so every run has its own number.
+    """
+    starts = above.copy()
+    starts[:, 1:] &= ~above[:, :-1]
+    return np.cumsum(starts.ravel()).reshape(above.shape) * above
+
+
+def cluster_masses(t, threshold):
+    """
+    Sums t within every run of time points above `threshold` (or below
+    -`threshold`), per row of `t`. Returns the labels and the mass of every run.
+    """
+    positive = cluster_labels(t > threshold)
+    negative = cluster_labels(t < -threshold)
+    negative[negative > 0] += positive.max()
+
+    labels = positive + negative
+    masses = np.bincount(labels.ravel(), weights=t.ravel())
+    masses[0] = 0
+
+    return labels, masses
+
+
+def max_cluster_masses(t, threshold):
+    """The largest absolute cluster mass in every row of `t` (0 if there are none)."""
+    labels, masses = cluster_masses(t, threshold)
+
+    # Which row every cluster is in
+    cluster_rows = np.zeros(len(masses), dtype=np.intp)
+    cluster_rows[labels.ravel()] = np.repeat(np.arange(len(t)), t.shape[1])
+
+    largest = np.zeros(len(t))
+    np.maximum.at(largest, cluster_rows[1:], np.abs(masses[1:]))
+
+    return largest
+
+
+def random_permutations(n_permutations, n_participants, seed, labels=None):
+    rng = np.random.default_rng(seed)
+
+    if labels is None:
+        return rng.choice([-1.0, 1.0], size=(n_permutations, n_participants))
+
+    return rng.permuted(np.tile(labels, (n_permutations, 1)), axis=1)
+
+
+def _attach(name, shape, dtype):
+    # Runs once in every worker, the data itself is never copied or pickled
+    memory = shared_memory.SharedMemory(name=name)
+    _shared["memory"] = memory
+    _shared["data"] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def null_batch(n_permutations, threshold, labels, seed):
+    data = _shared["data"]
+    permutations = random_permutations(n_permutations, len(data), seed, labels)
+
+    if labels is None:
+        t = t_values(data, signs=permutations)
+    else:
+        t = t_values(data, labels=permutations)
+
+    return max_cluster_masses(t, threshold)
+
+
+def null_distribution(
+    data, threshold, labels=None, n_permutations=N_PERMUTATIONS, seed=0, max_workers=None
+):
+    """
+    The largest cluster mass of every permutation, computed in batches
+    by a pool of processes that all read `data` from shared memory.
+    """
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    batches = [
+        min(BATCH_SIZE, n_permutations - start)
+        for start in range(0, n_permutations, BATCH_SIZE)
+    ]
+    seeds = np.random.SeedSequence(seed).generate_state(len(batches))
+
+    memory = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=memory.buf)[:] = data
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_attach,
+            initargs=(memory.name, data.shape, data.dtype),
+        ) as executor:
+            results = list(
+                executor.map(
+                    null_batch,
+                    batches,
+                    [threshold] * len(batches),
+                    [labels] * len(batches),
+                    [int(batch_seed) for batch_seed in seeds],
+                )
+            )
+    finally:
+        memory.close()
+        memory.unlink()
+
+    return np.concatenate(results)
+
+
+def cluster_test(
+    data,
+    labels=None,
+    n_permutations=N_PERMUTATIONS,
+    alpha=ALPHA,
+    seed=0,
+    max_workers=None,
+):
+    """
+    Cluster-based permutation test over the time points of `data`
+    (participants x time points), see t_values for `labels`.
+    Clusters are formed at the two-sided `alpha` threshold of the t-distribution.
+    Returns a table with the first and last time point index, mass and p-value
+    of every cluster. On Windows, call this from within `if __name__ == "__main__":`.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n = data.shape[0]
+    df = n - 1 if labels is None else n - 2
+    threshold = stats.t.ppf(1 - alpha / 2, df)
+
+    if labels is None:
+        observed = t_values(data)
+    else:
+        observed = t_values(data, labels=np.asarray(labels)[np.newaxis])
+
+    cluster_ids, masses = cluster_masses(observed, threshold)
+    null = null_distribution(
+        data,
+        threshold,
+        labels=None if labels is None else np.asarray(labels, dtype=np.float64),
+        n_permutations=n_permutations,
+        seed=seed,
+        max_workers=max_workers,
+    )
+
+    clusters = []
+    for cluster in np.unique(cluster_ids[cluster_ids > 0]):
+        time_points = np.flatnonzero(cluster_ids[0] == cluster)
+        clusters.append(
+            {
+                "start": time_points[0],
+                "end": time_points[-1],
+                "mass": masses[cluster],
+                "p_value": (np.sum(null >= abs(masses[cluster])) + 1)
+                / (n_permutations + 1),
+            }
+        )
+
+    return pd.DataFrame(
+        clusters, columns=["start", "end", "mass", "p_value"]
+    ).sort_values("start", ignore_index=True)
@@ -7,22 +7,26 @@ made by Anna van Harmelen, 2023
 """
 
 from psychopy import visual
+from psychopy.tools.arraytools import createLumPattern
 from numpy import zeros
-from math import sqrt
 
-ECCENTRICITY = 5
-DOT_SIZE = 0.1  # radius of fixation dot
+_gabor_masks = {}
+
+
+def is_headless(window):
+    # True for the simulated window, see simulation.NullWindow
+    return getattr(window, "headless", False)
 
 
 def create_fixation_dot(settings, colour="#eaeaea"):
-    # Determine size of fixation cross
-    fixation_size = settings["deg2pix"](DOT_SIZE)
+    if is_headless(settings["window"]):
+        return
 
     # Make fixation dot
     fixation_dot = visual.Circle(
         win=settings["window"],
         units="pix",
-        radius=fixation_size,
+        radius=settings["dot_radius"],
         pos=(0, 0),
         fillColor=colour,
     )
@@ -31,21 +35,8 @@ def create_fixation_dot(settings, colour="#eaeaea"):
 
 
 def make_one_gabor(orientation, colour, position, settings):
-    # Check input
-    if position == "left":
-        pos = (
-            -settings["deg2pix"](sqrt(1 / 2 * ECCENTRICITY**2)),
-            -settings["deg2pix"](sqrt(1 / 2 * ECCENTRICITY**2)),
-        )
-    elif position == "right":
-        pos = (
-            settings["deg2pix"](sqrt(1 / 2 * ECCENTRICITY**2)),
-            -settings["deg2pix"](sqrt(1 / 2 * ECCENTRICITY**2)),
-        )
-    elif position == "middle":
-        pos = (0, -settings["deg2pix"](sqrt(1 / 2 * ECCENTRICITY**2)))
-    else:
-        raise Exception(f"Expected 'left' or 'right', but received {position!r}. :(")
+    # Check input (and find where to put it)
+    pos = settings["geometry"].stimulus_position(position)
 
     # Create texture for Gabor stimulus
     gabor_texture = zeros([settings["gabor_size"], settings["gabor_size"], 4], "f")
@@ -70,9 +61,145 @@ def make_one_gabor(orientation, colour, position, settings):
     return gabor_stimulus
 
 
+def gabor_mask(size):
+    """
+    The transparency of one Gabor (see make_one_gabor) as a mask:
+    the grating times the raised cosine edge, at orientation 0.
+    """
+    if size not in _gabor_masks:
+        grating = (
+            1 - visual.filters.makeGrating(size, gratType="sin", cycles=7.5)
+        ) / 2
+        edge = (createLumPattern("raisedCos", size, None, {"fringeWidth": 0.5}) + 1) / 2
+        _gabor_masks[size] = grating * edge * 2 - 1
+
+    return _gabor_masks[size]
+
+
+def make_gabor_pair(left_orientation, right_orientation, colours, settings):
+    """
+    Both Gabors as one element array, so they're drawn with one draw call.
+    The grating is in the mask, which is rotated with every element.
+    """
+    geometry = settings["geometry"]
+
+    return visual.ElementArrayStim(
+        win=settings["window"],
+        units="pix",
+        nElements=2,
+        xys=[geometry.stimulus_position("left"), geometry.stimulus_position("right")],
+        sizes=settings["gabor_size"],
+        oris=[left_orientation, right_orientation],
+        colors=colours,
+        colorSpace="rgb",
+        elementTex=None,
+        elementMask=gabor_mask(settings["gabor_size"]),
+        texRes=settings["gabor_size"],
+    )
+
+
+def make_gabors(left_orientation, right_orientation, colours, settings):
+    """The Gabors of one screen, as a list of stimuli to draw (see RENDERER in set_up.py)."""
+    if settings["renderer"] == "element_array":
+        return [
+            make_gabor_pair(left_orientation, right_orientation, colours, settings)
+        ]
+
+    return [
+        make_one_gabor(left_orientation, colours[0], "left", settings),
+        make_one_gabor(right_orientation, colours[1], "right", settings),
+    ]
+
+
+def prepare_stimuli(
+    left_orientation,
+    right_orientation,
+    left_orientation_2,
+    right_orientation_2,
+    stimuli_colours,
+    capture_colour,
+    settings,
+    stimuli: dict,
+):
+    """
+    Builds every stimulus of a trial into `stimuli`, one at a time,
+    yielding after each so the work can be spread out (see trial.TrialPreparation).
+    Nothing is built for a headless window.
+    """
+    if is_headless(settings["window"]):
+        return
+
+    for name, colour in [("fixation", "#eaeaea"), ("cue", capture_colour)]:
+        stimuli[name] = visual.Circle(
+            win=settings["window"],
+            units="pix",
+            radius=settings["dot_radius"],
+            pos=(0, 0),
+            fillColor=colour,
+        )
+        yield
+
+    if settings["renderer"] == "element_array":
+        # One stimulus per screen, the second is only needed if anything turns
+        stimuli["gabors"] = make_gabors(
+            left_orientation, right_orientation, stimuli_colours, settings
+        )
+        yield
+        if (left_orientation_2, right_orientation_2) == (
+            left_orientation,
+            right_orientation,
+        ):
+            stimuli["gabors_2"] = stimuli["gabors"]
+        else:
+            stimuli["gabors_2"] = make_gabors(
+                left_orientation_2, right_orientation_2, stimuli_colours, settings
+            )
+            yield
+        return
+
+    stimuli["gabors"] = [
+        make_one_gabor(left_orientation, stimuli_colours[0], "left", settings)
+    ]
+    yield
+    stimuli["gabors"].append(
+        make_one_gabor(right_orientation, stimuli_colours[1], "right", settings)
+    )
+    yield
+
+    # Only the target changes orientation, the other one can be reused
+    stimuli["gabors_2"] = []
+    for orientation, orientation_2, colour, position, gabor in zip(
+        [left_orientation, right_orientation],
+        [left_orientation_2, right_orientation_2],
+        stimuli_colours,
+        ["left", "right"],
+        stimuli["gabors"],
+    ):
+        if orientation_2 == orientation:
+            stimuli["gabors_2"].append(gabor)
+        else:
+            stimuli["gabors_2"].append(
+                make_one_gabor(orientation_2, colour, position, settings)
+            )
+            yield
+
+
+def draw_stimuli_frame(stimuli: dict, gabors="gabors", fixation="fixation"):
+    """Draws prepared stimuli (see prepare_stimuli), e.g. the cue with fixation="cue"."""
+    if not stimuli:
+        return
+
+    stimuli[fixation].draw()
+    for gabor in stimuli[gabors]:
+        gabor.draw()
+
+
 def create_stimuli_frame(
     left_orientation, right_orientation, stim_colours, settings, fix_colour="#eaeaea"
 ):
     create_fixation_dot(settings, fix_colour)
-    make_one_gabor(left_orientation, stim_colours[0], "left", settings).draw()
-    make_one_gabor(right_orientation, stim_colours[1], "right", settings).draw()
+    if is_headless(settings["window"]):
+        return
+
+    for gabor in make_gabors(left_orientation, right_orientation, stim_colours, settings):
+        gabor.draw()
@@ -0,0 +1,220 @@
+"""
+This file contains the functions necessary for
+summarising accuracy and response times per condition,
+both during a session and across sessions and participants.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import glob
+import json
+from math import sqrt
+import pandas as pd
+
+CELL_FIELDS = ("trial_condition", "target_bar", "change_direction", "static_duration")
+RT_BIN_WIDTH = 50  # in ms
+RT_MAX = 2000  # in ms, responses are only collected for 2 seconds
+N_RT_BINS = RT_MAX // RT_BIN_WIDTH + 1  # last bin collects everything slower
+
+
+def empty_cell():
+    return {
+        "n": 0,
+        "n_correct": 0,
+        "n_missed": 0,
+        "n_premature": 0,
+        "rt_n": 0,
+        "rt_sum": 0.0,
+        "rt_sum_of_squares": 0.0,
+        "rt_histogram": [0] * N_RT_BINS,
+    }
+
+
+def merge_cells(cell, other):
+    for statistic, value in other.items():
+        if statistic == "rt_histogram":
+            cell[statistic] = [a + b for a, b in zip(cell[statistic], value)]
+        else:
+            cell[statistic] += value
+
+
+class ConditionSummary:
+    """
+    Running sufficient statistics per condition cell, see CELL_FIELDS.
+    Updating costs the same for every trial, and summaries of different
+    sessions or participants can be merged without the raw trials.
+
+    usage:
+
+       summary = ConditionSummary()
+       summary.update({**trial_characteristics, **report})
+       summary.table(by=("trial_condition",))
+       summary.validity_effect()
+    """
+
+    def __init__(self) -> None:
+        self.cells = {}
+
+    def update(self, trial: dict):
+        key = tuple(trial[field] for field in CELL_FIELDS)
+        if key not in self.cells:
+            self.cells[key] = empty_cell()
+        cell = self.cells[key]
+
+        cell["n"] += 1
+        cell["n_correct"] += bool(trial["correct_key"])
+        cell["n_premature"] += bool(trial["premature_pressed"])
+
+        if trial["missed"]:
+            cell["n_missed"] += 1
+        else:
+            response_time = trial["response_time_in_ms"]
+            cell["rt_n"] += 1
+            cell["rt_sum"] += response_time
+            cell["rt_sum_of_squares"] += response_time**2
+            cell["rt_histogram"][
+                min(int(response_time // RT_BIN_WIDTH), N_RT_BINS - 1)
+            ] += 1
+
+    def merge(self, other):
+        for key, other_cell in other.cells.items():
+            if key not in self.cells:
+                self.cells[key] = empty_cell()
+            merge_cells(self.cells[key], other_cell)
+
+        return self
+
+    def pooled(self, by=CELL_FIELDS):
+        indices = [CELL_FIELDS.index(field) for field in by]
+        pooled = {}
+
+        for key, cell in self.cells.items():
+            pooled_key = tuple(key[index] for index in indices)
+            if pooled_key not in pooled:
+                pooled[pooled_key] = empty_cell()
+            merge_cells(pooled[pooled_key], cell)
+
+        return pooled
+
+    def table(self, by=CELL_FIELDS):
+        rows = []
+        for key, cell in sorted(self.pooled(by).items()):
+            mean_rt, sd_rt = rt_mean_and_sd(cell)
+            rows.append(
+                {
+                    **dict(zip(by, key)),
+                    "n": cell["n"],
+                    "accuracy": cell["n_correct"] / cell["n"],
+                    "missed": cell["n_missed"] / cell["n"],
+                    "premature": cell["n_premature"] / cell["n"],
+                    "mean_rt": mean_rt,
+                    "sd_rt": sd_rt,
+                    "median_rt": rt_median(cell),
+                }
+            )
+
+        return pd.DataFrame(rows)
+
+    def validity_effect(self):
+        """
+        Invalid minus valid accuracy and mean response time,
+        with their standard errors.
+        """
+        pooled = self.pooled(("trial_condition",))
+        valid = pooled.get(("valid",), empty_cell())
+        invalid = pooled.get(("invalid",), empty_cell())
+
+        accuracy = {}
+        for condition, cell in (("valid", valid), ("invalid", invalid)):
+            p = cell["n_correct"] / cell["n"] if cell["n"] else float("nan")
+            accuracy[condition] = (p, p * (1 - p) / cell["n"] if cell["n"] else 0)
+
+        rt = {}
+        for condition, cell in (("valid", valid), ("invalid", invalid)):
+            mean_rt, sd_rt = rt_mean_and_sd(cell)
+            rt[condition] = (mean_rt, sd_rt**2 / cell["rt_n"] if cell["rt_n"] else 0)
+
+        return {
+            "accuracy_effect": accuracy["invalid"][0] - accuracy["valid"][0],
+            "accuracy_effect_se": sqrt(accuracy["invalid"][1] + accuracy["valid"][1]),
+            "rt_effect": rt["invalid"][0] - rt["valid"][0],
+            "rt_effect_se": sqrt(rt["invalid"][1] + rt["valid"][1]),
+        }
+
+    def to_dict(self):
+        return {
+            "cell_fields": list(CELL_FIELDS),
+            "rt_bin_width": RT_BIN_WIDTH,
+            "cells": [
+                {"cell": list(key), **cell} for key, cell in self.cells.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, saved: dict):
+        if saved["cell_fields"] != list(CELL_FIELDS) or (
+            saved["rt_bin_width"] != RT_BIN_WIDTH
+        ):
+            raise Exception("Expected a summary made with the same cells and RT bins.")
+
+        summary = cls()
+        for cell in saved["cells"]:
+            cell = dict(cell)
+            summary.cells[tuple(cell.pop("cell"))] = cell
+
+        return summary
+
+    def save(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+
+def rt_mean_and_sd(cell):
+    if not cell["rt_n"]:
+        return float("nan"), float("nan")
+
+    mean_rt = cell["rt_sum"] / cell["rt_n"]
+    if cell["rt_n"] < 2:
+        return mean_rt, float("nan")
+
+    variance = (cell["rt_sum_of_squares"] - cell["rt_n"] * mean_rt**2) / (
+        cell["rt_n"] - 1
+    )
+
+    return mean_rt, sqrt(max(variance, 0))
+
+
+def rt_median(cell):
+    # Estimated from the histogram, so accurate up to RT_BIN_WIDTH
+    if not cell["rt_n"]:
+        return float("nan")
+
+    half = cell["rt_n"] / 2
+    seen = 0
+    for bin_number, count in enumerate(cell["rt_histogram"]):
+        if seen + count >= half:
+            return (bin_number + (half - seen) / count) * RT_BIN_WIDTH
+        seen += count
+
+
+def summary_file(directory, session, testing=False):
+    return os.path.join(
+        directory, f"summary_session_{session}{'_test' if testing else ''}.json"
+    )
+
+
+def load_summaries(directory):
+    # Combine the summaries of all sessions into one, for study-level tables
+    summary = ConditionSummary()
+    for file in sorted(glob.glob(os.path.join(directory, "summary_session_*.json"))):
+        if not file.endswith("_test.json"):
+            summary.merge(ConditionSummary.load(file))
+
+    return summary
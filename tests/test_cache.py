@@ -0,0 +1,75 @@
+import os
+import shutil
+import numpy as np
+from cache import StageCache
+
+calls = []
+
+
+def double(path, factor=2):
+    calls.append(path)
+    return {"values": np.loadtxt(path) * factor, "factor": factor}
+
+
+def total(doubled):
+    return float(doubled["values"].sum())
+
+
+def write(tmp_path, values):
+    path = str(tmp_path / "input.txt")
+    np.savetxt(path, values)
+    return path
+
+
+def test_results_are_reused_until_the_input_or_parameters_change(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    path = write(tmp_path, [1, 2, 3])
+    calls.clear()
+
+    doubled = cache.run("double", double, [path])
+    assert cache.run("double", double, [path]) == doubled
+    assert cache.load(cache.run("total", total, [doubled])) == 12
+    assert len(calls) == 1
+
+    assert cache.run("double", double, [path], {"factor": 3}) != doubled
+    os.utime(path, ns=(0, 0))
+    assert cache.run("double", double, [path]) != doubled
+    assert len(calls) == 3
+
+    report = cache.report().set_index("stage")
+    assert report.loc["double"].tolist() == [1, 3]
+    assert report.loc["total"].tolist() == [0, 1]
+
+
+def test_arrays_come_back_memory_mapped(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    result = cache.load(cache.run("double", double, [write(tmp_path, [1, 2])]))
+
+    assert isinstance(result["values"], np.memmap)
+    assert result["factor"] == 2
+
+
+def test_the_least_recently_used_results_are_evicted(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"), max_size=0)
+    first = cache.run("double", double, [write(tmp_path, [1, 2])])
+    second = cache.run("double", double, [write(tmp_path, [3, 4])])
+
+    assert [key for _, _, key in cache.entries()] == [second]
+    assert not any(name.endswith(".evicted") for name in os.listdir(cache.directory))
+    assert not os.path.exists(cache.path(first))
+
+
+def test_a_result_removed_by_another_process_is_computed_again(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    path = write(tmp_path, [1, 2, 3])
+    calls.clear()
+    doubled = cache.run("double", double, [path])
+
+    # Another process evicts it before the next stage loads it
+    shutil.rmtree(cache.path(doubled))
+    assert cache.load(cache.run("total", total, [doubled])) == 12
+    assert len(calls) == 2
+
+    # And a half evicted result of another process is ignored
+    os.makedirs(f"{cache.path(doubled)}.123.evicted")
+    assert [key for _, _, key in cache.entries()].count(doubled) == 1
@@ -0,0 +1,71 @@
+import pytest
+from checkpoint import Checkpoint
+from eyetracker import edf_filename, host_edf_filename
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingFile:
+    """Stands in for the rows file, as if the experiment stopped while appending."""
+
+    def write(self, text):
+        raise Crash()
+
+    def close(self):
+        pass
+
+
+def row(trial_number):
+    return {"trial_number": trial_number}
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), 1)
+    checkpoint.start("hash", 0.0)
+    checkpoint.save(row(1), 0, 1)
+    yield checkpoint
+    checkpoint.close()
+
+
+def test_a_trial_that_missed_the_rows_is_taken_from_the_state(checkpoint, tmp_path):
+    checkpoint.rows_file.close()
+    checkpoint.rows_file = CrashingFile()
+    with pytest.raises(Crash):
+        checkpoint.save(row(2), 0, 2)
+
+    state, rows = Checkpoint.load(str(tmp_path), 1)
+    assert (state["block_index"], state["trial_index"]) == (0, 2)
+    assert rows == [row(1), row(2)]
+
+
+def test_resuming_rewrites_the_rows_without_a_half_written_trial(checkpoint, tmp_path):
+    with open(checkpoint.rows_path, "a") as file:
+        file.write('{"trial_nu')
+    checkpoint.close()
+
+    state, rows = Checkpoint.load(str(tmp_path), 1)
+    resumed = Checkpoint(str(tmp_path), 1)
+    resumed.resume(state, rows)
+    resumed.save(row(2), 0, 2)
+    resumed.close()
+
+    state, rows = Checkpoint.load(str(tmp_path), 1)
+    assert state["segment"] == 2
+    assert rows == [row(1), row(2)]
+
+
+def test_edf_names_fit_the_eyetracker():
+    assert edf_filename(12, 123, segment=2) == "123_12_2.edf"
+
+    # Any participant and session number fits on the eyetracker
+    names = {
+        host_edf_filename(participant, session, segment)
+        for participant in [12, 123456]
+        for session in [123, 1234567]
+        for segment in [1, 2, 10]
+    }
+    assert len(names) == 12
+    assert all(len(name) == len("12345678.edf") for name in names)
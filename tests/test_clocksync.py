@@ -0,0 +1,94 @@
+import os
+import tracemalloc
+import numpy as np
+import pytest
+import trial
+from checkpoint import Checkpoint
+from clocksync import ClockSync, clock_file
+from datastore import load_sessions
+from memory import MemoryTracker, memory_file
+from main import run_session
+from participantinfo import get_participant_details
+from registry import Registry
+from simulation import VirtualClock, SimulatedEyelinker, get_simulation_settings
+
+TRIAL = ("left", "clockwise", 500, "valid")
+BLOCKS = [[TRIAL] * 3, [TRIAL] * 3]
+
+
+def test_the_fit_recovers_offset_and_drift():
+    host = iter(np.arange(0, 100, 0.5))
+    now = [0.0]
+
+    def host_time():
+        now[0] = next(host)
+        return now[0]
+
+    clock_sync = ClockSync(lambda: 5000 + now[0] * 1000.02, host_time, n_probes=1)
+    for _ in range(20):
+        clock_sync.sample()
+
+    offset, slope = clock_sync.fit()
+    # The tracker is read at the first host reading, 0.25 s before the
+    # middle of the two, which is taken as the time of the sample
+    assert offset == pytest.approx(5000 - 0.25 * 1000.02)
+    assert clock_sync.drift() == pytest.approx(20)
+    assert clock_sync.tracker_to_host(clock_sync.host_to_tracker([12.0])) == (
+        pytest.approx([12.0])
+    )
+
+
+def test_every_segment_has_its_own_clock_file(tmp_path):
+    assert clock_file(tmp_path, 3) != clock_file(tmp_path, 3, segment=2)
+
+
+def run_segment(directory, session, registry, eyelinker, resumed=None):
+    return run_session(
+        BLOCKS,
+        session,
+        get_simulation_settings(eyelinker.tracker.clock, directory),
+        registry,
+        eyelinker,
+        testing=False,
+        checkpoint=Checkpoint(directory, session),
+        resumed=resumed,
+        memory=MemoryTracker(n_frames=1),
+    )
+
+
+def test_a_resumed_segment_only_stamps_its_own_trials(tmp_path, monkeypatch, request):
+    # Memory is tracked as in main.py, which never stops tracing
+    request.addfinalizer(tracemalloc.stop)
+    directory = str(tmp_path)
+    registry = Registry(os.path.join(directory, "participantinfo.db"))
+    _, session = get_participant_details(registry, testing=True)
+
+    # 4 checks per trial, so this stops during the first trial of block 2
+    calls = []
+
+    def quit_in_the_second_block(keyboard):
+        calls.append(keyboard)
+        if len(calls) == 16:
+            raise KeyboardInterrupt()
+
+    monkeypatch.setattr(trial, "check_quit", quit_in_the_second_block)
+    eyelinker = SimulatedEyelinker(VirtualClock())
+    assert not run_segment(directory, session, registry, eyelinker)
+    first = Checkpoint.load(directory, session)[1]
+
+    # The tracker was restarted, so its clock starts over
+    monkeypatch.setattr(trial, "check_quit", lambda keyboard: None)
+    resumed = Checkpoint.load(directory, session)
+    restarted = SimulatedEyelinker(VirtualClock(start=5000.0))
+    assert run_segment(directory, session, registry, restarted, resumed)
+
+    data = load_sessions(directory, sessions=[session])
+    assert len(first) == 3
+    assert data.start_time_tracker[:3].to_list() == [
+        row["start_time_tracker"] for row in first
+    ]
+    assert (data.start_time_tracker[3:] > restarted.tracker.time() - 60_000).all()
+    assert os.path.exists(clock_file(directory, session))
+    assert os.path.exists(clock_file(directory, session, segment=2))
+    assert os.path.exists(memory_file(directory, session))
+    assert os.path.exists(memory_file(directory, session, segment=2))
@@ -0,0 +1,16 @@
+import os
+from config import default_config, load_or_compile, session_schedule
+from simulation import VirtualClock, get_simulation_settings
+
+
+def test_sessions_share_one_artifact_with_their_own_schedule(tmp_path):
+    monitor = get_simulation_settings(VirtualClock(), str(tmp_path))["monitor"]
+    experiment = load_or_compile(default_config(), monitor, str(tmp_path))
+
+    again = load_or_compile(default_config(), monitor, str(tmp_path))
+    assert again["hash"] == experiment["hash"]
+    assert os.listdir(tmp_path / "artifacts") == [f"{experiment['hash']}.json"]
+
+    schedules = [session_schedule(experiment["config"], seed) for seed in [1, 2, 1]]
+    assert schedules[0] == schedules[2]
+    assert schedules[0] != schedules[1]
@@ -0,0 +1,26 @@
+import pytest
+from dashboard import SessionOverview
+
+
+def record(trial_number, gaze_loss):
+    return {
+        "trial_number": trial_number,
+        "block": 1,
+        "trial_condition": "valid",
+        "correct": True,
+        "missed": False,
+        "response_time_in_ms": 500,
+        "premature_pressed": False,
+        "timing_error_in_ms": 0,
+        "gaze_loss": gaze_loss,
+    }
+
+
+def test_gaze_loss_is_the_share_of_samples_over_all_trials():
+    overview = SessionOverview()
+    for trial_number, gaze_loss in enumerate([0.0, 0.5, 0.1, None], 1):
+        overview.add(record(trial_number, gaze_loss))
+
+    # A single trial with a blink counts for its share of the samples only
+    assert overview.all_trials.gaze_lost() == pytest.approx(20)
+    assert "gaze lost (%)" in overview.report()
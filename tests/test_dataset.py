@@ -0,0 +1,45 @@
+import pyarrow as pa
+from datastore import SESSION_SCHEMA, save_session
+from dataset import load_dataset
+from registry import Registry
+
+
+def row(trial_number):
+    values = {
+        pa.int8(): 11,
+        pa.int16(): 1,
+        pa.int32(): trial_number,
+        pa.float64(): 0.5,
+        pa.bool_(): False,
+        pa.dictionary(pa.int8(), pa.string()): "valid",
+        pa.list_(pa.float32(), 3): [0.1, 0.2, 0.3],
+        pa.list_(pa.list_(pa.float32(), 3), 2): [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]],
+    }
+    return {field.name: values[field.type] for field in SESSION_SCHEMA}
+
+
+def test_sessions_are_joined_with_their_participants(tmp_path):
+    directory = str(tmp_path)
+    registry = Registry(str(tmp_path / "participantinfo.db"))
+    sessions = [registry.register_session(age, (10, 99)) for age in [20, 30]]
+    registry.close()
+
+    # Saved out of order, and a test run that isn't part of the dataset
+    for (_, session), n_trials in reversed(list(zip(sessions, [3, 2]))):
+        save_session([row(n) for n in range(1, n_trials + 1)], directory, session)
+    save_session([row(1)], directory, 99, testing=True)
+
+    data = load_dataset(directory)
+    assert list(data.session_number) == [1, 1, 1, 2, 2]
+    assert list(data.trial_number) == [1, 2, 3, 1, 2]
+    assert list(data.participant_number) == [sessions[0][0]] * 3 + [sessions[1][0]] * 2
+    assert list(data.age) == [20, 20, 20, 30, 30]
+    assert data.trial_condition.dtype == "category"
+
+    data = load_dataset(directory, columns=["trial_number"], sessions=[2])
+    assert list(data.columns) == [
+        "session_number",
+        "trial_number",
+        "participant_number",
+        "age",
+    ]
@@ -0,0 +1,54 @@
+import pandas as pd
+from datastore import save_session, load_sessions, session_file
+
+
+def session_data(n_trials):
+    return [
+        {
+            "trial_number": trial,
+            "block": 1,
+            "start_time": 60.5 * trial,
+            "end_time": 60.5 * trial + 3,
+            "static_duration": 500,
+            "trial_condition": "valid" if trial % 2 else "invalid",
+            "stimuli_colours": [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]],
+            "condition_code": "11",
+            "key_pressed": None if trial == 2 else "m",
+            "missed": trial == 2,
+        }
+        for trial in range(1, n_trials + 1)
+    ]
+
+
+def test_saved_sessions_come_back_typed(tmp_path):
+    directory = str(tmp_path)
+    save_session(session_data(3), directory, 1)
+    save_session(session_data(2), directory, 2)
+    save_session(session_data(1), directory, 3, testing=True)
+
+    # The .csv keeps its old format, with times as h:mm:ss
+    csv = pd.read_csv(session_file(directory, 1, extension="csv"))
+    assert csv.start_time.to_list() == ["0:01:00.500000", "0:02:01", "0:03:01.500000"]
+
+    data = load_sessions(directory)
+    assert data.session_number.to_list() == [1, 1, 1, 2, 2]
+    assert data.start_time.to_list()[:3] == [60.5, 121.0, 181.5]
+    assert data.condition_code.to_list() == [11] * 5
+    assert isinstance(data.trial_condition.dtype, pd.CategoricalDtype)
+    assert data.key_pressed.isna().to_list() == [False, True, False, False, True]
+
+
+def test_only_the_requested_columns_and_sessions_are_loaded(tmp_path):
+    directory = str(tmp_path)
+    save_session(session_data(3), directory, 1)
+    save_session(session_data(2), directory, 2)
+    save_session(session_data(1), directory, 3, testing=True)
+
+    data = load_sessions(directory, columns=["trial_number"], sessions=[2])
+    assert list(data.columns) == ["trial_number"]
+    assert data.trial_number.to_list() == [1, 2]
+
+    with_tests = load_sessions(
+        directory, columns=["session_number"], include_tests=True
+    )
+    assert with_tests.session_number.to_list() == [1, 1, 1, 2, 2, 3]
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from edf import sample_dtype
+from gazestore import GazeStore, build_store
+
+
+def recording(rate=500):
+    # Three trials, the last one lost its response trigger
+    triggers = [
+        (1000, "11"), (1100, "21"), (1200, "31"), (1400, "51"),
+        (2000, "12"), (2100, "22"), (2200, "32"), (2500, "52"),
+        (3000, "11"), (3100, "21"), (3200, "31"),
+    ]
+    messages = pd.DataFrame(
+        [(time, f"trig{trigger}") for time, trigger in triggers],
+        columns=["time", "text"],
+    )
+    time = np.arange(0, 4000, 1000 // rate)
+    samples = np.zeros(len(time), dtype=sample_dtype(["right"]))
+    samples["time"] = time
+    samples["x_right"] = time
+    return {"samples": samples, "messages": messages, "rate": rate, "eyes": ["right"]}
+
+
+def behaviour():
+    return pd.DataFrame(
+        {
+            "trial_number": [1, 2, 3],
+            "block": [1, 1, 2],
+            "trial_condition": ["valid", "invalid", "valid"],
+            "condition_code": [11, 12, 11],
+            "key_pressed": ["m", "m", None],
+        }
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    problems = build_store(str(tmp_path), 1, [recording()], behaviour(), margin=100)
+    assert problems.problem.to_list() == [
+        "dropped triggers, expected 1236 but found 123"
+    ]
+    return GazeStore(str(tmp_path), 1)
+
+
+def test_every_trial_runs_from_the_margin_before_to_the_margin_after(store):
+    assert store.rate == 500
+    assert store.trial(1)["x_right"][[0, -1]].tolist() == [900, 1500]
+    assert store.trial(2)["x_right"][[0, -1]].tolist() == [1900, 2600]
+    # Without a response trigger, the trial ends at the orientation change
+    assert store.trial(3)["x_right"][[0, -1]].tolist() == [2900, 3300]
+
+    assert store.trial_range(1, 2)["x_right"][[0, -1]].tolist() == [900, 2600]
+    assert np.shares_memory(store.trial(1), store.samples)
+
+
+def test_epochs_are_cut_around_an_event(store):
+    epoch = store.epoch(2, "cue_onset", before=50, after=100)
+    assert epoch["x_right"].tolist() == list(range(2050, 2200, 2))
+
+    with pytest.raises(Exception, match="has no response"):
+        store.epoch(3, "response", before=0, after=10)
+    with pytest.raises(Exception, match="within trial 1"):
+        store.epoch(1, "stimuli_onset", before=200, after=10)
+
+
+def test_trials_are_selected_and_read_in_batches(store):
+    assert store.select(trial_condition="valid") == [1, 3]
+    assert store.select(trial_condition="valid", block=1) == [1]
+
+    batches = list(store.batches(batch_size=2))
+    assert [trials.index.to_list() for trials, _ in batches] == [[1, 2], [3]]
+    assert [len(samples) for _, samples in batches] == [2, 1]
+    assert batches[1][1][0]["x_right"][0] == 2900
@@ -0,0 +1,76 @@
+import gc
+import os
+import pytest
+import trial
+from gcpolicy import GCPolicy
+from main import run_session
+from registry import Registry
+from participantinfo import get_participant_details
+from simulation import VirtualClock, get_simulation_settings
+
+TRIAL = ("left", "clockwise", 500, "valid")
+
+
+@pytest.fixture
+def gc_policy():
+    policy = GCPolicy()
+    policy.start()
+    yield policy
+    policy.stop()
+
+
+def test_timed_phases_turn_collection_off(gc_policy):
+    gc_policy.timed("stimuli screen")
+    assert not gc.isenabled()
+
+    gc_policy.untimed("between trials")
+    assert gc.isenabled()
+
+
+def test_collections_are_logged_with_their_phase(gc_policy):
+    gc_policy.timed("feedback")
+    gc_policy.collect("feedback")
+
+    pause = gc_policy.pauses[-1]
+    assert pause["phase"] == "feedback"
+    assert pause["explicit"]
+    assert gc_policy.automatic_in_timed_phases() == []
+
+
+def test_stop_restores_collection_after_an_interrupted_trial(tmp_path, monkeypatch):
+    calls = []
+
+    def quit_in_the_second_block(keyboard):
+        # 4 checks per trial, so this is during the cue of the first trial of
+        # block 2, after the block break froze everything that was left
+        calls.append(keyboard)
+        if len(calls) == 16:
+            raise KeyboardInterrupt()
+
+    monkeypatch.setattr(trial, "check_quit", quit_in_the_second_block)
+
+    settings = get_simulation_settings(VirtualClock(), str(tmp_path))
+    registry = Registry(os.path.join(tmp_path, "participantinfo.db"))
+    _, session = get_participant_details(registry, testing=True)
+    policy = GCPolicy()
+
+    try:
+        finished = run_session(
+            [[TRIAL] * 3, [TRIAL] * 3],
+            session,
+            settings,
+            registry,
+            eyetracker=None,
+            testing=True,
+            gc_policy=policy,
+        )
+    finally:
+        # In case run_session didn't clean up, so the other tests aren't affected
+        enabled, frozen = gc.isenabled(), gc.get_freeze_count()
+        policy.stop()
+
+    assert len(calls) == 16
+    assert not finished
+    assert enabled
+    assert frozen == 0
+    assert policy._log not in gc.callbacks
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from geometry import get_geometry
+
+MONITOR = {"resolution": (1920, 1080), "width": 53, "distance": 70}
+
+
+def test_pixels_and_degrees_convert_back_and_forth():
+    geometry = get_geometry(MONITOR, eccentricity=6)
+    degrees = np.array([-5.0, -0.5, 0.0, 0.5, 5.0])
+
+    for exact in [False, True]:
+        pixels = geometry.deg2pix(degrees, exact)
+        assert geometry.pix2deg(pixels, exact) == pytest.approx(degrees)
+
+    # Both agree at the edge of the screen, and exact is wider in the middle
+    edge = MONITOR["resolution"][0] / 2
+    assert geometry.pix2deg(edge, exact=True) == pytest.approx(geometry.pix2deg(edge))
+    assert geometry.deg2pix(0.5, exact=True) < geometry.deg2pix(0.5)
+    assert geometry.to_pixels(0.5) == round(geometry.deg2pix(0.5))
+
+
+def test_gaze_is_converted_from_the_top_left_to_the_centre():
+    geometry = get_geometry(MONITOR, eccentricity=6)
+    x, y = geometry.gaze_to_degrees([960.0, 1920.0], [540.0, 0.0])
+
+    assert x == pytest.approx([0, geometry.pix2deg(960)])
+    assert y == pytest.approx([0, geometry.pix2deg(540)])
+
+
+def test_stimuli_are_placed_below_fixation_at_the_eccentricity():
+    geometry = get_geometry(MONITOR, eccentricity=6)
+    left_x, left_y = geometry.pix2deg(geometry.stimulus_position("left"))
+    right_x, _ = geometry.pix2deg(geometry.stimulus_position("right"))
+
+    assert np.hypot(left_x, left_y) == pytest.approx(6, abs=0.05)
+    assert left_x == -right_x and left_y < 0
+
+    with pytest.raises(Exception, match="Expected 'left' or 'right'"):
+        geometry.stimulus_position("up")
+
+
+def test_the_same_setup_gets_the_same_geometry():
+    geometry = get_geometry(MONITOR, eccentricity=6)
+
+    assert get_geometry(dict(reversed(MONITOR.items())), 6) is geometry
+    assert get_geometry(MONITOR, eccentricity=5) is not geometry
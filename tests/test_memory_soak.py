@@ -0,0 +1,16 @@
+from benchmarks.memory_soak import LiveStimuli
+from simulation import VirtualClock, get_simulation_settings
+from stimuli import make_one_gabor
+
+
+def test_stimuli_are_counted_while_alive(tmp_path):
+    settings = get_simulation_settings(VirtualClock(), str(tmp_path), headless=False)
+
+    with LiveStimuli() as stimuli:
+        colour = settings["colours"][0]
+        gabors = [make_one_gabor(45, colour, "left", settings) for _ in range(3)]
+        assert stimuli.alive() == {"GratingStim": 3}
+
+        del gabors
+        assert stimuli.alive() == {}
+        assert stimuli.made["GratingStim"] == 3
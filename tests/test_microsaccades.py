@@ -0,0 +1,135 @@
+import os
+import numpy as np
+import pandas as pd
+from edf import sample_dtype
+from datastore import session_file
+from microsaccades import (
+    detect,
+    merge_binocular,
+    detect_session,
+    event_file,
+    bias_file,
+    EVENT_DTYPES,
+)
+
+RATE = 1000  # Hz
+ONSET = 1000  # in samples, of the saccade in the synthetic trace
+DURATION = 20  # in samples
+AMPLITUDE = 10  # in pixels
+
+
+def synthetic_recording(eyes=("left", "right")):
+    """Two seconds of fixation noise with one rightward saccade after a second."""
+    random = np.random.default_rng(1)
+    time = np.arange(2 * RATE)
+    ramp = np.clip((time - ONSET) / DURATION, 0, 1)
+    # A smooth (cosine) velocity profile, as in a real saccade
+    x = AMPLITUDE * (1 - np.cos(np.pi * ramp)) / 2
+
+    # As read by edf.read_asc
+    samples = np.empty(len(time), dtype=sample_dtype(list(eyes)))
+    samples["time"] = time
+    for eye in eyes:
+        samples[f"x_{eye}"] = 500 + x + random.normal(0, 0.05, len(time))
+        samples[f"y_{eye}"] = 400 + random.normal(0, 0.05, len(time))
+        samples[f"pupil_{eye}"] = 1000
+
+    return {"samples": samples, "rate": RATE, "eyes": list(eyes)}
+
+
+def test_the_saccade_is_found_in_both_eyes():
+    events = detect(synthetic_recording())
+
+    assert len(events) == 1
+    (event,) = events.itertuples()
+    assert ONSET <= event.onset < event.offset <= ONSET + DURATION
+    assert event.eye == "both"
+    assert abs(event.angle) < 5
+    assert 0.5 * AMPLITUDE < event.amplitude <= AMPLITUDE
+
+
+def test_one_eye_gives_monocular_events():
+    events = detect(synthetic_recording(eyes=("left",)))
+
+    assert len(events) == 1
+    assert events.eye[0] == "left"
+
+
+def test_merging_with_an_eye_without_events_gives_no_events():
+    events = detect(synthetic_recording())
+    empty = events.iloc[:0].drop(columns="eye")
+
+    for left, right in [(events, empty), (empty, events), (empty, empty)]:
+        merged = merge_binocular(left.drop(columns="eye", errors="ignore"), right)
+        assert len(merged) == 0
+        assert list(merged.columns) == [c for c in EVENT_DTYPES if c != "eye"]
+
+
+def write_session(directory, session=1):
+    """
+    Two trials with a rightward microsaccade 300 ms after the cue: away from
+    the cued side on the valid trial, towards it on the invalid one.
+    """
+    triggers = [(1000, 12), (1500, 22), (2500, 32), (2900, 52)]
+    triggers += [(4000, 11), (4500, 21), (5500, 31), (5900, 51)]
+
+    random = np.random.default_rng(1)
+    time = np.arange(7000)
+    x = 500 + random.normal(0, 0.05, len(time))
+    for onset in [1800, 4800]:
+        ramp = np.clip((time - onset) / DURATION, 0, 1)
+        x += AMPLITUDE * (1 - np.cos(np.pi * ramp)) / 2
+    y = 400 + random.normal(0, 0.05, len(time))
+
+    asc_file = os.path.join(directory, f"{session}_12.asc")
+    with open(asc_file, "w") as file:
+        file.write("SAMPLES\tGAZE\tRIGHT\tRATE\t1000.00\n")
+        messages = dict(triggers)
+        for sample in range(len(time)):
+            if sample in messages:
+                file.write(f"MSG\t{sample} trig{messages[sample]}\n")
+            file.write(f"{sample}\t{x[sample]:.2f}\t{y[sample]:.2f}\t1000.0\n")
+
+    pd.DataFrame(
+        {
+            "trial_number": [1, 2],
+            "condition_code": [12, 11],
+            "key_pressed": ["m", "m"],
+            "trial_condition": ["valid", "invalid"],
+            "target_bar": ["left", "left"],
+        }
+    ).to_parquet(session_file(directory, session))
+
+    return asc_file
+
+
+def test_microsaccades_are_epoched_around_the_cue_and_aggregated(tmp_path):
+    directory = str(tmp_path)
+    asc_file = write_session(directory)
+    cache_directory = os.path.join(directory, "analysis_cache")
+
+    saved, report = detect_session(
+        directory, 1, [asc_file], cache_directory=cache_directory
+    )
+    assert saved == [event_file(asc_file), bias_file(directory, 1)]
+    assert list(report.computed) == [1, 1, 1, 1, 1]
+
+    bias = pd.read_parquet(bias_file(directory, 1)).set_index(
+        ["trial_condition", "time"]
+    )
+    # One microsaccade in one trial, in a bin of 50 ms, is 20 per second
+    assert bias.loc[("valid", 300)].tolist() == [1, 0, 20, -20]
+    assert bias.loc[("invalid", 300)].tolist() == [1, 20, 0, 20]
+    assert bias.drop([("valid", 300), ("invalid", 300)]).bias.abs().sum() == 0
+
+    # A rerun reuses every stage
+    _, report = detect_session(
+        directory, 1, [asc_file], cache_directory=cache_directory
+    )
+    assert report.set_index("stage").reused.to_dict() == {
+        "parse": 1,
+        "clean": 1,
+        "detect": 1,
+        "epoch": 1,
+        "aggregate": 1,
+    }
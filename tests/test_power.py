@@ -0,0 +1,58 @@
+import os
+import power
+from config import default_config
+
+
+def significant(observer, n_participants, n_studies=200, seed=1):
+    counts = power.power_for(
+        observer, default_config(), n_participants, n_studies, seed
+    )
+    return {measure: count / n_studies for measure, count in counts.items()}
+
+
+def test_power_increases_with_the_number_of_participants():
+    few = significant(power.OBSERVER, 4)
+    many = significant(power.OBSERVER, 30)
+
+    for measure in ["accuracy", "rt", "gaze_bias"]:
+        assert many[measure] > few[measure]
+
+
+def test_power_increases_with_the_effect_size():
+    small = significant({**power.OBSERVER, "validity_cost": 1.02}, 10)
+    large = significant({**power.OBSERVER, "validity_cost": 1.3}, 10)
+
+    assert large["accuracy"] > small["accuracy"]
+
+
+def test_the_validity_effect_fades_with_the_static_duration():
+    lasting = significant({**power.OBSERVER, "validity_decay": 1e9}, 10)
+    fading = significant({**power.OBSERVER, "validity_decay": 300}, 10)
+
+    assert fading["accuracy"] < lasting["accuracy"]
+    assert fading["rt"] < lasting["rt"]
+
+
+def test_without_an_effect_power_is_the_false_positive_rate():
+    observer = {**power.OBSERVER, "validity_cost": 1, "rt_validity_cost": 0}
+    no_effect = significant(observer, 20, n_studies=1000)
+
+    assert no_effect["accuracy"] < 2 * power.ALPHA
+    assert no_effect["rt"] < 2 * power.ALPHA
+
+
+def test_the_cache_key_changes_with_the_design():
+    config = default_config()
+    key = power.cache_key(power.OBSERVER, config, [10, 20], 100, 0)
+
+    assert power.cache_key(power.OBSERVER, config, [10, 20], 100, 0) == key
+    assert (
+        power.cache_key(
+            power.OBSERVER, {**config, "predictability": 60}, [10, 20], 100, 0
+        )
+        != key
+    )
+
+
+def test_the_cache_is_next_to_the_script():
+    assert os.path.dirname(power.CACHE_DIRECTORY) == os.path.dirname(power.__file__)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from edf import sample_dtype
+from preprocessing import find_runs, pad_runs, interpolate_runs, mask_runs, clean
+
+
+@pytest.mark.parametrize(
+    "mask, starts, ends",
+    [
+        ([], [], []),
+        ([False, False], [], []),
+        ([True, True, True], [0], [3]),
+        ([True, False, False, True], [0, 3], [1, 4]),
+        ([False, True, True, False, True], [1, 4], [3, 5]),
+    ],
+)
+def test_runs_are_found_up_to_the_edges(mask, starts, ends):
+    found = find_runs(np.array(mask, dtype=bool))
+
+    assert found[0].tolist() == starts
+    assert found[1].tolist() == ends
+
+
+def test_padded_runs_stay_within_the_samples_and_merge():
+    starts, ends = pad_runs(np.array([1, 6, 20]), np.array([3, 8, 22]), 2, 23)
+
+    assert starts.tolist() == [0, 18]
+    assert ends.tolist() == [10, 23]
+
+
+def test_runs_are_interpolated_or_masked_in_place():
+    values = np.arange(10, dtype=np.float32)
+    values[[2, 3, 4, 7]] = np.nan
+
+    interpolate_runs(values, np.array([2]), np.array([5]))
+    mask_runs(values, np.array([7]), np.array([8]))
+
+    assert values[:7].tolist() == list(range(7))
+    assert np.isnan(values[7])
+
+    # Without any runs nothing changes
+    interpolate_runs(values, np.array([], dtype=int), np.array([], dtype=int))
+    assert values[:7].tolist() == list(range(7))
+
+
+def samples_with_gaps(gaps, length=2000):
+    samples = np.zeros(length, dtype=sample_dtype(["right"]))
+    samples["time"] = np.arange(length)
+    samples["x_right"] = 500
+    samples["y_right"] = 400
+    samples["pupil_right"] = 1000
+    for start, end in gaps:
+        samples["x_right"][start:end] = np.nan
+        samples["pupil_right"][start:end] = 0
+    return samples
+
+
+def test_blinks_are_interpolated_and_long_or_edge_gaps_masked():
+    # A blink, a dropout, a gap too long to be a blink or to interpolate,
+    # and one at the end
+    samples = samples_with_gaps([(200, 300), (500, 510), (800, 1500), (1980, 2000)])
+
+    gaps = clean(samples, ["right"], rate=1000)
+
+    assert gaps.onset.tolist() == [200, 500, 800, 1980]
+    assert gaps.blink.tolist() == [True, False, False, False]
+    assert not np.isnan(samples["x_right"][:750]).any()
+    assert np.isnan(samples["x_right"][750:1550]).all()
+    assert not np.isnan(samples["x_right"][1550:1930]).any()
+    assert np.isnan(samples["x_right"][1930:]).all()
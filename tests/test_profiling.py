@@ -0,0 +1,31 @@
+import pytest
+from time import perf_counter
+from profiling import BlockProfiler, profile_file
+
+
+def busy(seconds):
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        pass
+
+
+@pytest.mark.parametrize("mode", ["sampling", "cprofile"])
+def test_every_block_gets_its_own_report(tmp_path, mode):
+    directory = str(tmp_path)
+    profiler = BlockProfiler(mode, directory, 4)
+    for block in [1, 2]:
+        profiler.next_block(block)
+        busy(0.1)
+    profiler.stop()
+    profiler.stop()
+
+    for block in [1, 2]:
+        with open(profile_file(directory, 4, block)) as file:
+            report = file.read()
+        assert report.startswith(f"Block {block} of session 4 ({mode})")
+        assert "busy" in report
+
+
+def test_an_unknown_mode_is_refused(tmp_path):
+    with pytest.raises(Exception, match="profiling mode"):
+        BlockProfiler("perf", str(tmp_path), 4)
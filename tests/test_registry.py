@@ -0,0 +1,55 @@
+import pytest
+from participantinfo import ParticipantIDAllocator
+from registry import Registry
+
+ID_RANGE = (10, 14)
+
+
+def test_allocation_continues_where_it_stopped(tmp_path):
+    path = str(tmp_path / "participantinfo.db")
+    registry = Registry(path)
+    first, _ = registry.register_session(20, ID_RANGE)
+    (seed, _) = registry.allocation(ID_RANGE)
+    registry.close()
+
+    # Taken by hand (e.g. imported from the old .csv), so it's skipped
+    allocator = ParticipantIDAllocator(id_range=ID_RANGE, seed=seed)
+    order = [allocator.participant_at(position) for position in range(5)]
+    registry = Registry(path)
+    registry.connection.execute("INSERT INTO participants VALUES (?, 30)", (order[2],))
+
+    rest = [registry.register_session(20, ID_RANGE)[0] for _ in range(3)]
+    assert [first, *rest] == order[:2] + order[3:]
+    assert registry.allocation(ID_RANGE) == (seed, 5)
+
+    with pytest.raises(Exception, match="are taken"):
+        registry.register_session(20, ID_RANGE)
+
+
+@pytest.mark.parametrize("id_range", [(10, 99), (1, 1), (0, 1000), (5, 6)])
+def test_the_order_is_a_permutation_of_the_range(id_range):
+    allocator = ParticipantIDAllocator(id_range=id_range, seed=3)
+    order = [allocator.participant_at(position) for position in range(allocator.size)]
+
+    assert sorted(order) == list(range(id_range[0], id_range[1] + 1))
+    assert order != sorted(order) or len(order) < 3
+    assert ParticipantIDAllocator(id_range=id_range, seed=4).participant_at(0) in order
+
+
+def test_a_huge_range_costs_nothing_up_front():
+    allocator = ParticipantIDAllocator(id_range=(10, 10**15), seed=3)
+
+    participants = [allocator.allocate() for _ in range(100)]
+    assert len(set(participants)) == 100
+    assert all(10 <= participant <= 10**15 for participant in participants)
+
+
+def test_edf_files_are_registered(tmp_path):
+    registry = Registry(str(tmp_path / "participantinfo.db"))
+    participant, session = registry.register_session(20, ID_RANGE)
+    registry.register_edf(session, 1, "0a1b2c3d.edf", f"{session}_{participant}.edf")
+    registry.register_edf(session, 2, "4e5f6a7b.edf", f"{session}_{participant}_2.edf")
+
+    assert registry.connection.execute(
+        "SELECT segment, host_file FROM edf_files WHERE session_number = ?", (session,)
+    ).fetchall() == [(1, "0a1b2c3d.edf"), (2, "4e5f6a7b.edf")]
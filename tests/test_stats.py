@@ -0,0 +1,75 @@
+import numpy as np
+from scipy import stats as scipy_stats
+from stats import (
+    t_values,
+    cluster_labels,
+    cluster_masses,
+    max_cluster_masses,
+    null_distribution,
+    cluster_test,
+)
+
+
+def test_t_values_match_scipy():
+    data = np.random.default_rng(1).normal(0.3, 1, size=(12, 5))
+    labels = np.array([True] * 5 + [False] * 7)
+
+    assert np.allclose(t_values(data)[0], scipy_stats.ttest_1samp(data, 0).statistic)
+    assert np.allclose(
+        t_values(data, labels=labels[np.newaxis])[0],
+        scipy_stats.ttest_ind(data[labels], data[~labels]).statistic,
+    )
+
+    # Flipping every sign flips t
+    signs = -np.ones((1, 12))
+    assert np.allclose(t_values(data, signs=signs), -t_values(data))
+
+
+def test_runs_are_numbered_across_rows():
+    above = np.array([[True, True, False, True], [True, False, False, False]])
+
+    assert cluster_labels(above).tolist() == [[1, 1, 0, 2], [3, 0, 0, 0]]
+
+
+def test_positive_and_negative_clusters_are_separate():
+    t = np.array([[3.0, 4.0, -3.0, -5.0, 0.0, 2.5]])
+
+    labels, masses = cluster_masses(t, threshold=2)
+
+    assert labels.tolist() == [[1, 1, 3, 3, 0, 2]]
+    assert masses.tolist() == [0, 7, 2.5, -8]
+    assert max_cluster_masses(t, threshold=2).tolist() == [8]
+
+
+def test_rows_without_clusters_have_no_mass():
+    t = np.array([[0.0, 1.0], [3.0, 0.0], [0.0, -1.0]])
+
+    assert max_cluster_masses(t, threshold=2).tolist() == [0, 3, 0]
+
+
+def test_the_null_distribution_only_depends_on_the_seed():
+    data = np.random.default_rng(2).normal(size=(10, 20))
+
+    one = null_distribution(data, 2.0, n_permutations=600, seed=5, max_workers=1)
+    two = null_distribution(data, 2.0, n_permutations=600, seed=5, max_workers=2)
+
+    assert len(one) == 600
+    assert np.array_equal(one, two)
+
+
+def test_an_effect_is_found_where_it_is():
+    rng = np.random.default_rng(3)
+    data = rng.normal(size=(20, 60))
+    data[:, 20:35] += 1.5
+
+    clusters = cluster_test(data, n_permutations=500, max_workers=2)
+    (significant,) = clusters[clusters.p_value < 0.05].itertuples()
+
+    assert significant.start <= 22 and significant.end >= 32
+
+    # Between two groups, without any difference
+    labels = np.array([True, False] * 10)
+    clusters = cluster_test(
+        rng.normal(size=(20, 60)), labels=labels, n_permutations=500, max_workers=2
+    )
+    assert (clusters.p_value >= 0.05).all()
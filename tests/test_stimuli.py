@@ -0,0 +1,76 @@
+import pytest
+import stimuli
+from geometry import get_geometry
+from stimuli import gabor_mask, prepare_stimuli
+
+
+class Stimulus:
+    def __init__(self, **parameters) -> None:
+        self.parameters = parameters
+
+
+def test_the_gabor_mask_is_transparent_outside_the_gabor():
+    mask = gabor_mask(64)
+
+    assert gabor_mask(64) is mask
+    assert mask.shape == (64, 64)
+    assert mask.min() >= -1 and mask.max() <= 1
+    assert (mask[[0, 0, -1, -1], [0, -1, 0, -1]] == -1).all()
+    assert mask[24:40, 24:40].max() > 0.5
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    # Records what would be drawn, without a window
+    for name in ["Circle", "GratingStim", "ElementArrayStim"]:
+        monkeypatch.setattr(stimuli.visual, name, Stimulus)
+
+    monitor = {"resolution": (1920, 1080), "width": 53, "distance": 70}
+    return {
+        "window": object(),
+        "geometry": get_geometry(monitor, eccentricity=6),
+        "gabor_size": 64,
+        "dot_radius": 4,
+    }
+
+
+def prepare(settings, renderer, left_orientation_2, right_orientation_2):
+    prepared = {}
+    for _ in prepare_stimuli(
+        20,
+        -20,
+        left_orientation_2,
+        right_orientation_2,
+        [(1, 0, 0), (0, 0, 1)],
+        "blue",
+        {**settings, "renderer": renderer},
+        prepared,
+    ):
+        pass
+
+    return prepared
+
+
+def test_the_element_array_draws_both_gabors_at_once(settings):
+    prepared = prepare(settings, "element_array", 20, -20)
+    (gabors,) = prepared["gabors"]
+    assert gabors.parameters["nElements"] == 2
+    assert gabors.parameters["oris"] == [20, -20]
+    assert gabors.parameters["xys"] == [
+        settings["geometry"].stimulus_position("left"),
+        settings["geometry"].stimulus_position("right"),
+    ]
+    # Nothing turns, so the second screen is the same
+    assert prepared["gabors_2"] is prepared["gabors"]
+
+    (turned,) = prepare(settings, "element_array", 20, -10)["gabors_2"]
+    assert turned.parameters["oris"] == [20, -10]
+
+
+def test_only_the_gabor_that_turns_is_made_again(settings):
+    prepared = prepare(settings, "grating", 20, -10)
+    left, right = prepared["gabors"]
+    left_2, right_2 = prepared["gabors_2"]
+
+    assert left_2 is left and right_2 is not right
+    assert right_2.parameters["pos"] == settings["geometry"].stimulus_position("right")
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from summary import ConditionSummary, RT_BIN_WIDTH
+
+
+def trial(condition, response_time=None, correct=True, premature=False):
+    return {
+        "trial_condition": condition,
+        "target_bar": "left",
+        "change_direction": "clockwise",
+        "static_duration": 500,
+        "correct_key": correct,
+        "premature_pressed": premature,
+        "missed": response_time is None,
+        "response_time_in_ms": response_time,
+    }
+
+
+def test_statistics_match_the_raw_trials():
+    rts = [410.0, 520.0, 560.0, 700.0]
+    summary = ConditionSummary()
+    for rt in rts:
+        summary.update(trial("valid", rt))
+    summary.update(trial("valid", correct=False, premature=True))
+
+    (row,) = summary.table(by=("trial_condition",)).itertuples()
+    assert row.n == 5
+    assert row.accuracy == 0.8
+    assert row.missed == row.premature == 0.2
+    assert row.mean_rt == pytest.approx(np.mean(rts))
+    assert row.sd_rt == pytest.approx(np.std(rts, ddof=1))
+    assert abs(row.median_rt - np.median(rts)) <= RT_BIN_WIDTH
+
+
+def test_merged_summaries_equal_one_summary_of_all_trials(tmp_path):
+    trials = [trial("valid", 400 + 10 * n) for n in range(6)]
+    trials += [trial("invalid", 450 + 10 * n, correct=n % 2 == 0) for n in range(4)]
+
+    whole, first, second = ConditionSummary(), ConditionSummary(), ConditionSummary()
+    for n, one in enumerate(trials):
+        whole.update(one)
+        (first if n % 2 else second).update(one)
+
+    path = str(tmp_path / "summary.json")
+    second.save(path)
+    merged = first.merge(ConditionSummary.load(path))
+
+    assert merged.table().equals(whole.table())
+    effect = merged.validity_effect()
+    assert effect["accuracy_effect"] == pytest.approx(0.5 - 1)
+    assert effect["rt_effect"] == pytest.approx(465 - 425)
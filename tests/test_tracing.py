@@ -0,0 +1,42 @@
+import json
+import threading
+from time import sleep
+from tracing import Tracer, span, trace_file
+
+
+def test_spans_are_saved_as_chrome_trace_events(tmp_path):
+    tracer = Tracer()
+    tracer.start()
+    with span("trial", trial=1):
+        with span("draw"):
+            sleep(0.002)
+    thread = threading.Thread(target=lambda: span("flip").__enter__().__exit__())
+    thread.start()
+    thread.join()
+    tracer.stop()
+
+    # Nothing is recorded after the tracer was stopped
+    with span("after"):
+        pass
+
+    path = trace_file(str(tmp_path), 1)
+    tracer.save(path)
+    with open(path) as file:
+        trace = json.load(file)
+
+    draw, trial, flip = trace["traceEvents"]
+    assert [draw["name"], trial["name"], flip["name"]] == ["draw", "trial", "flip"]
+    assert all(event["ph"] == "X" for event in trace["traceEvents"])
+    assert trial["args"] == {"trial": 1} and draw["args"] == {}
+
+    # In µs, and the inner span lies within the outer one
+    assert draw["dur"] >= 2000
+    assert trial["ts"] <= draw["ts"]
+    assert draw["ts"] + draw["dur"] <= trial["ts"] + trial["dur"]
+    assert trial["tid"] == draw["tid"] != flip["tid"]
+    assert trial["pid"] == flip["pid"]
+
+
+def test_every_segment_has_its_own_trace(tmp_path):
+    assert trace_file(tmp_path, 3) != trace_file(tmp_path, 3, segment=2)
+    assert trace_file(tmp_path, 3) != trace_file(tmp_path, 3, testing=True)
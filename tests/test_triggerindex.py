@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from edf import sample_dtype
+from gazestore import GazeStore, build_store
+from triggerindex import build_index
+
+# Condition codes of three trials (see config.get_trigger), all answered with "m"
+CODES = [12, 17, 11]
+
+
+def messages(triggers):
+    return pd.DataFrame(
+        [(time, f"trig{trigger}") for time, trigger in triggers],
+        columns=["time", "text"],
+    )
+
+
+def behaviour():
+    return pd.DataFrame(
+        {
+            "trial_number": [1, 2, 3],
+            "condition_code": CODES,
+            "key_pressed": ["m", "m", "m"],
+        }
+    )
+
+
+def resumed_session():
+    """Trial 2 is cut off after its cue, and repeated at the start of segment 2."""
+    first = messages(
+        [(1000, "12"), (1100, "22"), (1200, "32"), (1300, "52")]
+        + [(2000, "17"), (2100, "27")]
+    )
+    second = messages(
+        [(5000, "17"), (5100, "27"), (5200, "37"), (5300, "57")]
+        + [(6000, "11"), (6100, "21"), (6200, "31"), (6300, "51")]
+    )
+    return [first, second]
+
+
+def test_an_interrupted_trial_is_matched_to_its_repeat():
+    index, problems = build_index(resumed_session(), behaviour())
+
+    assert index.segment.to_dict() == {1: 1, 2: 2, 3: 2}
+    assert index.stimuli_onset.to_dict() == {1: 1000, 2: 5000, 3: 6000}
+    assert (index.sequence == "1235").all()
+    assert problems.problem.to_list() == [
+        "interrupted trial 12, repeated in the next segment"
+    ]
+    assert problems.trial_number.to_list() == [2]
+
+
+def test_a_segment_boundary_ends_a_trial():
+    # Without a repeat, the last trial of segment 1 keeps its dropped triggers
+    first, second = resumed_session()
+    index, problems = build_index([first, second.iloc[4:]], behaviour())
+
+    assert index.stimuli_onset.to_dict() == {1: 1000, 2: 2000, 3: 6000}
+    assert problems.problem.to_list() == [
+        "dropped triggers, expected 1235 but found 12"
+    ]
+
+
+def recording(start, end, triggers):
+    time = np.arange(start, end)
+    samples = np.zeros(len(time), dtype=sample_dtype(["right"]))
+    samples["time"] = time
+    samples["x_right"] = time
+    return {"samples": samples, "messages": triggers, "rate": 1000, "eyes": ["right"]}
+
+
+def test_the_gaze_store_reads_the_repeated_trial(tmp_path):
+    first, second = resumed_session()
+    recordings = [recording(500, 2500, first), recording(4500, 7000, second)]
+    build_store(str(tmp_path), 1, recordings, behaviour(), margin=100)
+
+    samples = GazeStore(str(tmp_path), 1).trial(2)
+    assert samples["x_right"][0] == 5000 - 100
+    assert samples["x_right"][-1] == 5300 + 100
@@ -0,0 +1,117 @@
+"""
+This file contains the functions necessary for
+timing every phase of a trial (drawing, triggers, waiting for a response, ...)
+and saving those times as a trace, to see where a slow trial spent its time.
+Open the trace in https://ui.perfetto.dev or chrome://tracing.
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import os
+import json
+import threading
+from time import perf_counter_ns
+
+_tracer = None
+
+
+class Tracer:
+    """
+    Collects spans: a name, start and end time (in ns), and some details.
+    Only one tracer records at a time, the one that was started last.
+
+    usage:
+
+       tracer = Tracer()
+       tracer.start()
+       with span("draw", trial=12):
+           ...
+       tracer.stop()
+       tracer.save(trace_file(directory, session))
+    """
+
+    def __init__(self) -> None:
+        self.spans = []
+        self.origin = perf_counter_ns()
+
+    def start(self):
+        global _tracer
+        _tracer = self
+
+    def stop(self):
+        global _tracer
+        if _tracer is self:
+            _tracer = None
+
+    def record(self, name, start, end, details):
+        self.spans.append((name, start, end, threading.get_ident(), details))
+
+    def events(self):
+        """The spans as Chrome trace events, in µs since the tracer was made."""
+        process = os.getpid()
+        return [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": process,
+                "tid": thread,
+                "args": details,
+            }
+            for name, start, end, thread, details in self.spans
+        ]
+
+    def save(self, path):
+        # Encoded in one go, json.dump would write it in many small pieces
+        trace = json.dumps({"traceEvents": self.events(), "displayTimeUnit": "ns"})
+        with open(path, "w") as file:
+            file.write(trace)
+
+
+class Span:
+    def __init__(self, tracer: Tracer, name, details) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.details = details
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        self.tracer.record(self.name, self.start, perf_counter_ns(), self.details)
+
+
+class NoSpan:
+    """Used when nothing is being traced, so a span costs (almost) nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_no_span = NoSpan()
+
+
+def span(name, **details):
+    """
+    Times everything within `with span(name):`, if a tracer was started.
+    `details` are shown with the span, e.g. the trial number.
+    """
+    if _tracer is None:
+        return _no_span
+
+    return Span(_tracer, name, details)
+
+
+def trace_file(directory, session, testing=False, segment=1):
+    """A resumed session (see main.resume) saves every segment in its own trace."""
+    return os.path.join(
+        directory,
+        f"trace_session_{session}"
+        f"{'' if segment == 1 else f'_{segment}'}{'_test' if testing else ''}.json",
+    )
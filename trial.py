@@ -8,91 +8,84 @@ made by Anna van Harmelen, 2023
 """
 
 from psychopy import visual
-from psychopy.core import wait
-from time import time, sleep
-from response import get_response, check_quit
+from response import get_response, check_quit, start_response_clock_on_flip
 from stimuli import (
     create_fixation_dot,
-    create_stimuli_frame,
+    prepare_stimuli,
+    draw_stimuli_frame,
+    is_headless,
 )
-from eyetracker import get_trigger
-import random
+from tracing import span
 
-# COLOURS = [[21, 165, 234], [133, 193, 18], [197, 21, 234], [234, 74, 21]]
-COLOURS = [[19, 146, 206], [217, 103, 241], [101, 148, 14], [238, 104, 60]]
-COLOURS = [
-    [(rgb_value / 128 - 1) for rgb_value in rgb_triplet] for rgb_triplet in COLOURS
-]
-ORIENTATION_TURN = 2
+FEEDBACK_DURATION = 0.25  # in s
+PREPARATION_MARGIN = 0.02  # in s, of the feedback left unused by TrialPreparation
 
 
-def generate_trial_characteristics(
-    condition: str, target_bar: str, duration, direction: str
-):
-    # Decide on random colours of stimulus
-    stimuli_colours = random.sample(COLOURS, 2)
+class TrialPreparation:
+    """
+    Builds the stimuli of a trial ahead of time, a bit at a time, so it can
+    be done during the feedback of the trial before it.
 
-    # Create random original orientations
-    orientations = [
-        random.choice([-1, 1]) * random.randint(5, 85),
-        random.choice([-1, 1]) * random.randint(5, 85),
-    ]
+    usage:
 
-    post_orientations = list(orientations)
+       preparation = TrialPreparation(trial_characteristics, settings)
+       preparation.work_until(deadline)  # builds what fits before the deadline
+       stimuli = preparation.finish()  # whatever is left
+    """
 
-    # Make orientation change in predetermined direction
-    if direction == "clockwise":
-        orientation_change = ORIENTATION_TURN
-    if direction == "anticlockwise":
-        orientation_change = -ORIENTATION_TURN
+    # The longest any step took so far (in s), shared by all trials
+    longest_step = 0.0
 
-    # Determine both stimuli orientations after orientation change
-    if target_bar == "left":
-        target_colour, distractor_colour = stimuli_colours
-        target_pre_orientation = orientations[0]
-        target_post_orientation = post_orientations[0] = (
-            post_orientations[0] + orientation_change
-        )
-    else:
-        distractor_colour, target_colour = stimuli_colours
-        target_pre_orientation = orientations[1]
-        target_post_orientation = post_orientations[1] = (
-            orientations[1] + orientation_change
+    def __init__(self, characteristics: dict, settings) -> None:
+        self.clock = settings["clock"]
+        self.stimuli = {}
+        self.steps = prepare_stimuli(
+            characteristics["left_orientation"],
+            characteristics["right_orientation"],
+            characteristics["left_orientation_2"],
+            characteristics["right_orientation_2"],
+            characteristics["stimuli_colours"],
+            characteristics["capture_colour"],
+            settings,
+            self.stimuli,
         )
+        self.done = False
 
-    # Determine colour of cue
-    if condition == "valid":
-        capture_colour = target_colour
-    elif condition == "invalid":
-        capture_colour = distractor_colour
+    def work_until(self, deadline):
+        """Only starts a step if even the longest step so far would end before `deadline`."""
+        while not self.done:
+            start = self.clock.time()
+            if start + TrialPreparation.longest_step >= deadline:
+                break
 
-    return {
-        "static_duration": duration,
-        "ITI": random.randint(500, 800),
-        "change_direction": direction,
-        "stimuli_colours": stimuli_colours,
-        "capture_colour": capture_colour,
-        "trial_condition": condition,
-        "left_orientation": orientations[0],
-        "right_orientation": orientations[1],
-        "left_orientation_2": post_orientations[0],
-        "right_orientation_2": post_orientations[1],
-        "target_bar": target_bar,
-        "target_colour": target_colour,
-        "target_pre_orientation": target_pre_orientation,
-        "target_post_orientation": target_post_orientation,
-    }
+            self.done = next(self.steps, "done") == "done"
+            TrialPreparation.longest_step = max(
+                TrialPreparation.longest_step, self.clock.time() - start
+            )
 
+    def finish(self):
+        self.work_until(float("inf"))
+        return self.stimuli
 
-def do_while_showing(waiting_time, something_to_do, window):
+
+def do_while_showing(waiting_time, something_to_do, settings):
     """
     Show whatever is drawn to the screen for exactly `waiting_time` period,
     while doing `something_to_do` in the mean time.
+    Returns the time at which the screen was shown, and how long
+    `something_to_do` took.
     """
-    window.flip()
-    start = time()
-    something_to_do()
-    wait(waiting_time - (time() - start))
+    clock = settings["clock"]
+    with span("flip"):
+        settings["window"].flip()
+    start = clock.time()
+    with span("draw next screen"):
+        something_to_do()
+    busy = clock.time() - start
+    with span("wait"):
+        clock.wait(waiting_time - busy)
+
+    return start, busy
 
 
 def single_trial(
@@ -113,7 +106,36 @@ def single_trial(
     settings,
     testing,
     eyetracker=None,
+    preparation=None,
+    prepare_next=None,
+    gc_policy=None,
 ):
+    """
+    `preparation` holds this trial's stimuli if they were prepared in advance
+    (see TrialPreparation), `prepare_next` is the next trial's preparation,
+    which is worked on during the feedback at the end of this trial.
+    With a `gc_policy`, garbage is only collected during the feedback
+    (see gcpolicy.GCPolicy).
+    """
+    if gc_policy:
+        gc_policy.timed("prepare stimuli")
+
+    # Build all stimuli before the first flip, so no screen waits for them
+    if preparation is None:
+        preparation = TrialPreparation(
+            {
+                "left_orientation": left_orientation,
+                "right_orientation": right_orientation,
+                "left_orientation_2": left_orientation_2,
+                "right_orientation_2": right_orientation_2,
+                "stimuli_colours": stimuli_colours,
+                "capture_colour": capture_colour,
+            },
+            settings,
+        )
+    with span("prepare stimuli"):
+        stimuli = preparation.finish()
+
     # Initial fixation cross to eliminate jitter caused by for loop
     create_fixation_dot(settings)
 
@@ -122,85 +144,121 @@ def single_trial(
         (ITI / 1000, lambda: create_fixation_dot(settings), None),
         (
             0.75,
-            lambda: create_stimuli_frame(
-                left_orientation, right_orientation, stimuli_colours, settings
-            ),
+            lambda: draw_stimuli_frame(stimuli),
             "stimuli_onset",
         ),
         (
             static_duration / 1000,
-            lambda: create_stimuli_frame(
-                left_orientation,
-                right_orientation,
-                stimuli_colours,
-                settings,
-                capture_colour,
-            ),
+            lambda: draw_stimuli_frame(stimuli, fixation="cue"),
             "cue_onset",
         ),
         (
             None,
-            lambda: create_stimuli_frame(
-                left_orientation_2,
-                right_orientation_2,
-                stimuli_colours,
-                settings,
-                capture_colour,
-            ),
+            lambda: draw_stimuli_frame(stimuli, gabors="gabors_2", fixation="cue"),
         ),
     ]
+    screen_names = ["start", "ITI", "stimuli", "cue", "orientation change"]
 
     # !!! The timing you pass to do_while_showing is the timing for the previously drawn screen. !!!
+    onsets, busy = [], []
     for index, (duration, _, frame) in enumerate(screens[:-1]):
         # Send trigger if not testing
         if not testing and frame:
-            trigger = get_trigger(frame, trial_condition, target_bar, change_direction)
-            eyetracker.tracker.send_message(f"trig{trigger}")
+            trigger = settings["triggers"][
+                frame, trial_condition, target_bar, change_direction
+            ]
+            with span("send trigger", trigger=trigger):
+                eyetracker.tracker.send_message(f"trig{trigger}")
 
         # Check for pressed 'q'
-        check_quit(settings["keyboard"])
+        with span("check quit"):
+            check_quit(settings["keyboard"])
 
         # Draw the next screen while showing the current one
-        do_while_showing(duration, screens[index + 1][1], settings["window"])
+        if gc_policy:
+            gc_policy.phase = f"{screen_names[index]} screen"
+        with span(f"{screen_names[index]} screen"):
+            onset, time_drawing = do_while_showing(
+                duration, screens[index + 1][1], settings
+            )
+        onsets.append(onset)
+        busy.append(time_drawing)
 
     # The for loop only draws the last frame, never shows it
     # So show it here
     if not testing:
-        trigger = get_trigger(
+        trigger = settings["triggers"][
             "orientation_change", trial_condition, target_bar, change_direction
-        )
-        eyetracker.tracker.send_message(f"trig{trigger}")
+        ]
+        with span("send trigger", trigger=trigger):
+            eyetracker.tracker.send_message(f"trig{trigger}")
 
-    settings["window"].flip()
+    if gc_policy:
+        gc_policy.phase = "response"
+    with span("flip"):
+        start_response_clock_on_flip(settings)
+    change_onset = settings["clock"].time()
 
-    response = get_response(
-        settings,
-        testing,
-        eyetracker,
-        trial_condition,
-        change_direction,
-        target_bar,
-    )
+    with span("response"):
+        response = get_response(
+            settings,
+            testing,
+            eyetracker,
+            trial_condition,
+            change_direction,
+            target_bar,
+        )
 
     # Show performance (and feedback on premature key usage if necessary)
-    create_fixation_dot(settings)
-    show_text(response["feedback"], settings["window"], (0, settings["deg2pix"](0.3)))
-    
-    if response["premature_pressed"] == True:
-        show_text("!", settings["window"], (0, -settings["deg2pix"](0.3)))
-    
-    settings["window"].flip()
-    sleep(0.25)
+    with span("feedback text"):
+        create_fixation_dot(settings)
+        show_text(
+            response["feedback"], settings["window"], (0, settings["deg2pix"](0.3))
+        )
+
+        if response["premature_pressed"] == True:
+            show_text("!", settings["window"], (0, -settings["deg2pix"](0.3)))
+
+    with span("flip"):
+        settings["window"].flip()
+
+    # Prepare the next trial and collect garbage while the feedback is shown.
+    # Collecting the young objects takes well under the margin left by the preparation.
+    feedback_onset = settings["clock"].time()
+    if prepare_next:
+        with span("prepare next trial"):
+            prepare_next.work_until(
+                feedback_onset + FEEDBACK_DURATION - PREPARATION_MARGIN
+            )
+    if gc_policy:
+        with span("collect garbage"):
+            gc_policy.collect("feedback")
+    with span("wait"):
+        settings["clock"].sleep(
+            max(0.0, FEEDBACK_DURATION - (settings["clock"].time() - feedback_onset))
+        )
+    if gc_policy:
+        gc_policy.untimed("between trials")
+
+    # Compare how long the timed screens (ITI up to the orientation change) took to the plan
+    planned_duration = ITI + 750 + static_duration
+    timing_error = (change_onset - onsets[1]) * 1000 - planned_duration
 
     return {
-        "condition_code": get_trigger(
+        "condition_code": settings["triggers"][
             "stimuli_onset", trial_condition, target_bar, change_direction
-        ),
+        ],
+        "timing_error_in_ms": round(timing_error, 2),
+        # Work done between the ITI flip and the stimuli onset flip
+        "iti_drawing_in_ms": round(busy[1] * 1000, 3),
         **response,
     }
 
 
 def show_text(input, window, pos=(0, 0), colour="#ffffff"):
+    if is_headless(window):
+        return
+
     textstim = visual.TextStim(
         win=window, font="Courier New", text=input, color=colour, pos=pos, height=22
     )
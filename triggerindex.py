@@ -0,0 +1,220 @@
+"""
+This file contains the functions necessary for
+linking the behavioural data of a session to its eyetracking data,
+through the triggers sent during every trial (1x, 2x, 3x and then 4x/5x/6x,
+with x the condition code, see config.get_trigger).
+To run the 'microsaccade bias' experiment, see main.py.
+
+made by Anna van Harmelen, 2023
+"""
+
+import numpy as np
+import pandas as pd
+
+FRAMES = {
+    "1": "stimuli_onset",
+    "2": "cue_onset",
+    "3": "orientation_change",
+    "4": "response",
+    "5": "response",
+    "6": "response",
+}
+RESPONSE_DIGITS = {"z": "4", "m": "5", None: "6"}
+
+
+def trigger_table(messages):
+    """
+    Picks the triggers out of the messages of every segment of a recording
+    (see edf.read_asc, in segment order) and numbers the trials they belong to:
+    every 1x trigger, and every new segment, starts a new one.
+    Repeated triggers are marked as duplicates.
+    """
+    tables = []
+    for segment, table in enumerate(messages, start=1):
+        table = table[table.text.str.match(r"trig\d\d$")]
+        tables.append(
+            pd.DataFrame(
+                {
+                    "segment": segment,
+                    "time": table.time.to_numpy(),
+                    "frame": table.text.str[4].to_numpy(),
+                    "condition": table.text.str[5].to_numpy(),
+                }
+            )
+        )
+
+    triggers = pd.concat(tables, ignore_index=True)
+
+    # The same trigger twice in a row is never sent on purpose, but a resumed
+    # session (see main.resume) repeats the interrupted trial in the next segment
+    new_segment = triggers.segment != triggers.segment.shift()
+    triggers["duplicate"] = (
+        (triggers.frame == triggers.frame.shift())
+        & (triggers.condition == triggers.condition.shift())
+        & ~new_segment
+    )
+    triggers["group"] = (
+        ((triggers.frame == "1") & ~triggers.duplicate) | new_segment
+    ).cumsum()
+
+    return triggers
+
+
+def trigger_groups(triggers):
+    """One row per trial in the recording, with its trigger sequence and times."""
+    grouped = triggers.groupby("group", sort=True)
+    groups = pd.DataFrame(
+        {
+            "segment": grouped.segment.first(),
+            "sequence": grouped.frame.agg("".join),
+            "condition": grouped.condition.first(),
+            "n_conditions": grouped.condition.nunique(),
+        }
+    )
+
+    # The first time every kind of trigger was sent, in case of duplicates
+    times = (
+        triggers.assign(event=triggers.frame.map(FRAMES))
+        .groupby(["group", "event"])
+        .time.first()
+        .unstack()
+    )
+    for event in ["stimuli_onset", "cue_onset", "orientation_change", "response"]:
+        groups[event] = times[event] if event in times else np.nan
+
+    return groups
+
+
+def sequence_problem(sequence, n_conditions, expected):
+    if n_conditions > 1:
+        return f"triggers of different conditions {sequence}"
+    if sequence == expected:
+        return None
+    if len(sequence) < len(expected):
+        return f"dropped triggers, expected {expected} but found {sequence}"
+    if len(sequence) > len(expected):
+        return f"duplicate triggers, expected {expected} but found {sequence}"
+    return f"wrong triggers, expected {expected} but found {sequence}"
+
+
+def interrupted(group_rows, group_index):
+    """
+    Whether the trial of this group was cut off by the end of its segment,
+    and the next segment starts with the same trial again.
+    """
+    group = group_rows[group_index]
+    if group_index + 1 == len(group_rows) or not pd.isna(group.response):
+        return False
+
+    following = group_rows[group_index + 1]
+    return (
+        following.segment != group.segment
+        and following.condition == group.condition
+        and following.sequence.startswith("1")
+    )
+
+
+def build_index(messages, data: pd.DataFrame):
+    """
+    Walks through the triggers once, matching every trial in the recording
+    to its row in `data` (the behavioural data of the same session, in trial order).
+    Returns
+     - the index: per trial_number, the segment and tracker times (ms) of the
+       stimuli onset, cue onset, orientation change and response
+     - a table of problems: trials without triggers, triggers without a trial,
+       and dropped, duplicate or wrong triggers
+    A trial that was interrupted at the end of a segment, and repeated at the
+    start of the next one (see main.resume), is matched to the repeat.
+    """
+    triggers = trigger_table(messages)
+    groups = trigger_groups(triggers[~triggers.duplicate])
+    codes = data.condition_code.astype(str).str[1].to_numpy()
+    keys = [None if pd.isna(key) else key for key in data.key_pressed]
+    trial_numbers = data.trial_number.to_numpy()
+
+    matched, problems = [], []
+    group_index, row = 0, 0
+    group_rows = list(groups.itertuples())
+    while group_index < len(groups) or row < len(data):
+        if group_index == len(groups):
+            problems.append((trial_numbers[row], None, "no triggers found"))
+            row += 1
+            continue
+
+        group = group_rows[group_index]
+        if row == len(data) or group.Index == 0:
+            # Group 0 holds triggers sent before the first 1x trigger
+            problems.append((None, group.stimuli_onset, "triggers without a trial"))
+            group_index += 1
+        elif group.condition == codes[row] and interrupted(group_rows, group_index):
+            problems.append(
+                (
+                    trial_numbers[row],
+                    group.stimuli_onset,
+                    f"interrupted trial {group.sequence}, repeated in the next segment",
+                )
+            )
+            group_index += 1
+        elif group.condition == codes[row]:
+            expected = f"123{RESPONSE_DIGITS[keys[row]]}"
+            problem = sequence_problem(group.sequence, group.n_conditions, expected)
+            if problem:
+                problems.append((trial_numbers[row], group.stimuli_onset, problem))
+            matched.append((trial_numbers[row], group_index))
+            group_index += 1
+            row += 1
+        elif row + 1 < len(data) and group.condition == codes[row + 1]:
+            # The triggers of this row went missing
+            problems.append((trial_numbers[row], None, "no triggers found"))
+            row += 1
+        else:
+            problems.append((None, group.stimuli_onset, "triggers without a trial"))
+            group_index += 1
+
+    trial_numbers, positions = zip(*matched) if matched else ((), ())
+    index = groups.iloc[list(positions)].drop(columns=["n_conditions"])
+    index.index = pd.Index(trial_numbers, name="trial_number")
+
+    # Duplicates are left out, and reported with the trial they were in
+    trial_of_group = {groups.index[position]: trial for trial, position in matched}
+    for duplicate in triggers[triggers.duplicate].itertuples():
+        problems.append(
+            (
+                trial_of_group.get(duplicate.group),
+                duplicate.time,
+                f"duplicate trigger {duplicate.frame}{duplicate.condition}",
+            )
+        )
+
+    problems = pd.DataFrame(problems, columns=["trial_number", "time", "problem"])
+
+    return index, problems
+
+
+def add_sample_offsets(index: pd.DataFrame, sample_times):
+    """
+    Adds the position of every event in the sample arrays, given the sample
+    times of every segment (in segment order, e.g. the "time" field of
+    edf.read_asc's samples). Index `samples[offset]` for the first sample
+    at or after the event.
+    """
+    index = index.copy()
+    for event in ["stimuli_onset", "cue_onset", "orientation_change", "response"]:
+        offsets = np.full(len(index), -1, dtype=np.int64)
+        for segment, times in enumerate(sample_times, start=1):
+            in_segment = (index.segment == segment).to_numpy() & index[
+                event
+            ].notna().to_numpy()
+            offsets[in_segment] = np.searchsorted(
+                times, index[event].to_numpy()[in_segment]
+            )
+        index[f"{event}_sample"] = offsets
+
+    return index
+
+
+def join_trials(data: pd.DataFrame, index: pd.DataFrame):
+    """The behavioural data of every trial that was found in the recording, with its times."""
+    return data.join(
+        index.drop(columns=["condition", "sequence"]), on="trial_number", how="inner"
+    )